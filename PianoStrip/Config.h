@@ -35,3 +35,8 @@ static const float kFftSampleRate = 8000.0f;
 
 // Song playback default (override per song)
 static const float kDefaultStepSeconds = 0.12f;
+
+// Songs streamed from the host (songstream.py): serial speed, and the ring
+// buffer they play from (a power of two, at most 32768 bytes)
+static const unsigned long kSongStreamBaud = 115200;
+static const uint16_t kSongStreamBufferBytes = 512;
@@ -8,6 +8,9 @@ static size_t gSongIndex = 0;
 static size_t gSongStep = 0;
 static unsigned long gLastStepMs = 0;
 static unsigned long gToneStopMs = 0;
+// Duration of the step currently playing, and where we are in song.tempos.
+static unsigned long gStepMs = 0;
+static size_t gTempoIndex = 0;
 
 int noteLetterToSemitone(char letter) {
   switch (letter) {
@@ -54,7 +57,7 @@ int parseFirstMidi(const char* step) {
   char buffer[32];
   strncpy(buffer, step, sizeof(buffer) - 1);
   buffer[sizeof(buffer) - 1] = '\0';
-  char* token = strtok(buffer, \"+\");
+  char* token = strtok(buffer, "+");
   if (!token) {
     return -1;
   }
@@ -89,10 +92,167 @@ void playChordStep(const char* step) {
   showStrip();
 }
 
-void advanceSongStep() {
-  const Song& song = kSongs[gSongIndex];
-  playChordStep(song.steps[gSongStep]);
-  int midi = parseFirstMidi(song.steps[gSongStep]);
+#if defined(SONG_FORMAT_PACKED) || defined(SONG_FORMAT_PHRASES) || defined(SONG_FORMAT_FRAMES)
+// Read position inside the current packed data, and silent steps
+// still pending from the last run-length record.
+static uint32_t gSongPos = 0;
+static uint8_t gSilenceLeft = 0;
+
+uint8_t readSongByte(uint32_t offset) {
+#if defined(pgm_read_byte_far) && defined(pgm_get_far_address)
+  return pgm_read_byte_far(pgm_get_far_address(kSongData) + offset);
+#else
+  return pgm_read_byte(kSongData + offset);
+#endif
+}
+#endif
+
+#if defined(SONG_FORMAT_PACKED) || defined(SONG_FORMAT_PHRASES)
+// Plays the packed step at dataOffset + gSongPos and returns its lowest
+// MIDI note (-1 for silence).
+int playPackedRecord(uint32_t dataOffset) {
+  if (gSilenceLeft > 0) {
+    // Strip was already cleared when the silent run started.
+    gSilenceLeft--;
+    return -1;
+  }
+
+  uint8_t head = readSongByte(dataOffset + gSongPos++);
+  clearStrip();
+  if (head & 0x80) {
+    gSilenceLeft = head & 0x7F;
+    showStrip();
+    return -1;
+  }
+
+  int firstMidi = -1;
+  for (uint8_t i = 0; i < head; i++) {
+    int midi = readSongByte(dataOffset + gSongPos++);
+    if (firstMidi < 0) {
+      firstMidi = midi;
+    }
+    lightMidiNote(midi);
+  }
+  showStrip();
+  return firstMidi;
+}
+#endif
+
+#if defined(SONG_FORMAT_PACKED)
+// Plays one packed step and returns its lowest MIDI note (-1 for silence).
+int playPackedStep(const Song& song) {
+  if (gSongStep == 0) {
+    gSongPos = 0;
+    gSilenceLeft = 0;
+  }
+  return playPackedRecord(song.dataOffset);
+}
+#endif
+
+#if defined(SONG_FORMAT_PHRASES)
+// Next entry of song's play order, the phrase (or silent run) being played
+// and its steps still to play.
+static uint32_t gOrderIndex = 0;
+static SongPhrase gPhrase = {0, 0};
+static bool gPhraseSilent = false;
+static uint16_t gPhraseStepsLeft = 0;
+
+// Plays one step of a phrase-compressed song and returns its lowest MIDI
+// note (-1 for silence).
+int playPhraseStep(const Song& song) {
+  if (gSongStep == 0) {
+    gOrderIndex = 0;
+    gPhraseStepsLeft = 0;
+  }
+  if (gPhraseStepsLeft == 0) {
+    uint16_t entry = pgm_read_word(&kSongOrder[song.orderOffset + gOrderIndex++]);
+    gSongPos = 0;
+    gSilenceLeft = 0;
+    gPhraseSilent = (entry & 0x8000) != 0;
+    if (gPhraseSilent) {
+      gPhraseStepsLeft = (entry & 0x7FFF) + 1;
+      clearStrip();
+      showStrip();
+    } else {
+      memcpy_P(&gPhrase, &kSongPhrases[entry], sizeof(gPhrase));
+      gPhraseStepsLeft = gPhrase.stepCount;
+    }
+  }
+  gPhraseStepsLeft--;
+  if (gPhraseSilent) {
+    return -1;
+  }
+  return playPackedRecord(gPhrase.dataOffset);
+}
+#endif
+
+#if defined(SONG_FORMAT_FRAMES)
+static_assert(SONG_FRAMES_LED_BASE_MIDI == kLedBaseMidi && SONG_FRAMES_LED_COUNT == kLedCount,
+              "Songs.h frames were made for another LED mapping; "
+              "rerun midi2array2.py with --led-base-midi/--led-count from Config.h");
+
+// LEDs lit by the current frame, bit i = LED i.
+static uint8_t gFrame[SONG_FRAMES_MASK_BYTES];
+
+void toggleFrameLed(uint8_t ledIndex) {
+  uint8_t bit = 1 << (ledIndex & 7);
+  gFrame[ledIndex >> 3] ^= bit;
+  if (gFrame[ledIndex >> 3] & bit) {
+    lightMidiNote(kLedBaseMidi + ledIndex);
+  } else {
+    unlightMidiNote(kLedBaseMidi + ledIndex);
+  }
+}
+
+// Applies one step's LED changes (precomputed by the host, no note parsing)
+// and returns the MIDI note for the buzzer (-1 for none).
+int playFrameStep(const Song& song) {
+  bool changed = false;
+  if (gSongStep == 0) {
+    gSongPos = 0;
+    gSilenceLeft = 0;
+    memset(gFrame, 0, sizeof(gFrame));
+    clearStrip();
+    changed = true;
+  }
+  if (gSilenceLeft > 0) {
+    gSilenceLeft--;
+    return -1;
+  }
+
+  int midi = -1;
+  uint8_t head = readSongByte(song.dataOffset + gSongPos++);
+  if (head & 0x80) {
+    gSilenceLeft = head & 0x7F;
+  } else {
+    if (!(head & 0x40)) {
+      midi = readSongByte(song.dataOffset + gSongPos++);
+    }
+    uint8_t count = head & 0x3F;
+    if (count == 0x3F) {
+      for (uint8_t i = 0; i < SONG_FRAMES_MASK_BYTES; i++) {
+        uint8_t diff = readSongByte(song.dataOffset + gSongPos++);
+        for (uint8_t led = i * 8; diff != 0; led++, diff >>= 1) {
+          if (diff & 1) {
+            toggleFrameLed(led);
+          }
+        }
+      }
+    } else {
+      for (uint8_t i = 0; i < count; i++) {
+        toggleFrameLed(readSongByte(song.dataOffset + gSongPos++));
+      }
+    }
+    changed = changed || count > 0;
+  }
+  if (changed) {
+    showStrip();
+  }
+  return midi;
+}
+#endif
+
+void playStepTone(int midi) {
   if (midi >= 0) {
     float freq = midiToFrequency(midi);
     if (freq > 0.0f) {
@@ -100,16 +260,339 @@ void advanceSongStep() {
       gToneStopMs = millis() + 200;
     }
   }
+}
+
+// ---------- Songs streamed from the host (songstream.py) ----------
+// Frames in both directions: 0xA5, type, length (<= 64), payload, then a
+// CRC-8 (poly 0x07) over type, length and payload. Host -> board: START
+// (stepUs u32, name), DATA (stream offset u16, bytes), END, STOP. Board ->
+// host: STATUS after every frame and every played step, DONE once played
+// out. The stream is packed step records (see --out-format packed), with
+// 0x7F + stepUs u32 where the tempo changes. The host only sends what fits
+// (received - consumed <= capacity), and resends from `received` when a
+// frame is lost, so DATA is accepted only at gStreamRxPos.
+static_assert((kSongStreamBufferBytes & (kSongStreamBufferBytes - 1)) == 0 && kSongStreamBufferBytes <= 32768,
+              "kSongStreamBufferBytes must be a power of two, at most 32768");
+
+static const uint8_t kStreamSync = 0xA5;
+static const uint8_t kStreamMaxPayload = 64;
+static const uint8_t kStreamTempoRecord = 0x7F;
+enum StreamFrameType : uint8_t {
+  kStreamStart = 0x01,
+  kStreamData = 0x02,
+  kStreamEnd = 0x03,
+  kStreamStop = 0x04,
+  kStreamStatus = 0x81,
+  kStreamDone = 0x82,
+};
+
+static uint8_t gStreamRing[kSongStreamBufferBytes];
+// Free-running stream offsets: next byte to receive, next record to play.
+static uint16_t gStreamRxPos = 0;
+static uint16_t gStreamReadPos = 0;
+static bool gStreamActive = false;
+static bool gStreamEnded = false;    // END received: play out what is left
+static bool gStreamPlaying = false;  // prebuffering done
+static bool gStreamStalled = false;  // a step came due with no record in the ring
+static uint8_t gStreamSilenceLeft = 0;
+static uint32_t gStreamStepUs = 0;
+static unsigned long gStreamDueUs = 0;
+static uint32_t gStreamSteps = 0;
+static uint16_t gStreamUnderruns = 0;
+static uint32_t gStreamMaxLateUs = 0;
+static char gStreamName[17] = "";
+
+// Frame being received: type, length, payload, CRC. gRxCount counts the
+// bytes after the sync byte; 0 while hunting for sync.
+static uint8_t gRxFrame[kStreamMaxPayload + 3];
+static uint8_t gRxCount = 0;
+
+uint8_t streamCrc8(uint8_t crc, const uint8_t* data, uint8_t length) {
+  for (uint8_t i = 0; i < length; i++) {
+    crc ^= data[i];
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x80) ? (uint8_t)((crc << 1) ^ 0x07) : (uint8_t)(crc << 1);
+    }
+  }
+  return crc;
+}
+
+void putStreamU16(uint8_t* out, uint16_t value) {
+  out[0] = value & 0xFF;
+  out[1] = value >> 8;
+}
+
+void putStreamU32(uint8_t* out, uint32_t value) {
+  putStreamU16(out, value & 0xFFFF);
+  putStreamU16(out + 2, value >> 16);
+}
+
+uint16_t getStreamU16(const uint8_t* in) {
+  return in[0] | ((uint16_t)in[1] << 8);
+}
+
+uint32_t getStreamU32(const uint8_t* in) {
+  return getStreamU16(in) | ((uint32_t)getStreamU16(in + 2) << 16);
+}
+
+void sendStreamFrame(uint8_t type, const uint8_t* payload, uint8_t length) {
+  uint8_t header[3] = {kStreamSync, type, length};
+  uint8_t crc = streamCrc8(streamCrc8(0, &header[1], 2), payload, length);
+  Serial.write(header, sizeof(header));
+  Serial.write(payload, length);
+  Serial.write(crc);
+}
+
+void sendStreamStatus() {
+  uint8_t payload[13];
+  putStreamU16(&payload[0], gStreamRxPos);
+  putStreamU16(&payload[2], gStreamReadPos);
+  putStreamU16(&payload[4], kSongStreamBufferBytes);
+  putStreamU16(&payload[6], gStreamUnderruns);
+  putStreamU32(&payload[8], gStreamSteps);
+  payload[12] = (gStreamPlaying ? 0x01 : 0) | (gStreamEnded ? 0x02 : 0);
+  sendStreamFrame(kStreamStatus, payload, sizeof(payload));
+}
+
+void resetSongDemo();
+
+// Reports the stream's totals and goes back to the songs in flash.
+void finishSongStream() {
+  uint8_t payload[10];
+  putStreamU32(&payload[0], gStreamSteps);
+  putStreamU16(&payload[4], gStreamUnderruns);
+  putStreamU32(&payload[6], gStreamMaxLateUs);
+  sendStreamFrame(kStreamDone, payload, sizeof(payload));
+  gStreamActive = false;
+  noTone(kBuzzerPin);
+  gToneStopMs = 0;
+  resetSongDemo();
+}
+
+uint8_t streamByteAt(uint16_t pos) {
+  return gStreamRing[pos & (kSongStreamBufferBytes - 1)];
+}
+
+void handleStreamFrame(uint8_t type, const uint8_t* payload, uint8_t length) {
+  switch (type) {
+    case kStreamStart:
+      if (length < 4) {
+        return;
+      }
+      gStreamRxPos = 0;
+      gStreamReadPos = 0;
+      gStreamActive = true;
+      gStreamEnded = false;
+      gStreamPlaying = false;
+      gStreamStalled = false;
+      gStreamSilenceLeft = 0;
+      gStreamStepUs = getStreamU32(payload);
+      gStreamSteps = 0;
+      gStreamUnderruns = 0;
+      gStreamMaxLateUs = 0;
+      length -= 4;
+      if (length > sizeof(gStreamName) - 1) {
+        length = sizeof(gStreamName) - 1;
+      }
+      memcpy(gStreamName, payload + 4, length);
+      gStreamName[length] = '\0';
+      clearStrip();
+      showStrip();
+      break;
+    case kStreamData: {
+      if (!gStreamActive || length < 2) {
+        return;
+      }
+      uint8_t count = length - 2;
+      uint16_t used = gStreamRxPos - gStreamReadPos;
+      if (getStreamU16(payload) == gStreamRxPos && used + count <= kSongStreamBufferBytes) {
+        for (uint8_t i = 0; i < count; i++) {
+          gStreamRing[gStreamRxPos++ & (kSongStreamBufferBytes - 1)] = payload[2 + i];
+        }
+      }
+      break;
+    }
+    case kStreamEnd:
+      if (!gStreamActive) {
+        return;
+      }
+      gStreamEnded = true;
+      break;
+    case kStreamStop:
+      if (gStreamActive) {
+        finishSongStream();
+      }
+      return;
+    default:
+      return;
+  }
+  sendStreamStatus();
+}
+
+// Reads whatever the host has sent; a frame with a bad length or CRC is
+// dropped (the host resends on timeout).
+void pollSongStream() {
+  while (Serial.available() > 0) {
+    uint8_t b = (uint8_t)Serial.read();
+    if (gRxCount == 0) {
+      if (b == kStreamSync) {
+        gRxCount = 1;
+      }
+      continue;
+    }
+    gRxFrame[gRxCount - 1] = b;
+    gRxCount++;
+    if (gRxCount == 3 && gRxFrame[1] > kStreamMaxPayload) {
+      gRxCount = 0;
+    } else if (gRxCount >= 3 && gRxCount == gRxFrame[1] + 4) {
+      uint8_t length = gRxFrame[1];
+      if (streamCrc8(0, gRxFrame, length + 2) == gRxFrame[length + 2]) {
+        handleStreamFrame(gRxFrame[0], &gRxFrame[2], length);
+      }
+      gRxCount = 0;
+    }
+  }
+}
+
+// Applies tempo records at the read position, then reports whether the
+// next step record is fully in the ring.
+bool streamRecordReady() {
+  while (true) {
+    uint16_t used = gStreamRxPos - gStreamReadPos;
+    if (used == 0) {
+      return false;
+    }
+    uint8_t head = streamByteAt(gStreamReadPos);
+    if (head != kStreamTempoRecord) {
+      return (head & 0x80) || used >= 1 + head;
+    }
+    if (used < 5) {
+      return false;
+    }
+    uint8_t bytes[4];
+    for (uint8_t i = 0; i < 4; i++) {
+      bytes[i] = streamByteAt(gStreamReadPos + 1 + i);
+    }
+    gStreamStepUs = getStreamU32(bytes);
+    gStreamReadPos += 5;
+  }
+}
+
+// Plays the step record at the read position (as playPackedRecord) and
+// returns its lowest MIDI note (-1 for silence).
+int playStreamRecord() {
+  if (gStreamSilenceLeft > 0) {
+    gStreamSilenceLeft--;
+    return -1;
+  }
+  uint8_t head = streamByteAt(gStreamReadPos++);
+  clearStrip();
+  if (head & 0x80) {
+    gStreamSilenceLeft = head & 0x7F;
+    showStrip();
+    return -1;
+  }
+  int firstMidi = -1;
+  for (uint8_t i = 0; i < head; i++) {
+    int midi = streamByteAt(gStreamReadPos++);
+    if (firstMidi < 0) {
+      firstMidi = midi;
+    }
+    lightMidiNote(midi);
+  }
+  showStrip();
+  return firstMidi;
+}
+
+// Plays a streamed step when one is due. Steps are scheduled on micros()
+// from the previous due time, not from when they were played, so a late
+// step does not delay the rest of the song. Playback starts with the ring
+// half full (or at END); running dry counts one underrun and playback
+// resumes on a fresh schedule once the next record is in.
+void updateSongStream() {
+  if (!gStreamPlaying) {
+    if ((uint16_t)(gStreamRxPos - gStreamReadPos) < kSongStreamBufferBytes / 2 && !gStreamEnded) {
+      return;
+    }
+    gStreamPlaying = true;
+    gStreamDueUs = micros();
+  }
+  unsigned long now = micros();
+  if ((long)(now - gStreamDueUs) < 0) {
+    return;
+  }
+  if (gStreamSilenceLeft == 0 && !streamRecordReady()) {
+    if (gStreamEnded && gStreamRxPos == gStreamReadPos) {
+      finishSongStream();
+    } else if (!gStreamStalled) {
+      gStreamStalled = true;
+      gStreamUnderruns++;
+    }
+    return;
+  }
+  if (gStreamStalled) {
+    gStreamStalled = false;
+    gStreamDueUs = now;
+  }
+  uint32_t lateUs = now - gStreamDueUs;
+  if (lateUs > gStreamMaxLateUs) {
+    gStreamMaxLateUs = lateUs;
+  }
+  playStepTone(playStreamRecord());
+  gStreamDueUs += gStreamStepUs;
+  gStreamSteps++;
+  sendStreamStatus();
+}
+
+void setupSongStream() {
+  Serial.begin(kSongStreamBaud);
+}
+
+// Step duration for `step`, following the song's tempo table when it has one.
+float songStepSeconds(const Song& song, size_t step) {
+  if (song.tempos == nullptr || song.tempoCount == 0) {
+    return song.stepSeconds > 0.0f ? song.stepSeconds : kDefaultStepSeconds;
+  }
+  SongTempo tempo;
+  if (step == 0) {
+    gTempoIndex = 0;
+  }
+  while (gTempoIndex + 1 < song.tempoCount) {
+    memcpy_P(&tempo, &song.tempos[gTempoIndex + 1], sizeof(tempo));
+    if (tempo.startStep > step) {
+      break;
+    }
+    gTempoIndex++;
+  }
+  memcpy_P(&tempo, &song.tempos[gTempoIndex], sizeof(tempo));
+  return tempo.stepSeconds > 0.0f ? tempo.stepSeconds : kDefaultStepSeconds;
+}
+
+void advanceSongStep() {
+  const Song& song = kSongs[gSongIndex];
+#if defined(SONG_FORMAT_PACKED)
+  int midi = playPackedStep(song);
+#elif defined(SONG_FORMAT_PHRASES)
+  int midi = playPhraseStep(song);
+#elif defined(SONG_FORMAT_FRAMES)
+  int midi = playFrameStep(song);
+#else
+  playChordStep(song.steps[gSongStep]);
+  int midi = parseFirstMidi(song.steps[gSongStep]);
+#endif
+  playStepTone(midi);
+  gStepMs = (unsigned long)(songStepSeconds(song, gSongStep) * 1000.0f);
   gSongStep = (gSongStep + 1) % song.stepCount;
 }
 
 void updateSongDemo(char* detailLine, size_t detailSize) {
   const Song& song = kSongs[gSongIndex];
   unsigned long now = millis();
-  float stepSeconds = song.stepSeconds > 0.0f ? song.stepSeconds : kDefaultStepSeconds;
-  unsigned long stepMs = (unsigned long)(stepSeconds * 1000.0f);
 
-  if (now - gLastStepMs >= stepMs) {
+  pollSongStream();
+  if (gStreamActive) {
+    updateSongStream();
+  } else if (now - gLastStepMs >= gStepMs) {
     gLastStepMs = now;
     advanceSongStep();
   }
@@ -118,12 +601,18 @@ void updateSongDemo(char* detailLine, size_t detailSize) {
     gToneStopMs = 0;
   }
 
-  snprintf(detailLine, detailSize, "Song: %s", song.name);
+  if (gStreamActive) {
+    snprintf(detailLine, detailSize, "Stream: %s", gStreamName);
+  } else {
+    snprintf(detailLine, detailSize, "Song: %s", song.name);
+  }
 }
 
 void resetSongDemo() {
   gSongStep = 0;
   gLastStepMs = 0;
+  gStepMs = 0;
+  gTempoIndex = 0;
   clearStrip();
   showStrip();
 }
@@ -39,6 +39,14 @@ void lightMidiNote(int midiNote) {
   gLeds[ledIndex] = CHSV(hue, 255, 255);
 }
 
+void unlightMidiNote(int midiNote) {
+  int ledIndex = midiToLedIndex(midiNote);
+  if (ledIndex < 0) {
+    return;
+  }
+  gLeds[ledIndex] = CRGB::Black;
+}
+
 void showStrip() {
   FastLED.show();
 }
@@ -12,6 +12,7 @@ void updateRainbowDemo(char* detailLine, size_t detailSize);
 void updateMicDemo(char* detailLine, size_t detailSize);
 void updateSongDemo(char* detailLine, size_t detailSize);
 void resetSongDemo();
+void setupSongStream();
 
 enum DemoMode {
   kModeRainbow = 0,
@@ -33,6 +34,7 @@ void setup() {
   setupLcd();
   setupEncoder();
   setupMatrix();
+  setupSongStream();
 }
 
 void updateMode(int delta) {
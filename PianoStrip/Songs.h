@@ -3,12 +3,24 @@
 // This file is meant to be generated by midi2array2.py (--out-header).
 // Example:
 //   python midi2array2.py "debussy-clair-de-lune.mid" --steps-per-beat 4 --mode onset --out-header PianoStrip/Songs.h
+// Add --follow-tempo for per-segment step durations (Song.tempos) on pieces with tempo changes.
+// Add --out-format packed for the compact PROGMEM byte format (SONG_FORMAT_PACKED).
+
+#include <Arduino.h>
+
+// Step duration changes: from startStep on, each step lasts stepSeconds.
+struct SongTempo {
+  uint32_t startStep;
+  float stepSeconds;
+};
 
 struct Song {
   const char* name;
   const char* const* steps;
   size_t stepCount;
   float stepSeconds;
+  const SongTempo* tempos;  // PROGMEM; nullptr = fixed stepSeconds
+  size_t tempoCount;
 };
 
 static const char* const kSong_Empty[] = {
@@ -20,7 +32,9 @@ static const Song kSongs[] = {
     "Empty",
     kSong_Empty,
     sizeof(kSong_Empty) / sizeof(kSong_Empty[0]),
-    0.12f
+    0.12f,
+    nullptr,
+    0
   }
 };
 
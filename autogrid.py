@@ -0,0 +1,92 @@
+"""
+autogrid.py
+
+Grid search behind the converters' --auto-grid (midi2array, midi2array2):
+score candidate grids on a song's note onsets, vectorized with numpy, and
+pick the coarsest one whose onset timing error stays within a budget.
+
+The converter says where each onset lands on a candidate (its step index and
+that step's time, the way it quantizes); score_grid then reports
+- mean / max |onset - step time|
+- collided onsets: distinct onset times that share a step with an earlier
+  one, i.e. notes that would sound together (or be dropped) after quantizing.
+Onsets less than ONSET_EPSILON_S apart count as one (a chord).
+
+Usage:
+    onsets = sorted_onsets(start_times)
+    scores = [score_grid(label, step_s, n_steps, onsets, index, times) for ...]
+    best, met = pick_grid(scores, max_error_ms=10)
+    print(format_scores(scores, best))
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from notearray.backends import lazy_import
+
+np = lazy_import("numpy")
+
+ONSET_EPSILON_S = 1e-6
+
+
+@dataclass(frozen=True)
+class GridScore:
+    label: str
+    step_s: float  # step duration (the first step's, for tempo-following grids)
+    steps: int  # steps the song takes on this grid
+    mean_error_ms: float
+    max_error_ms: float
+    collisions: int
+
+
+def sorted_onsets(start_s: Sequence[float]) -> np.ndarray:
+    return np.sort(np.asarray(start_s, dtype=np.float64))
+
+
+def score_grid(
+    label: str,
+    step_s: float,
+    steps: int,
+    onsets: np.ndarray,
+    step_index: np.ndarray,
+    step_time: np.ndarray,
+) -> GridScore:
+    """onsets ascending; step_index / step_time: where each one lands (non-decreasing)."""
+    if len(onsets) == 0:
+        return GridScore(label, step_s, steps, 0.0, 0.0, 0)
+    error_ms = np.abs(onsets - step_time) * 1e3
+    distinct = np.concatenate(([True], np.diff(onsets) > ONSET_EPSILON_S))
+    collisions = int(np.count_nonzero(np.diff(step_index[distinct]) == 0))
+    return GridScore(label, step_s, steps, float(error_ms.mean()), float(error_ms.max()), collisions)
+
+
+def pick_grid(
+    scores: Sequence[GridScore], max_error_ms: float, max_collisions: Optional[int] = None
+) -> Tuple[GridScore, bool]:
+    """
+    The candidate with the fewest steps whose max onset error (and collisions,
+    if max_collisions is set) fits; ties go to the earlier candidate.
+    Returns (score, True), or (the most accurate candidate, False) if none fits.
+    """
+    if not scores:
+        raise ValueError("no candidate grids")
+    fits = [
+        s for s in scores
+        if s.max_error_ms <= max_error_ms and (max_collisions is None or s.collisions <= max_collisions)
+    ]
+    if fits:
+        return min(fits, key=lambda s: s.steps), True
+    return min(scores, key=lambda s: (s.max_error_ms, s.steps)), False
+
+
+def format_scores(scores: Sequence[GridScore], chosen: Optional[GridScore] = None) -> List[str]:
+    lines = []
+    for s in scores:
+        mark = "*" if s is chosen else " "
+        lines.append(
+            f"{mark} {s.label:>10s}  step={s.step_s * 1e3:8.3f}ms  steps={s.steps:8d}  "
+            f"onset error mean={s.mean_error_ms:7.3f}ms max={s.max_error_ms:7.3f}ms  collided={s.collisions}"
+        )
+    return lines
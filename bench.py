@@ -0,0 +1,1498 @@
+#!/usr/bin/env python3
+"""
+bench.py
+
+Micro-benchmarks for the MIDI -> array converters.
+
+Usage:
+  python bench.py tempo-map --tempo-changes 10000 --notes 20000
+  python bench.py packed *.mid
+  python bench.py phrases --follow-tempo --tempo-source declared
+  python bench.py output --grids-ms 10 1 --window-s 10
+  python bench.py firmware --formats text packed frames --repeat 20
+  python bench.py stream --steps 300 --speed 4 --corrupt 500
+  python bench.py mic --fft-sizes 128 256 512 1024 --sample-rate 8000
+  python bench.py memory --grid-ms 1 --scales 1 4 16
+  python bench.py tempo-grid --grid 16th
+  python bench.py auto-grid --max-error-ms 10 --scales 1 10
+  python bench.py note-index --grid-ms 10 --notes 100000
+  python bench.py parse --scales 1 10
+  python bench.py note-table --notes 200000
+  python bench.py tempo-detect --scales 1 10
+  python bench.py startup --repeat 5
+  python bench.py online --grids 16th 10ms --speed 8 --realtime-s 30
+  python bench.py variants --variants 16th 8th 10ms --policies highest loudest lowest
+  python bench.py suite --scales 1 10 100 --json results.json
+  python bench.py suite --compare results.json --profile prof/
+"""
+
+
+from __future__ import annotations
+
+import argparse
+import cProfile
+import datetime
+import gc
+import glob
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import pstats
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import mido
+
+try:
+    import resource
+except ImportError:  # not available on Windows: peak RSS is then not reported
+    resource = None
+
+import midi2array
+import smfreader
+from noteindex import NoteIndex
+from tests.helpers import (
+    FIRMWARE_FORMATS,
+    build_hostsim,
+    firmware_mic_block,
+    make_synthetic_midi,
+    reference_sweep,
+    scale_midi,
+)
+
+
+def timeit(fn: Callable[[], object], repeat: int = 3) -> float:
+    """Best-of-N wall time in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def linear_ticks_to_seconds(tempo_map: midi2array.TempoMap, abs_tick: int) -> float:
+    """Reference: the original linear scan over tempo segments."""
+    idx = 0
+    for i, t in enumerate(tempo_map.ticks):
+        if t <= abs_tick:
+            idx = i
+        else:
+            break
+    return tempo_map.seconds[idx] + mido.tick2second(
+        abs_tick - tempo_map.ticks[idx], tempo_map.ticks_per_beat, tempo_map.tempos[idx]
+    )
+
+
+def bench_tempo_map(args: argparse.Namespace) -> None:
+    mid = make_synthetic_midi(n_notes=args.notes, n_tempo_changes=args.tempo_changes)
+    tempo_map = midi2array.TempoMap.from_midi(mid)
+    max_tick = sum(msg.time for msg in mid.tracks[1])
+    rng = random.Random(1)
+    ticks: List[int] = [rng.randint(0, max_tick) for _ in range(args.lookups)]
+
+    print(f"tempo segments={len(tempo_map)}  notes={args.notes}  lookups={len(ticks)}")
+
+    t_build = timeit(lambda: midi2array.TempoMap.from_midi(mid))
+    print(f"  build TempoMap                 {t_build * 1e3:9.2f} ms")
+
+    t_linear = timeit(lambda: [linear_ticks_to_seconds(tempo_map, t) for t in ticks], repeat=1)
+    t_bisect = timeit(lambda: [tempo_map.ticks_to_seconds(t) for t in ticks])
+    print(f"  linear scan lookups            {t_linear * 1e3:9.2f} ms")
+    print(f"  bisect lookups                 {t_bisect * 1e3:9.2f} ms  ({t_linear / t_bisect:.0f}x)")
+
+    if midi2array.np is not None:
+        t_bulk = timeit(lambda: tempo_map.ticks_to_seconds_array(ticks))
+        print(f"  vectorized bulk conversion     {t_bulk * 1e3:9.2f} ms  ({t_linear / t_bulk:.0f}x)")
+
+    t_extract = timeit(lambda: midi2array.extract_note_events(mid))
+    print(f"  extract_note_events            {t_extract * 1e3:9.2f} ms")
+
+
+def peak_memory(fn: Callable[[], object]) -> int:
+    """Peak bytes allocated by Python while running fn (tracemalloc)."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_memory(args: argparse.Namespace) -> None:
+    """List-based vs streaming quantization: peak memory as the piece gets longer."""
+    step_s = args.grid_ms / 1000.0
+    print(f"grid={args.grid_ms}ms  policy={args.policy}  (events preloaded, quantization only)")
+    for scale in args.scales:
+        mid = make_synthetic_midi(n_notes=args.notes * scale, chord_size=3)
+        events = midi2array.extract_note_table(mid)
+
+        def as_list() -> None:
+            arr = midi2array.events_to_array(events, step_s, policy=args.policy)
+            with open(os.devnull, "w", encoding="utf-8") as f:
+                for token in arr:
+                    f.write(token + "\n")
+
+        def streamed() -> None:
+            runs = midi2array.iter_events_to_array(events, step_s, policy=args.policy, run_length=True)
+            with open(os.devnull, "w", encoding="utf-8") as f:
+                for _start, length, token in runs:
+                    f.write((token + "\n") * length)
+
+        bins = int(max(events.end_s) / step_s)
+        list_peak = peak_memory(as_list)
+        stream_peak = peak_memory(streamed)
+        print(
+            f"  x{scale:<4d} bins={bins:9d}  list peak={list_peak / 1e6:8.2f} MB  "
+            f"streaming peak={stream_peak / 1e6:8.2f} MB"
+        )
+
+
+def bundled_midi_files() -> List[str]:
+    here = os.path.dirname(os.path.abspath(__file__))
+    return sorted(glob.glob(os.path.join(here, "*.mid")))
+
+
+def bench_tempo_grid(args: argparse.Namespace) -> None:
+    """
+    Onset timing error and step count: tempo-following grid vs the fixed
+    grid from the initial tempo vs the coarsest fixed-ms grid whose mean
+    onset error matches the tempo-following grid.
+    """
+    np = midi2array.np
+    if np is None:
+        raise SystemExit("tempo-grid benchmark requires numpy")
+
+    for path in args.midi or bundled_midi_files():
+        mid = mido.MidiFile(path)
+        tempo_map = midi2array.TempoMap.from_midi(mid)
+        events = midi2array.extract_note_events(mid, tempo_map=tempo_map)
+        onsets = np.array([e.start_s for e in events])
+        t_end = max(e.end_s for e in events)
+
+        def fixed(step_s: float):
+            err = np.abs(onsets - np.round(onsets / step_s) * step_s)
+            return int(math.ceil(t_end / step_s)), err
+
+        subdiv = midi2array.grid_subdivisions(args.grid)
+        grid = midi2array.TempoGrid(tempo_map, subdiv)
+        ticks = np.array([tempo_map.seconds_to_ticks(t) for t in onsets])
+        steps = np.round(ticks * subdiv / tempo_map.ticks_per_beat).astype(np.int64)
+        edges = grid.bin_starts_array(int(steps.max()) + 1)
+        tempo_err = np.abs(onsets - edges[steps])
+        tempo_steps = grid.bin_count(t_end)
+        target = tempo_err.mean()
+
+        init_steps, init_err = fixed(midi2array.grid_step_seconds_from_musical(mid, args.grid, tempo_map))
+
+        # Coarsest fixed grid (0.5 ms resolution) matching the tempo grid's mean error.
+        match_ms, match_steps, match_err = None, None, None
+        for ms in np.arange(500.0, 0.0, -0.5):
+            n, err = fixed(ms / 1000.0)
+            if err.mean() <= target:
+                match_ms, match_steps, match_err = ms, n, err
+                break
+
+        print(os.path.basename(path))
+        print(
+            f"  follow-tempo {args.grid:6s} steps={tempo_steps:7d}  "
+            f"mean={tempo_err.mean() * 1e3:6.2f}ms max={tempo_err.max() * 1e3:6.2f}ms"
+        )
+        print(
+            f"  fixed {args.grid:6s}        steps={init_steps:7d}  "
+            f"mean={init_err.mean() * 1e3:6.2f}ms max={init_err.max() * 1e3:6.2f}ms"
+        )
+        if match_ms is not None:
+            print(
+                f"  fixed {match_ms:5.1f}ms       steps={match_steps:7d}  "
+                f"mean={match_err.mean() * 1e3:6.2f}ms max={match_err.max() * 1e3:6.2f}ms  "
+                f"({match_steps / max(tempo_steps, 1):.1f}x the steps for equal mean error)"
+            )
+        else:
+            print("  no fixed grid down to 0.5 ms matches the tempo grid's mean error")
+
+
+def bench_auto_grid(args: argparse.Namespace) -> None:
+    """
+    --auto-grid sweep time per song (after parsing) for both converters, on
+    the bundled songs and scaled-up copies, with the grid each one picks.
+    For midi2array2 it is compared with converting once per candidate
+    (pretty_midi_to_step_masks), i.e. finding the grid by trial conversion.
+    """
+    if midi2array.np is None:
+        raise SystemExit("auto-grid benchmark requires numpy")
+    import autogrid
+    import midi2array2
+
+    work_dir = tempfile.mkdtemp(prefix="pianostrip-autogrid-")
+    try:
+        for path in args.midi or bundled_midi_files():
+            label = os.path.splitext(os.path.basename(path))[0]
+            for scale in args.scales:
+                scaled_path = path
+                if scale != 1:
+                    scaled_path = os.path.join(work_dir, f"{label}.x{scale}.mid")
+                    scale_midi(mido.MidiFile(path), scale, args.extra_voices).save(scaled_path)
+
+                events, tempo_map = midi2array.parse_events(scaled_path)
+                scores = midi2array.auto_grid_scores(events, tempo_map, follow_tempo=args.follow_tempo)
+                best, met = autogrid.pick_grid(scores, args.max_error_ms)
+                t = timeit(
+                    lambda: midi2array.auto_grid_scores(events, tempo_map, follow_tempo=args.follow_tempo),
+                    repeat=args.repeat,
+                )
+                print(f"{label} x{scale}  notes={len(events)}")
+                print(
+                    f"  midi2array   {len(scores):2d} grids {t * 1e3:8.2f} ms  -> {best.label} "
+                    f"steps={best.steps} max={best.max_error_ms:.2f}ms collided={best.collisions}"
+                    + ("" if met else "  (over budget)")
+                )
+
+                pm, _declares_tempo = midi2array2.load_pretty_midi(scaled_path)
+                options: Dict[str, Any] = dict(follow_tempo=args.follow_tempo)
+                if not args.follow_tempo:
+                    options["bpm"] = midi2array2.detect_tempo(pm)[0]
+                scores = midi2array2.auto_grid_scores(pm, **options)
+                best, met = autogrid.pick_grid(scores, args.max_error_ms)
+                t = timeit(lambda: midi2array2.auto_grid_scores(pm, **options), repeat=args.repeat)
+                t_trial = timeit(
+                    lambda: [
+                        midi2array2.pretty_midi_to_step_masks(pm, steps_per_beat=spb, **options)
+                        for spb in midi2array2.AUTO_GRID_STEPS_PER_BEAT
+                    ],
+                    repeat=1,
+                )
+                print(
+                    f"  midi2array2  {len(scores):2d} grids {t * 1e3:8.2f} ms  -> {best.label} "
+                    f"steps={best.steps} max={best.max_error_ms:.2f}ms collided={best.collisions}"
+                    + ("" if met else "  (over budget)")
+                )
+                print(f"  midi2array2 trial conversions {t_trial * 1e3:8.2f} ms  ({t_trial / t:.0f}x)")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_note_index(args: argparse.Namespace) -> None:
+    """
+    NoteIndex vs the original sweep / linear scans: per-bin quantization,
+    random point and range queries, on the bundled songs and a synthetic piece
+    (parity with the sweep: tests/test_noteindex.py).
+    """
+    step_s = args.grid_ms / 1000.0
+    inputs = [(os.path.basename(p), mido.MidiFile(p)) for p in bundled_midi_files()]
+    inputs.append((f"synthetic {args.notes} notes", make_synthetic_midi(n_notes=args.notes, chord_size=3)))
+    rng = random.Random(2)
+    print(f"grid={args.grid_ms}ms  policy={args.policy}  queries={args.queries}")
+    for name, mid in inputs:
+        events = midi2array.extract_note_events(mid)
+        t_end = max(e.end_s for e in events)
+
+        new = midi2array.events_to_array(events, step_s, policy=args.policy)
+        t_ref = timeit(lambda: reference_sweep(events, step_s, args.policy), repeat=1)
+        t_new = timeit(lambda: midi2array.events_to_array(events, step_s, policy=args.policy), repeat=1)
+
+        points = [rng.uniform(0.0, t_end) for _ in range(args.queries)]
+        t_build = timeit(
+            lambda: NoteIndex([e.start_s for e in events], [e.end_s for e in events], events).notes_at(0.0)
+        )
+        index = NoteIndex([e.start_s for e in events], [e.end_s for e in events], events)
+        scan = lambda t: [e for e in events if e.start_s <= t < e.end_s]
+        t_scan = timeit(lambda: [scan(t) for t in points], repeat=1)
+        t_at = timeit(lambda: [index.notes_at(t) for t in points])
+        t_in = timeit(lambda: [index.notes_in(t, t + 0.25) for t in points])
+
+        print(f"{name}  notes={len(events)}  bins={len(new)}")
+        print(f"  original sweep                 {t_ref * 1e3:9.2f} ms")
+        print(f"  NoteIndex sweep                {t_new * 1e3:9.2f} ms  ({t_ref / t_new:.1f}x)")
+        print(f"  build index (incl. tree)       {t_build * 1e3:9.2f} ms")
+        print(f"  linear scan point queries      {t_scan * 1e3:9.2f} ms")
+        print(f"  notes_at point queries         {t_at * 1e3:9.2f} ms  ({t_scan / t_at:.0f}x)")
+        print(f"  notes_in 250ms range queries   {t_in * 1e3:9.2f} ms")
+
+
+def bench_parse(args: argparse.Namespace) -> None:
+    """
+    mido vs the built-in smfreader: MIDI file -> NoteEvent list. Reports
+    parse/extract time and tracemalloc peak on the bundled songs and scaled-up
+    multi-track copies (event parity: tests/test_smfreader.py).
+    """
+    work_dir = tempfile.mkdtemp(prefix="pianostrip-parse-")
+    try:
+        inputs = []
+        for path in args.midi or bundled_midi_files():
+            label = os.path.splitext(os.path.basename(path))[0]
+            for scale in args.scales:
+                if scale == 1:
+                    inputs.append((label, path))
+                    continue
+                scaled_path = os.path.join(work_dir, f"{label}.x{scale}.mid")
+                scale_midi(mido.MidiFile(path), scale, args.extra_voices).save(scaled_path)
+                inputs.append((f"{label} x{scale}", scaled_path))
+
+        for label, path in inputs:
+            mid = mido.MidiFile(path)
+            raw = smfreader.read_smf(path)
+            events = midi2array.extract_note_events(mid)
+
+            t_mido_parse = timeit(lambda: mido.MidiFile(path), repeat=args.repeat)
+            t_mido_extract = timeit(lambda: midi2array.extract_note_events(mid), repeat=args.repeat)
+            t_raw_parse = timeit(lambda: smfreader.read_smf(path), repeat=args.repeat)
+            t_raw_extract = timeit(lambda: midi2array.extract_note_events_raw(raw), repeat=args.repeat)
+            mem_mido = peak_memory(lambda: midi2array.extract_note_events(mido.MidiFile(path)))
+            mem_raw = peak_memory(lambda: midi2array.extract_note_events_raw(smfreader.read_smf(path)))
+            mido_total = t_mido_parse + t_mido_extract
+            raw_total = t_raw_parse + t_raw_extract
+
+            print(
+                f"{label}  {os.path.getsize(path) / 1e3:.0f} kB  tracks={len(mid.tracks)}  "
+                f"messages={sum(len(t) for t in mid.tracks)}  notes={len(events)}"
+            )
+            print(
+                f"  mido       parse {t_mido_parse * 1e3:9.2f} ms  extract {t_mido_extract * 1e3:8.2f} ms  "
+                f"peak {mem_mido / 1e6:7.2f} MB"
+            )
+            print(
+                f"  smfreader  parse {t_raw_parse * 1e3:9.2f} ms  extract {t_raw_extract * 1e3:8.2f} ms  "
+                f"peak {mem_raw / 1e6:7.2f} MB  ({mido_total / raw_total:.1f}x faster, "
+                f"{mem_mido / max(mem_raw, 1):.1f}x less memory)"
+            )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def retained_memory(fn: Callable[[], object]) -> Tuple[int, object]:
+    """Bytes still allocated (tracemalloc) once fn returns, with its result kept alive."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn()
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0], result
+    finally:
+        tracemalloc.stop()
+
+
+def bench_note_table(args: argparse.Namespace) -> None:
+    """
+    List[NoteEvent] vs NoteEventTable: retained bytes per note, extraction,
+    canonical sort and a full gc pass with the events alive.
+    """
+    inputs = [(os.path.basename(p), smfreader.read_smf(p)) for p in bundled_midi_files()]
+    synthetic = os.path.join(tempfile.mkdtemp(prefix="pianostrip-table-"), "synthetic.mid")
+    try:
+        make_synthetic_midi(n_notes=args.notes, chord_size=4).save(synthetic)
+        inputs.append((f"synthetic {args.notes} notes", smfreader.read_smf(synthetic)))
+    finally:
+        shutil.rmtree(os.path.dirname(synthetic), ignore_errors=True)
+
+    for name, raw in inputs:
+        list_bytes, events = retained_memory(lambda: midi2array.extract_note_events_raw(raw))
+        table_bytes, table = retained_memory(lambda: midi2array.extract_note_table_raw(raw))
+        n = max(len(table), 1)
+
+        t_list = timeit(lambda: midi2array.extract_note_events_raw(raw))
+        t_table = timeit(lambda: midi2array.extract_note_table_raw(raw))
+        key = lambda e: (e.start_s, e.end_s, e.track, e.channel, e.note)
+        t_sort_list = timeit(lambda: sorted(events, key=key))
+        t_sort_table = timeit(table.sort_order)
+
+        t_gc_list = timeit(gc.collect)  # events and table alive
+        del events
+        t_gc_table = timeit(gc.collect)  # table only
+
+        print(f"{name}  notes={len(table)}")
+        print(f"  List[NoteEvent]   {list_bytes / n:7.1f} B/note  extract {t_list * 1e3:8.2f} ms  "
+              f"sort {t_sort_list * 1e3:7.2f} ms  gc.collect {t_gc_list * 1e3:6.2f} ms")
+        print(f"  NoteEventTable    {table_bytes / n:7.1f} B/note  extract {t_table * 1e3:8.2f} ms  "
+              f"sort {t_sort_table * 1e3:7.2f} ms  gc.collect {t_gc_table * 1e3:6.2f} ms  "
+              f"({list_bytes / max(table_bytes, 1):.1f}x smaller)")
+
+
+def bench_packed(args: argparse.Namespace) -> None:
+    """Text vs packed header size, and pack / unpack time (round-trip: tests/test_packed.py)."""
+    import midi2array2
+
+    for path in args.midi or bundled_midi_files():
+        symbols, _step_s = midi2array2.midi_to_symbol_array(path, steps_per_beat=args.steps_per_beat)
+        blob = midi2array2.pack_symbols(symbols)
+        t_pack = timeit(lambda: midi2array2.pack_symbols(symbols))
+        t_unpack = timeit(lambda: midi2array2.unpack_symbols(blob))
+        text_bytes = midi2array2.text_header_size(symbols)
+        steps = len(symbols) or 1
+        print(
+            f"{os.path.basename(path):40s} steps={len(symbols):6d}  "
+            f"text~{text_bytes:7d}B ({text_bytes / steps:.2f} B/step)  "
+            f"packed={len(blob):7d}B ({len(blob) / steps:.2f} B/step)  "
+            f"pack {t_pack / steps * 1e9:.0f} ns/step, unpack {t_unpack / steps * 1e9:.0f} ns/step"
+        )
+
+
+def bench_phrases(args: argparse.Namespace) -> None:
+    """
+    Phrase format vs packed: flash size, compression ratio and expansion cost
+    (PROGMEM bytes read per played step, host decode time per step), for every
+    bundled song in both modes (round-trip: tests/test_phrases.py).
+    """
+    import midi2array2
+
+    for path in args.midi or bundled_midi_files():
+        for mode in ("onset", "sustain"):
+            symbols, _step_s = midi2array2.midi_to_symbol_array(
+                path,
+                steps_per_beat=args.steps_per_beat,
+                mode=mode,
+                follow_tempo=args.follow_tempo,
+                tempo_source=args.tempo_source,
+            )
+            t0 = time.perf_counter()
+            song = midi2array2.encode_phrases(symbols)
+            t_encode = time.perf_counter() - t0
+            _decoded, read_bytes = midi2array2.decode_phrases(song)
+            blob = midi2array2.pack_symbols(symbols)
+            t_packed = timeit(lambda: midi2array2.unpack_symbols(blob))
+            t_phrases = timeit(lambda: midi2array2.decode_phrases(song))
+
+            steps = len(symbols) or 1
+            size = midi2array2.phrase_song_size(song)
+            data, phrases, order = song
+            print(
+                f"{os.path.basename(path)[:32]:32s} {mode:7s} steps={len(symbols):6d}  "
+                f"packed={len(blob):6d}B  phrases={size:6d}B ({len(blob) / max(size, 1):.2f}x; "
+                f"data {len(data)}B, {len(phrases)} phrases, {len(order)} order)  "
+                f"read {read_bytes / steps:.2f} B/step (packed {len(blob) / steps:.2f})  "
+                f"decode {t_phrases / steps * 1e9:.0f} ns/step (packed {t_packed / steps * 1e9:.0f})  "
+                f"encode {t_encode * 1e3:.1f} ms"
+            )
+
+
+def _legacy_symbol_rows(path: str, header: str, symbols: List[str]) -> None:
+    """midi2array2 --out before format_symbol_rows: one f.write per symbol (and no final partial row)."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(header + "\n")
+        w = 20
+        i = 0
+        j = 0
+        while w * j + i < len(symbols):
+            i = 0
+            for i in range(w):
+                idx = j * w + i
+                if idx >= len(symbols):
+                    break
+                f.write(symbols[idx] + ",")
+            j += 1
+            f.write("\n")
+        f.write("\n")
+
+
+def bench_output(args: argparse.Namespace) -> None:
+    """
+    Step outputs, text vs binary step array (steparray.py), per song:
+    - midi2array --save on --grids-ms: write text / steps from the runs, then
+      read everything back (text: split lines; steps: map + token lookup, and
+      the raw indices alone) and one --window-s slice from the middle (text
+      must parse the whole file; steps maps it and slices).
+    - midi2array2 --out / --out-steps: the old per-symbol text writer vs
+      format_symbol_rows vs the step array.
+    Read-back correctness: tests/test_steparray.py.
+    """
+    import midi2array2
+    import steparray
+
+    def rate(steps: int, seconds: float) -> str:
+        return f"{steps / max(seconds, 1e-9) / 1e6:6.2f} Msteps/s"
+
+    with tempfile.TemporaryDirectory(prefix="output_") as work:
+        txt = os.path.join(work, "out.txt")
+        bin_path = os.path.join(work, "out.steps")
+        for path in args.midi or bundled_midi_files():
+            name = os.path.basename(path)[:32]
+            for grid_ms in args.grids_ms:
+                runs_iter, step_s, segments = midi2array.iter_convert_midi_file(path, grid_ms=grid_ms)
+                runs = list(runs_iter)
+                tokens = [token for _start, length, token in runs for _ in range(length)]
+                n = len(tokens)
+
+                def write_text() -> None:
+                    sink = midi2array.TokenSink(txt, "text", step_s, segments)
+                    for _start, length, token in runs:
+                        sink.write_run(token, length)
+                    sink.close()
+
+                def write_steps() -> None:
+                    sink = midi2array.TokenSink(bin_path, "steps", step_s, segments, grid_ms=grid_ms)
+                    for _start, length, token in runs:
+                        sink.write_run(token, length)
+                    sink.close()
+
+                def read_text() -> List[str]:
+                    with open(txt, encoding="utf-8") as f:
+                        return f.read().splitlines()
+
+                def read_steps() -> List[str]:
+                    with steparray.read_step_array(bin_path) as arr:
+                        table = arr.tokens
+                        return [table[k] for k in arr.indices.tolist()]
+
+                t_mid = n * step_s / 2
+
+                def read_indices() -> Any:
+                    with steparray.read_step_array(bin_path) as arr:
+                        return bytes(arr.indices)
+
+                def window_text() -> List[str]:
+                    return read_text()[i0:i1]
+
+                def window_steps() -> List[str]:
+                    with steparray.read_step_array(bin_path) as arr:
+                        return arr.tokens_between(t_mid, t_mid + args.window_s)
+
+                t_wt = timeit(write_text, args.repeat)
+                t_ws = timeit(write_steps, args.repeat)
+                with steparray.read_step_array(bin_path) as arr:
+                    i0 = arr.step_at(t_mid)
+                    i1 = i0 + len(arr.slice_seconds(t_mid, t_mid + args.window_s))
+                t_rt = timeit(read_text, args.repeat)
+                t_rs = timeit(read_steps, args.repeat)
+                t_ri = timeit(read_indices, args.repeat)
+                t_xt = timeit(window_text, args.repeat)
+                t_xs = timeit(window_steps, args.repeat)
+                print(
+                    f"{name:32s} midi2array {grid_ms:g}ms steps={n:8d}  "
+                    f"text {os.path.getsize(txt):9d}B  steps {os.path.getsize(bin_path):9d}B"
+                )
+                print(f"  write  text {rate(n, t_wt)}  steps {rate(n, t_ws)}  ({t_wt / max(t_ws, 1e-9):.1f}x)")
+                print(
+                    f"  read   text {rate(n, t_rt)}  steps {rate(n, t_rs)}  ({t_rt / max(t_rs, 1e-9):.1f}x), "
+                    f"indices only {rate(n, t_ri)}"
+                )
+                print(
+                    f"  {args.window_s:g}s window  text {t_xt * 1e3:8.3f} ms  steps {t_xs * 1e3:8.3f} ms  "
+                    f"({t_xt / max(t_xs, 1e-9):.0f}x)"
+                )
+
+            symbols, step_s2 = midi2array2.midi_to_symbol_array(path, steps_per_beat=args.steps_per_beat)
+            symbols = symbols * args.scale
+            header = f"# steps={len(symbols)}"
+            t_old = timeit(lambda: _legacy_symbol_rows(txt, header, symbols), args.repeat)
+
+            def write_rows() -> None:
+                with open(txt, "w", encoding="utf-8") as f:
+                    f.write(midi2array2.format_symbol_rows(header, symbols))
+
+            t_new = timeit(write_rows, args.repeat)
+            t_bin = timeit(
+                lambda: steparray.write_step_array(
+                    bin_path, symbols, step_s=step_s2, index_bytes=midi2array2.STEP_INDEX_BYTES
+                ),
+                args.repeat,
+            )
+            n = len(symbols)
+            print(
+                f"{name:32s} midi2array2 --out steps={n:8d}  per-symbol {rate(n, t_old)}  "
+                f"rows {rate(n, t_new)} ({t_old / max(t_new, 1e-9):.1f}x)  "
+                f"--out-steps {rate(n, t_bin)} ({t_old / max(t_bin, 1e-9):.1f}x)"
+            )
+
+
+def bench_firmware(args: argparse.Namespace) -> None:
+    """
+    Song player step handler on the host: for each Songs.h format, build
+    PianoStrip's DemoSong.ino + LedStrip.ino with hostsim/ (simulated strip)
+    and time advanceSongStep() over every bundled song, and count the steps
+    each format lights and sounds differently from the packed player (text
+    may differ where a chord is longer than the firmware's 31-char buffer;
+    the other formats are held to it by tests/test_firmware.py).
+    """
+    import midi2array2
+
+    cxx = shutil.which(args.cxx)
+    if cxx is None:
+        raise SystemExit(f"{args.cxx} not found; the firmware benchmark builds hostsim/ natively")
+    paths = args.midi or bundled_midi_files()
+    songs = []
+    for path in paths:
+        symbols, step_s = midi2array2.midi_to_symbol_array(path, steps_per_beat=args.steps_per_beat, mode=args.mode)
+        songs.append((midi2array2.sanitize_name(os.path.splitext(os.path.basename(path))[0]), symbols, step_s))
+
+    dumps: Dict[str, List[str]] = {}
+    with tempfile.TemporaryDirectory(prefix="hostsim_") as work:
+        for fmt in args.formats:
+            exe = build_hostsim(cxx, os.path.join(work, fmt), fmt, songs)
+            out = subprocess.run(
+                [exe, "--dump", "--repeat", str(args.repeat)], check=True, capture_output=True, text=True
+            ).stdout.splitlines()
+            dumps[fmt] = [line for line in out if line.startswith("step ")]
+            for line in out:
+                if not line.startswith("song "):
+                    continue
+                fields = dict(field.split("=") for field in line.split()[2:])
+                song_name, _symbols, _step_s = songs[int(line.split()[1])]
+                steps = int(fields["steps"]) or 1
+                print(
+                    f"{fmt:8s} {song_name[:32]:32s} steps={steps:6d}  "
+                    f"step {float(fields['mean_ns']):7.1f} ns mean, {float(fields['p99_ns']):7.1f} ns p99  "
+                    f"show() {int(fields['shows']) / steps:.2f}/step"
+                )
+
+    reference = dumps.get("packed")
+    if reference is None:
+        return
+    for fmt, dump in dumps.items():
+        differing = sum(a != b for a, b in zip(dump, reference)) + abs(len(dump) - len(reference))
+        print(f"{fmt:8s} LEDs + buzzer per step: {'same as packed' if not differing else f'{differing} steps differ'}")
+
+
+def bench_stream(args: argparse.Namespace) -> None:
+    """
+    songstream.py against the real firmware: hostsim/ runs DemoSong.ino's
+    Song demo loop in real time on one end of a pseudo-terminal (line limited
+    to --baud, show() taking --show-us, every --corrupt'th byte flipped) and
+    StreamPlayer plays each song (its first --steps steps at --speed) into
+    the other. Per song: the rate the song needs vs what went over the wire,
+    ring occupancy, underruns, worst step lateness (on a desktop OS mostly
+    its scheduling jitter), resends. Playing every step: tests/test_songstream.py.
+    """
+    import midi2array2
+    import songstream
+
+    cxx = shutil.which(args.cxx)
+    if cxx is None:
+        raise SystemExit(f"{args.cxx} not found; the stream benchmark builds hostsim/ natively")
+    paths = args.midi or bundled_midi_files()
+    options = dict(steps_per_beat=args.steps_per_beat, mode=args.mode, follow_tempo=args.follow_tempo)
+    songs = []
+    for path, (symbols, step_s, segments, _elapsed, error, _tempo, _auto_grid) in zip(
+        paths, midi2array2.convert_files(paths, options)
+    ):
+        if error is not None:
+            raise SystemExit(f"{path}: {error}")
+        name = midi2array2.sanitize_name(os.path.splitext(os.path.basename(path))[0])
+        songs.append((name, symbols[: args.steps] if args.steps else symbols, step_s, segments))
+
+    with tempfile.TemporaryDirectory(prefix="hostsim_") as work:
+        # Songs.h only backs the demo between streams; keep it small
+        exe = build_hostsim(cxx, os.path.join(work, "stream"), "packed", [(n, sym[:64], st) for n, sym, st, _seg in songs])
+        master, slave = os.openpty()
+        proc = subprocess.Popen(
+            [exe, "--stream", str(master), "--baud", str(args.baud), "--show-us", str(args.show_us),
+             "--corrupt", str(args.corrupt)],
+            pass_fds=(master,),
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        os.close(master)
+        port = songstream.TtyPort(os.ttyname(slave), args.baud)
+        os.close(slave)
+        try:
+            player = songstream.StreamPlayer(port, timeout_s=args.timeout)
+            for name, symbols, _step_s, segments in songs:
+                first_us, stream = songstream.encode_stream(symbols, segments, speed=args.speed)
+                song_s = songstream.stream_seconds(len(symbols), segments, args.speed)
+                report = player.play(name, first_us, stream, song_s)
+                print(report.summary())
+        finally:
+            port.close()
+            out, _ = proc.communicate(timeout=10)
+        print(f"hostsim: {out.strip()}")
+
+
+def bench_mic(args: argparse.Namespace) -> None:
+    """
+    micdetect.detect (all blocks batched) against a block-at-a-time port of
+    the DemoMic.ino loop, on each song synthesized at --sample-rate: time per
+    block of each, and how many of the port's blocks (the first --blocks)
+    differ in top bins or notes (held to zero by tests/test_micdetect.py).
+    """
+    import micdetect
+    from notearray.notes import parse_events
+
+    paths = args.midi or bundled_midi_files()
+    for path in paths:
+        events, _tempo_map = parse_events(path, parser="raw")
+        samples = micdetect.to_adc(micdetect.synthesize(events, args.sample_rate))
+        audio_s = len(samples) / args.sample_rate
+        for fft_size in args.fft_sizes:
+            batched = timeit(lambda: micdetect.detect(samples, fft_size, args.sample_rate), args.repeat)
+            det = micdetect.detect(samples, fft_size, args.sample_rate)
+            starts = (det.block_start_s * args.sample_rate).round().astype(int)[: args.blocks]
+            t0 = time.perf_counter()
+            port = [
+                firmware_mic_block(samples[s : s + fft_size].tolist(), fft_size, args.sample_rate, micdetect.TOP_BINS)
+                for s in starts.tolist()
+            ]
+            looped = (time.perf_counter() - t0) / max(len(starts), 1)
+            differing = sum(
+                [b for b, _m in blk] != det.bins[k].tolist() or [m for _b, m in blk] != det.midi[k].tolist()
+                for k, blk in enumerate(port)
+            )
+            print(
+                f"{os.path.basename(path)[:32]:32s} N={fft_size:5d} blocks={len(det):6d}  "
+                f"batched {batched / max(len(det), 1) * 1e6:7.2f} us/block ({audio_s / batched:6.0f}x realtime)  "
+                f"per block {looped * 1e6:8.1f} us  "
+                f"{'same' if not differing else f'{differing} differ'} on {len(starts)} blocks"
+            )
+
+
+class ReplayPort(mido.ports.BaseInput):
+    """
+    Local stand-in for a MIDI input port: a thread delivers (seconds,
+    message) pairs at seconds / speed on the wall clock, as a device playing
+    them would, then closes the port. delivered holds the wall time of each.
+    """
+
+    def __init__(self, timed: List[Tuple[float, mido.Message]], speed: float = 1.0):
+        super().__init__("replay")
+        self.speed = speed
+        self.delivered: List[Tuple[float, mido.Message]] = []
+        self.t_start = time.perf_counter()
+        self._thread = threading.Thread(target=self._play, args=(timed,), daemon=True)
+        self._thread.start()
+
+    def _play(self, timed: List[Tuple[float, mido.Message]]) -> None:
+        for t, msg in timed:
+            delay = self.t_start + t / self.speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            with self._lock:
+                self._messages.append(msg)
+                self.delivered.append((time.perf_counter(), msg))
+        self.close()
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def bench_online(args: argparse.Namespace) -> None:
+    """
+    midi2array.OnlineQuantizer vs the file converter, per bundled song:
+    - replay with exact timestamps (no waiting): per-message feed() cost and
+      agreement with convert_midi_file on the raw messages and on the
+      extracted note events (the raw messages differ where a held note is
+      struck again, see OnlineQuantizer; tests/test_online.py holds the
+      extracted events to exact agreement).
+    - replay through ReplayPort in simulated real time (--speed) via
+      quantize_live: how long after its end each bin is emitted, and how
+      long after a note-on arrives its bin comes out.
+    """
+    for path in args.midi or bundled_midi_files():
+        name = os.path.basename(path)[:32]
+        mid = mido.MidiFile(path)
+        tempo_map = midi2array.TempoMap.from_midi(mid)
+        events = midi2array.extract_note_table(mid, tempo_map=tempo_map)
+        timed = [(t, ti, msg) for t, ti, msg in midi2array.iter_timed_messages(mid, tempo_map) if not msg.is_meta]
+        t_end = tempo_map.ticks_to_seconds(max((sum(msg.time for msg in track) for track in mid.tracks), default=0))
+        clean = []  # the extracted events as messages: note-offs first on ties
+        for e in events:
+            clean.append((e.start_s, 1, e.track, mido.Message("note_on", channel=e.channel, note=e.note, velocity=e.velocity)))
+            clean.append((e.end_s, 0, e.track, mido.Message("note_off", channel=e.channel, note=e.note)))
+        clean.sort(key=lambda x: (x[0], x[1]))
+
+        for grid in args.grids:
+            grid_ms = float(grid[:-2]) if grid.endswith("ms") else None
+            step_s, _tempo_grid = midi2array.resolve_grid(
+                tempo_map, grid=None if grid_ms else grid, grid_ms=grid_ms
+            )
+            for policy in args.policies:
+                ref = midi2array.events_to_array(events, step_s, policy=policy)
+                q = midi2array.OnlineQuantizer(step_s, policy=policy)
+                out: List[Tuple[int, str]] = []
+                costs: List[float] = []
+                for t, ti, msg in timed:
+                    t0 = time.perf_counter()
+                    out.extend(q.feed(msg, t, ti))
+                    costs.append(time.perf_counter() - t0)
+                out.extend(q.flush(t_end))
+                tokens = [token for _i, token in out]
+                file_diff = sum(a != b for a, b in zip(tokens, ref)) + max(len(ref) - len(tokens), 0)
+
+                q = midi2array.OnlineQuantizer(step_s, policy=policy)
+                out = []
+                for t, _off_first, ti, msg in clean:
+                    out.extend(q.feed(msg, t, ti))
+                out.extend(q.flush(clean[-1][0] if clean else 0.0))
+                clean_diff = sum(a != b for (_i, a), b in zip(out, ref)) + abs(len(out) - len(ref))
+                print(
+                    f"{name:32s} {grid:6s} {policy:8s} bins={len(ref):7d}  "
+                    f"feed {sum(costs) / max(len(costs), 1) * 1e6:6.2f} us/msg mean, "
+                    f"{_percentile(costs, 0.99) * 1e6:6.2f} us p99  "
+                    f"differs: file {file_diff} bins, events {clean_diff} bins"
+                )
+
+        if args.realtime_s <= 0:
+            continue
+        grid = args.grids[0]
+        grid_ms = float(grid[:-2]) if grid.endswith("ms") else None
+        step_s, _tempo_grid = midi2array.resolve_grid(tempo_map, grid=None if grid_ms else grid, grid_ms=grid_ms)
+        speed = args.speed
+        window = [(t, msg) for t, _ti, msg in timed if t < args.realtime_s]
+        q = midi2array.OnlineQuantizer(step_s, policy=args.policies[0])
+        port = ReplayPort(window, speed=speed)
+        emitted: Dict[int, Tuple[float, str]] = {}
+        lags: List[float] = []
+        for i, token in midi2array.quantize_live(port, q, clock=lambda: time.perf_counter() * speed):
+            emitted[i] = (time.perf_counter(), token)
+            lags.append((q.now - q.bin_edges(i)[1]) / speed)
+        # note-on -> its bin out, on the quantizer's timeline (port start)
+        note_lat = []
+        for wall, msg in port.delivered:
+            if msg.type == "note_on" and msg.velocity > 0:
+                k = int((wall - port.t_start) * speed // step_s)
+                if k in emitted:
+                    note_lat.append(emitted[k][0] - wall)
+        # arrival jitter can move an onset across a bin edge
+        ref = midi2array.events_to_array(events, step_s, policy=args.policies[0])
+        compared = [i for i in emitted if i < len(ref)]
+        same = sum(emitted[i][1] == ref[i] for i in compared)
+        bin_wall = step_s / speed
+        print(
+            f"{name:32s} live {grid} x{speed:g}: {len(window)} msgs, {len(emitted)} bins "
+            f"({bin_wall * 1e3:.1f} ms/bin wall)  emit lag {sum(lags) / max(len(lags), 1) * 1e3:.2f} ms mean, "
+            f"{max(lags, default=0.0) * 1e3:.2f} ms max ({max(lags, default=0.0) / bin_wall:.2f} bin)  "
+            f"note-on -> bin {_percentile(note_lat, 0.5) * 1e3:.1f} ms median, "
+            f"{max(note_lat, default=0.0) * 1e3:.1f} ms max ({max(note_lat, default=0.0) / bin_wall:.2f} bin)  "
+            f"same as file: {same / max(len(compared), 1):.1%}"
+        )
+
+
+# ---------------------------------------------------------------------------
+# suite: per-stage timings of both converters on the bundled corpus and
+# scaled-up copies, peak RSS per case, JSON results comparable across commits.
+
+# Libraries the converters import lazily (notearray/backends.py).
+HEAVY_MODULES = ("mido", "numpy", "pretty_midi")
+
+
+def _import_times(argv: List[str]) -> Dict[str, float]:
+    """Cumulative import time (ms) per top-level import of `python -X importtime <argv>`."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime"] + argv, cwd=here, capture_output=True, text=True, check=True
+    )
+    times: Dict[str, float] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if cumulative_us.strip().isdigit():
+            times[name.strip()] = int(cumulative_us) / 1000.0
+    return times
+
+
+def _wall_time(argv: List[str], repeat: int) -> float:
+    here = os.path.dirname(os.path.abspath(__file__))
+    return timeit(
+        lambda: subprocess.run([sys.executable] + argv, cwd=here, capture_output=True, check=True), repeat=repeat
+    )
+
+
+def bench_startup(args: argparse.Namespace) -> None:
+    """
+    Startup cost of the entry points (python -X importtime): import time,
+    --help and a cache-hit conversion of the bundled songs, which heavy
+    libraries each one loads, and what each of those costs once it is used.
+    """
+    songs = args.midi or bundled_midi_files()
+    work_dir = tempfile.mkdtemp(prefix="pianostrip-startup-")
+    try:
+        runs = {
+            "midi2array": ["midi2array.py", songs[0], "--grid", "16th"],
+            "midi2array2": ["midi2array2.py"] + songs + ["--out-header", os.path.join(work_dir, "songs.h")],
+        }
+        for entry, argv in runs.items():
+            argv = argv + ["--cache-dir", work_dir]
+            _wall_time(argv, 1)  # fill the cache
+            import_ms = min(_import_times(["-c", f"import {entry}"])[entry] for _ in range(args.repeat))
+            on_import = [m for m in HEAVY_MODULES if m in _import_times(["-c", f"import {entry}"])]
+            on_hit = [m for m in HEAVY_MODULES if m in _import_times(argv)]
+            t_help = _wall_time([f"{entry}.py", "--help"], args.repeat)
+            t_hit = _wall_time(argv, args.repeat)
+            print(
+                f"{entry:12s} import {import_ms:6.1f} ms  --help {t_help * 1e3:6.1f} ms  "
+                f"cache hit {t_hit * 1e3:6.1f} ms  heavy modules loaded on import: {', '.join(on_import) or 'none'}, "
+                f"on cache hit: {', '.join(on_hit) or 'none'}"
+            )
+        costs = [
+            f"{m} {min(_import_times(['-c', f'import {m}'])[m] for _ in range(args.repeat)):.1f} ms"
+            for m in HEAVY_MODULES
+        ]
+        print("import cost when first used: " + "  ".join(costs))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_tempo_detect(args: argparse.Namespace) -> None:
+    """
+    midi2array2 fixed-grid tempo: pretty_midi.estimate_tempo vs the declared
+    tempo map and the histogram estimator, time and BPM per file, on the
+    bundled songs and scaled-up copies.
+    """
+    import midi2array2
+
+    work_dir = tempfile.mkdtemp(prefix="pianostrip-tempo-")
+    try:
+        for path in args.midi or bundled_midi_files():
+            label = os.path.splitext(os.path.basename(path))[0]
+            for scale in args.scales:
+                scaled_path = path
+                if scale != 1:
+                    scaled_path = os.path.join(work_dir, f"{label}.x{scale}.mid")
+                    scale_midi(mido.MidiFile(path), scale, args.extra_voices).save(scaled_path)
+                pm, declares_tempo = midi2array2.load_pretty_midi(scaled_path, "auto")
+                n_onsets = sum(len(inst.notes) for inst in pm.instruments)
+                print(f"{label} x{scale}  onsets={n_onsets}  tempo changes={len(pm.get_tempo_changes()[0])}")
+                reference = None
+                for source in midi2array2.TEMPO_SOURCES:
+                    bpm, used = midi2array2.detect_tempo(pm, source, declares_tempo)
+                    t = timeit(lambda: midi2array2.detect_tempo(pm, source, declares_tempo), repeat=args.repeat)
+                    if reference is None:
+                        reference = t
+                    print(
+                        f"  {source:12s} {t * 1e3:9.3f} ms  {bpm:8.2f} bpm ({used})  "
+                        f"{reference / t:7.1f}x"
+                    )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_variants(args: argparse.Namespace) -> None:
+    """
+    N separate convert_midi_file runs vs one convert_midi_file_variants call
+    (one parse, one sweep per grid), every grid x policy combination, with a
+    parse-only baseline (same tokens: tests/test_variants.py).
+    """
+    variants = [
+        midi2array.Variant.parse(f"{grid}:{policy}") for grid in args.variants for policy in args.policies
+    ]
+    work_dir = tempfile.mkdtemp(prefix="pianostrip-variants-")
+    try:
+        for path in args.midi or bundled_midi_files():
+            label = os.path.splitext(os.path.basename(path))[0]
+            for scale in args.scales:
+                scaled_path = path
+                if scale != 1:
+                    scaled_path = os.path.join(work_dir, f"{label}.x{scale}.mid")
+                    scale_midi(mido.MidiFile(path), scale, args.extra_voices).save(scaled_path)
+
+                def separate() -> List[Any]:
+                    return [
+                        midi2array.convert_midi_file(
+                            scaled_path,
+                            grid=v.grid,
+                            grid_ms=v.grid_ms,
+                            policy=v.policy,
+                            silence_token=v.silence_token,
+                            engine=args.engine,
+                            parser=args.parser,
+                        )
+                        for v in variants
+                    ]
+
+                def single_pass() -> List[Any]:
+                    return midi2array.convert_midi_file_variants(
+                        scaled_path, variants, engine=args.engine, parser=args.parser
+                    )
+
+                t_parse = timeit(lambda: midi2array.parse_events(scaled_path, parser=args.parser), repeat=args.repeat)
+                t_separate = timeit(separate, repeat=args.repeat)
+                t_single = timeit(single_pass, repeat=args.repeat)
+                print(
+                    f"{label} x{scale}  variants={len(variants)}  parse {t_parse * 1e3:8.1f} ms  "
+                    f"separate {t_separate * 1e3:8.1f} ms  single pass {t_single * 1e3:8.1f} ms  "
+                    f"({t_separate / t_single:.1f}x, {t_single / t_parse:.1f}x one parse)"
+                )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, in MB (None if unsupported)."""
+    # VmHWM starts over at exec; ru_maxrss can carry the parent's peak across it.
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _timed(timings: Dict[str, float], stage: str, fn: Callable[[], Any]) -> Any:
+    t0 = time.perf_counter()
+    out = fn()
+    timings[stage] = time.perf_counter() - t0
+    return out
+
+
+def _midi2array_stages(case: Dict[str, Any], out_dir: str, timings: Dict[str, float]) -> int:
+    """parse -> extract (tempo map, grid, note events) -> quantize -> emit (one token per line)."""
+    raw_parser = case.get("parser", "mido") == "raw"
+    read = smfreader.read_smf if raw_parser else mido.MidiFile
+    mid = _timed(timings, "parse", lambda: read(case["path"]))
+
+    def extract():
+        if raw_parser:
+            tempo_map = midi2array.TempoMap.from_raw(mid)
+            events = midi2array.extract_note_events_raw(mid, tempo_map=tempo_map)
+        else:
+            tempo_map = midi2array.TempoMap.from_midi(mid)
+            events = midi2array.extract_note_events(mid, tempo_map=tempo_map)
+        if case["grid"].endswith("ms"):
+            step_s = float(case["grid"][:-2]) / 1000.0
+        else:
+            step_s = midi2array.grid_step_seconds_from_musical(None, case["grid"], tempo_map=tempo_map)
+        return events, step_s
+
+    events, step_s = _timed(timings, "extract", extract)
+    tokens = _timed(
+        timings,
+        "quantize",
+        lambda: midi2array.events_to_array(events, step_s, policy=case["policy"], engine=case["engine"]),
+    )
+
+    def emit():
+        with open(os.path.join(out_dir, "tokens.txt"), "w", encoding="utf-8") as f:
+            for token in tokens:
+                f.write(token + "\n")
+
+    _timed(timings, "emit", emit)
+    return len(tokens)
+
+
+def _midi2array2_stages(case: Dict[str, Any], out_dir: str, timings: Dict[str, float]) -> int:
+    """parse (pretty_midi) -> tempo -> quantize (note extraction included) -> emit (Songs.h)."""
+    import midi2array2
+
+    tempo_source = case.get("tempo_source", "pretty_midi")
+    pm, declares_tempo = _timed(timings, "parse", lambda: midi2array2.load_pretty_midi(case["path"], tempo_source))
+    bpm, _source = _timed(timings, "tempo", lambda: midi2array2.detect_tempo(pm, tempo_source, declares_tempo))
+    symbols, step_s, segments = _timed(
+        timings,
+        "quantize",
+        lambda: midi2array2.pretty_midi_to_symbol_song(
+            pm, steps_per_beat=case["steps_per_beat"], mode=case["mode"], bpm=bpm
+        ),
+    )
+    header = os.path.join(out_dir, "Songs.h")
+    songs = [("Bench", symbols, step_s)]
+    if case["format"] == "packed":
+        emit = lambda: midi2array2.emit_packed_header(songs, header, symbol_silence=" ", song_tempos=[segments])
+    else:
+        emit = lambda: midi2array2.emit_header(songs, header, song_tempos=[segments])
+    _timed(timings, "emit", emit)
+    return len(symbols)
+
+
+def run_case(case: Dict[str, Any], repeat: int = 1, profile_dir: Optional[str] = None, profiler: str = "cprofile") -> Dict[str, Any]:
+    """
+    Run one benchmark case `repeat` times (best time per stage), then once
+    more under the profiler if profile_dir is set. Top-level so it can run
+    in a fresh worker process, which makes peak RSS per case.
+    """
+    stages = _midi2array_stages if case["converter"] == "midi2array" else _midi2array2_stages
+    rss_before = peak_rss_mb()
+    best: Dict[str, float] = {}
+    out_dir = tempfile.mkdtemp(prefix="pianostrip-bench-")
+    try:
+        for _ in range(repeat):
+            timings: Dict[str, float] = {}
+            steps = stages(case, out_dir, timings)
+            for stage, seconds in timings.items():
+                best[stage] = min(seconds, best.get(stage, math.inf))
+        if profile_dir is not None:
+            # Extra, untimed run: profiler overhead must not skew the stage times
+            prof = _start_profiler(profiler)
+            stages(case, out_dir, {})
+            _stop_profiler(prof, profiler, os.path.join(profile_dir, case_slug(case)))
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return {
+        **{k: v for k, v in case.items() if k != "path"},
+        "id": case_id(case),
+        "stages": best,
+        "total_s": sum(best.values()),
+        "steps": steps,
+        "rss_start_mb": rss_before,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _start_profiler(profiler: str) -> Any:
+    if profiler == "pyinstrument":
+        from pyinstrument import Profiler  # optional: pip install pyinstrument
+
+        prof = Profiler()
+        prof.start()
+        return prof
+    prof = cProfile.Profile()
+    prof.enable()
+    return prof
+
+
+def _stop_profiler(prof: Any, profiler: str, path_stem: str) -> None:
+    """Dump the profile next to a text summary of the hottest functions."""
+    if profiler == "pyinstrument":
+        prof.stop()
+        with open(path_stem + ".txt", "w", encoding="utf-8") as f:
+            f.write(prof.output_text())
+        return
+    prof.disable()
+    prof.dump_stats(path_stem + ".prof")
+    text = io.StringIO()
+    pstats.Stats(prof, stream=text).sort_stats("cumulative").print_stats(25)
+    with open(path_stem + ".txt", "w", encoding="utf-8") as f:
+        f.write(text.getvalue())
+
+
+def case_id(case: Dict[str, Any]) -> str:
+    if case["converter"] == "midi2array":
+        variant = f"grid={case['grid']} policy={case['policy']} engine={case['engine']}"
+        if case.get("parser", "mido") != "mido":
+            variant += f" parser={case['parser']}"
+    else:
+        variant = f"spb={case['steps_per_beat']} mode={case['mode']} format={case['format']}"
+        if case.get("tempo_source", "pretty_midi") != "pretty_midi":
+            variant += f" tempo={case['tempo_source']}"
+    return f"{case['converter']} {case['label']} x{case['scale']} {variant}"
+
+
+def case_slug(case: Dict[str, Any]) -> str:
+    return re.sub(r"[^A-Za-z0-9_.=-]+", "_", case_id(case)).strip("_")
+
+
+def git_revision() -> Optional[str]:
+    """Short commit hash of the working tree (with '+dirty' if modified), if in a git checkout."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        rev = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=here, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=here, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return rev + ("+dirty" if dirty else "")
+
+
+def build_corpus(args: argparse.Namespace, work_dir: str) -> List[Dict[str, Any]]:
+    """(path, label, scale) for every input file at every scale; scaled copies go to work_dir."""
+    corpus = []
+    for path in args.midi or bundled_midi_files():
+        label = os.path.splitext(os.path.basename(path))[0]
+        for scale in args.scales:
+            if scale == 1:
+                scaled_path = path
+            else:
+                scaled_path = os.path.join(work_dir, f"{label}.x{scale}.mid")
+                scale_midi(mido.MidiFile(path), scale, args.extra_voices).save(scaled_path)
+            corpus.append({"path": scaled_path, "label": label, "scale": scale})
+    return corpus
+
+
+def build_cases(args: argparse.Namespace, corpus: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    cases = []
+    for entry in corpus:
+        if "midi2array" in args.converters:
+            for grid in args.grids:
+                for policy in args.policies:
+                    for engine in args.engines:
+                        for parser in args.parsers:
+                            cases.append(
+                                {
+                                    **entry,
+                                    "converter": "midi2array",
+                                    "grid": grid,
+                                    "policy": policy,
+                                    "engine": engine,
+                                    "parser": parser,
+                                }
+                            )
+        if "midi2array2" in args.converters:
+            for spb in args.steps_per_beat:
+                for fmt in args.formats:
+                    for tempo_source in args.tempo_sources:
+                        cases.append(
+                            {
+                                **entry,
+                                "converter": "midi2array2",
+                                "steps_per_beat": spb,
+                                "mode": args.mode,
+                                "format": fmt,
+                                "tempo_source": tempo_source,
+                            }
+                        )
+    return cases
+
+
+def _fmt_rss(mb: Optional[float]) -> str:
+    return "     n/a" if mb is None else f"{mb:7.1f}M"
+
+
+def bench_suite(args: argparse.Namespace) -> None:
+    """
+    Stage timings (parse / extract / tempo / quantize / emit) for both converters on
+    the bundled corpus and scaled-up copies. Each case runs in a fresh
+    process (unless --in-process) so peak RSS is per case.
+    """
+    if "numpy" in args.engines and midi2array.np is None:
+        raise SystemExit("--engines numpy requires numpy")
+    if args.profile:
+        os.makedirs(args.profile, exist_ok=True)
+
+    work_dir = tempfile.mkdtemp(prefix="pianostrip-corpus-")
+    try:
+        cases = build_cases(args, build_corpus(args, work_dir))
+        results = []
+        print(f"{'case':78s} {'parse':>8s} {'extract':>8s} {'tempo':>8s} {'quantize':>8s} {'emit':>8s} {'total':>8s} {'steps':>9s} {'peak RSS':>8s}")
+        for case in cases:
+            if args.in_process:
+                res = run_case(case, args.repeat, args.profile, args.profiler)
+                res["peak_rss_mb"] = None  # process-wide peak, not this case's
+            else:
+                # A fresh interpreter per case, so ru_maxrss is this case's peak
+                ctx = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                    res = pool.submit(run_case, case, args.repeat, args.profile, args.profiler).result()
+            results.append(res)
+            st = res["stages"]
+            cols = " ".join(
+                f"{st[name] * 1e3:7.1f}m" if name in st else f"{'-':>8s}"
+                for name in ("parse", "extract", "tempo", "quantize", "emit")
+            )
+            print(f"{res['id']:78s} {cols} {res['total_s'] * 1e3:7.1f}m {res['steps']:9d} {_fmt_rss(res['peak_rss_mb'])}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": getattr(midi2array.np, "__version__", None),
+            "mido": getattr(mido, "__version__", None),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+        print(f"wrote {args.json}")
+    if args.profile:
+        print(f"profiles in {args.profile}/ (<case>.prof + <case>.txt)")
+    if args.compare:
+        compare_reports(args.compare, report, args.threshold)
+
+
+def compare_reports(base_path: str, report: Dict[str, Any], threshold: float) -> None:
+    """Per-case total time and peak RSS against an earlier --json run."""
+    with open(base_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    base_by_id = {res["id"]: res for res in base["results"]}
+    print(f"vs {base_path} (revision {base['meta'].get('revision')})")
+    regressions = 0
+    for res in report["results"]:
+        old = base_by_id.get(res["id"])
+        if old is None:
+            print(f"  {res['id']:78s} new case")
+            continue
+        ratio = res["total_s"] / old["total_s"] if old["total_s"] else math.inf
+        flag = ""
+        if ratio > 1.0 + threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        rss = ""
+        if res.get("peak_rss_mb") is not None and old.get("peak_rss_mb") is not None:
+            rss = f"  rss {old['peak_rss_mb']:.1f}M -> {res['peak_rss_mb']:.1f}M"
+        print(f"  {res['id']:78s} {old['total_s'] * 1e3:8.1f}ms -> {res['total_s'] * 1e3:8.1f}ms ({ratio:5.2f}x){rss}{flag}")
+    print(f"  {regressions} case(s) slower than {1.0 + threshold:.2f}x")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmarks for midi2array / midi2array2")
+    sub = ap.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("tempo-map", help="tick->seconds lookups on a dense tempo map")
+    p.add_argument("--tempo-changes", type=int, default=10000)
+    p.add_argument("--notes", type=int, default=20000)
+    p.add_argument("--lookups", type=int, default=20000)
+    p.set_defaults(func=bench_tempo_map)
+
+    p = sub.add_parser("packed", help="packed song format: flash size, pack and unpack time")
+    p.add_argument("midi", nargs="*", help="MIDI files (default: bundled songs)")
+    p.add_argument("--steps-per-beat", type=int, default=4)
+    p.set_defaults(func=bench_packed)
+
+    p = sub.add_parser("phrases", help="phrase format vs packed: compression ratio and expansion cost")
+    p.add_argument("midi", nargs="*", help="MIDI files (default: bundled songs)")
+    p.add_argument("--steps-per-beat", type=int, default=4)
+    p.add_argument("--follow-tempo", action="store_true")
+    p.add_argument("--tempo-source", default="pretty_midi", choices=["pretty_midi", "declared", "estimated", "auto"])
+    p.set_defaults(func=bench_phrases)
+
+    p = sub.add_parser("output", help="text outputs vs binary step arrays: write/read/slice throughput")
+    p.add_argument("midi", nargs="*", help="MIDI files (default: bundled songs)")
+    p.add_argument("--grids-ms", type=float, nargs="+", default=[10.0, 1.0], help="midi2array fixed grids")
+    p.add_argument("--window-s", type=float, default=10.0, help="time slice read from the middle")
+    p.add_argument("--steps-per-beat", type=int, default=4, help="midi2array2 grid")
+    p.add_argument("--scale", type=int, default=20, help="midi2array2 symbols repeated N times")
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_output)
+
+    p = sub.add_parser("firmware", help="song player step handler on the host (hostsim/): time per step per format")
+    p.add_argument("midi", nargs="*", help="MIDI files (default: bundled songs)")
+    p.add_argument("--formats", nargs="+", choices=FIRMWARE_FORMATS, default=list(FIRMWARE_FORMATS))
+    p.add_argument("--steps-per-beat", type=int, default=4)
+    p.add_argument("--mode", choices=["onset", "sustain"], default="onset")
+    p.add_argument("--repeat", type=int, default=10, help="timed passes over each song")
+    p.add_argument("--cxx", default="g++", help="host C++ compiler")
+    p.set_defaults(func=bench_firmware)
+
+    p = sub.add_parser("stream", help="songstream.py into hostsim/ over a pty: throughput, ring fill, underruns")
+    p.add_argument("midi", nargs="*", help="MIDI files (default: bundled songs)")
+    p.add_argument("--steps", type=int, default=300, help="stream each song's first N steps (0 = all)")
+    p.add_argument("--speed", type=float, default=4.0, help="playback speed factor")
+    p.add_argument("--steps-per-beat", type=int, default=4)
+    p.add_argument("--mode", choices=["onset", "sustain"], default="onset")
+    p.add_argument("--follow-tempo", action="store_true", help="stream tempo changes too")
+    p.add_argument("--baud", type=int, default=115200, help="simulated line speed")
+    p.add_argument("--show-us", type=int, default=1800, help="simulated strip write time (60 WS2812B: ~1.8 ms)")
+    p.add_argument("--corrupt", type=int, default=0, help="flip a bit in every Nth byte the board receives")
+    p.add_argument("--timeout", type=float, default=0.25, help="StreamPlayer resend timeout")
+    p.add_argument("--cxx", default="g++", help="host C++ compiler")
+    p.set_defaults(func=bench_stream)
+
+    p = sub.add_parser("mic", help="micdetect.py batched DemoMic detector vs per-block firmware port")
+    p.add_argument("midi", nargs="*", help="MIDI files (default: bundled songs)")
+    p.add_argument("--fft-sizes", type=int, nargs="+", default=[128, 256, 512, 1024], help="kFftSamples values")
+    p.add_argument("--sample-rate", type=float, default=8000.0, help="kFftSampleRate")
+    p.add_argument("--blocks", type=int, default=2000, help="blocks run through the per-block port")
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_mic)
+
+    p = sub.add_parser("online", help="midi2array.OnlineQuantizer: per-message cost, live replay latency")
+    p.add_argument("midi", nargs="*", help="MIDI files (default: bundled songs)")
+    p.add_argument("--grids", nargs="+", default=["16th", "10ms"], help="musical grids or <N>ms")
+    p.add_argument("--policies", nargs="+", choices=midi2array.POLICIES, default=list(midi2array.POLICIES))
+    p.add_argument("--speed", type=float, default=8.0, help="live replay speed-up")
+    p.add_argument("--realtime-s", type=float, default=30.0, help="song seconds replayed live (0: skip)")
+    p.set_defaults(func=bench_online)
+
+    p = sub.add_parser("memory", help="peak memory: events_to_array vs iter_events_to_array")
+    p.add_argument("--grid-ms", type=float, default=1.0)
+    p.add_argument("--notes", type=int, default=1000, help="notes at scale 1")
+    p.add_argument("--scales", type=int, nargs="+", default=[1, 4, 16])
+    p.add_argument("--policy", default="highest")
+    p.set_defaults(func=bench_memory)
+
+    p = sub.add_parser("tempo-grid", help="tempo-following grid vs fixed grids: steps and onset error")
+    p.add_argument("midi", nargs="*", help="MIDI files (default: bundled songs)")
+    p.add_argument("--grid", default="16th")
+    p.set_defaults(func=bench_tempo_grid)
+
+    p = sub.add_parser("auto-grid", help="--auto-grid: candidate sweep time per song, chosen grid")
+    p.add_argument("midi", nargs="*", help="MIDI files (default: bundled songs)")
+    p.add_argument("--max-error-ms", type=float, default=10.0)
+    p.add_argument("--follow-tempo", action="store_true")
+    p.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    p.add_argument("--extra-voices", type=int, default=2, help="added chord voices in scaled copies")
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_auto_grid)
+
+    p = sub.add_parser("note-index", help="NoteIndex: per-bin sweep and point/range queries")
+    p.add_argument("--grid-ms", type=float, default=10.0)
+    p.add_argument("--notes", type=int, default=100000, help="notes in the synthetic piece")
+    p.add_argument("--queries", type=int, default=2000)
+    p.add_argument("--policy", default="highest")
+    p.set_defaults(func=bench_note_index)
+
+    p = sub.add_parser("parse", help="mido vs built-in smfreader: parse + note extraction")
+    p.add_argument("midi", nargs="*", help="MIDI files (default: bundled songs)")
+    p.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    p.add_argument("--extra-voices", type=int, default=2, help="added chord voices in scaled copies")
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_parse)
+
+    p = sub.add_parser("note-table", help="List[NoteEvent] vs NoteEventTable: memory per note, sort, gc")
+    p.add_argument("--notes", type=int, default=200000, help="notes in the synthetic piece")
+    p.set_defaults(func=bench_note_table)
+
+    p = sub.add_parser("startup", help="entry point startup: import time (-X importtime), --help, cache hits")
+    p.add_argument("midi", nargs="*", help="MIDI files (default: bundled songs)")
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser("tempo-detect", help="midi2array2 grid tempo: estimate_tempo vs declared vs histogram")
+    p.add_argument("midi", nargs="*", help="MIDI files (default: bundled songs)")
+    p.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    p.add_argument("--extra-voices", type=int, default=2, help="added chord voices in scaled copies")
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_tempo_detect)
+
+    p = sub.add_parser("variants", help="midi2array: N separate runs vs one multi-variant pass")
+    p.add_argument("midi", nargs="*", help="MIDI files (default: bundled songs)")
+    p.add_argument("--variants", nargs="+", default=["16th", "8th", "10ms"], help="grids: 16th, 8th, ... or <N>ms")
+    p.add_argument("--policies", nargs="+", default=["highest", "loudest", "lowest"])
+    p.add_argument("--engine", default="python", choices=["python", "numpy"])
+    p.add_argument("--parser", default="mido", choices=["mido", "raw"])
+    p.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    p.add_argument("--extra-voices", type=int, default=2, help="added chord voices in scaled copies")
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_variants)
+
+    p = sub.add_parser("suite", help="per-stage timings + peak RSS of both converters, JSON results")
+    p.add_argument("midi", nargs="*", help="MIDI files (default: bundled songs)")
+    p.add_argument("--scales", type=int, nargs="+", default=[1, 10], help="corpus scales (x times longer)")
+    p.add_argument("--extra-voices", type=int, default=2, help="added chord voices in scaled copies")
+    p.add_argument("--converters", nargs="+", default=["midi2array", "midi2array2"], choices=["midi2array", "midi2array2"])
+    p.add_argument("--grids", nargs="+", default=["16th", "10ms"], help="midi2array grids: 16th, 8th, ... or <N>ms")
+    p.add_argument("--policies", nargs="+", default=["highest"])
+    p.add_argument("--engines", nargs="+", default=["python"], choices=["python", "numpy"])
+    p.add_argument("--parsers", nargs="+", default=["mido"], choices=["mido", "raw"], help="midi2array readers")
+    p.add_argument("--steps-per-beat", type=int, nargs="+", default=[4], help="midi2array2 grids")
+    p.add_argument("--mode", default="onset", choices=["onset", "sustain"], help="midi2array2 mode")
+    p.add_argument(
+        "--tempo-sources",
+        nargs="+",
+        default=["pretty_midi"],
+        choices=["pretty_midi", "declared", "estimated", "auto"],
+        help="midi2array2 fixed-grid tempo sources",
+    )
+    p.add_argument("--formats", nargs="+", default=["text", "packed"], choices=["text", "packed"])
+    p.add_argument("--repeat", type=int, default=1, help="runs per case (best time per stage)")
+    p.add_argument("--in-process", action="store_true", help="no worker process per case (no per-case RSS)")
+    p.add_argument("--json", default=None, help="write results to this JSON file")
+    p.add_argument("--compare", default=None, help="earlier --json file to compare against")
+    p.add_argument("--threshold", type=float, default=0.10, help="slowdown reported as regression (0.10 = 10%%)")
+    p.add_argument("--profile", default=None, metavar="DIR", help="dump a profile of every case into DIR")
+    p.add_argument("--profiler", default="cprofile", choices=["cprofile", "pyinstrument"])
+    p.set_defaults(func=bench_suite)
+
+    args = ap.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
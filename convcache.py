@@ -0,0 +1,229 @@
+"""
+convcache.py
+
+Content-addressed on-disk cache for converter outputs (symbol arrays).
+
+Key = sha256 of the MIDI file bytes + tool name/version + normalized options,
+so a cache entry is reused only when neither the file, the options nor the
+converter source changed.
+
+Entries are stored compactly as runs of identical tokens: the distinct
+tokens once (vocabulary), then one uint16/uint32 token index and one uint32
+length per run, zlib-compressed. Total size is bounded;
+least recently used entries (by file mtime, refreshed on hit) are evicted.
+
+Default location: $XDG_CACHE_HOME/pianostrip or ~/.cache/pianostrip
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import zlib
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+ENTRY_SUFFIX = ".sym"
+
+
+def default_cache_dir() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pianostrip")
+
+
+def tool_version(source_paths: Union[str, Iterable[str]]) -> str:
+    """
+    Version string of a converter: hash of the sources of every module on its
+    conversion path (one path or several, order does not matter), so an edit
+    to any of them invalidates entries.
+    """
+    if isinstance(source_paths, str):
+        source_paths = [source_paths]
+    h = hashlib.sha256()
+    for path in sorted(set(os.path.abspath(p) for p in source_paths)):
+        with open(path, "rb") as f:
+            data = f.read()
+        h.update(os.path.basename(path).encode("utf-8"))
+        h.update(struct.pack("<Q", len(data)))
+        h.update(data)
+    return h.hexdigest()[:16]
+
+
+# Bumped when the entry layout changes; part of every key.
+CACHE_FORMAT = 3
+
+# (start_step, length, token)
+Run = Tuple[int, int, str]
+
+
+def runs_from_symbols(symbols: List[str]) -> List[Run]:
+    runs: List[Run] = []
+    for i, sym in enumerate(symbols):
+        if runs and runs[-1][2] == sym:
+            start, length, _ = runs[-1]
+            runs[-1] = (start, length + 1, sym)
+        else:
+            runs.append((i, 1, sym))
+    return runs
+
+
+def symbols_from_runs(runs: List[Run]) -> List[str]:
+    out: List[str] = []
+    for _start, length, sym in runs:
+        out.extend([sym] * length)
+    return out
+
+
+def encode_runs(runs: List[Run], step_s: float, meta: Optional[Dict[str, Any]] = None) -> bytes:
+    vocab: Dict[str, int] = {}
+    for _start, _length, sym in runs:
+        if sym not in vocab:
+            vocab[sym] = len(vocab)
+    typecode = "H" if len(vocab) <= 0xFFFF else "I"
+    index = array(typecode, [vocab[sym] for _s, _l, sym in runs])
+    lengths = array("I", [length for _s, length, _sym in runs])
+    header = json.dumps(
+        {
+            "step_s": step_s,
+            "vocab": list(vocab),
+            "typecode": typecode,
+            "count": len(runs),
+            "meta": meta or {},
+        }
+    ).encode("utf-8")
+    return zlib.compress(
+        struct.pack("<I", len(header)) + header + index.tobytes() + lengths.tobytes()
+    )
+
+
+def decode_runs(data: bytes) -> Tuple[List[Run], float, Dict[str, Any]]:
+    raw = zlib.decompress(data)
+    (header_len,) = struct.unpack_from("<I", raw, 0)
+    header = json.loads(raw[4 : 4 + header_len].decode("utf-8"))
+    count = header["count"]
+    index = array(header["typecode"])
+    lengths = array("I")
+    body = raw[4 + header_len :]
+    split = count * index.itemsize
+    index.frombytes(body[:split])
+    lengths.frombytes(body[split:])
+    if len(index) != count or len(lengths) != count:
+        raise ValueError("truncated cache entry")
+    vocab = header["vocab"]
+    runs: List[Run] = []
+    start = 0
+    for i, length in zip(index, lengths):
+        runs.append((start, length, vocab[i]))
+        start += length
+    return runs, header["step_s"], header["meta"]
+
+
+class ConversionCache:
+    """
+    Usage:
+        cache = ConversionCache(cache_dir)
+        key = cache.key(midi_path, "midi2array2", version, options)
+        hit = cache.get(key)
+        if hit is None:
+            cache.put(key, symbols, step_s, meta)   # meta: small JSON dict
+        cache.evict()  # once per batch, after the puts
+    A disabled cache (enabled=False) always misses and never writes.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        *,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        enabled: bool = True,
+    ):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, midi_path: str, tool: str, version: str, options: Dict[str, Any]) -> str:
+        h = hashlib.sha256()
+        with open(midi_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        h.update(b"\0")
+        h.update(json.dumps([CACHE_FORMAT, tool, version, options], sort_keys=True).encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ENTRY_SUFFIX)
+
+    def get(self, key: str) -> Optional[Tuple[List[str], float, Dict[str, Any]]]:
+        hit = self.get_runs(key)
+        if hit is None:
+            return None
+        return symbols_from_runs(hit[0]), hit[1], hit[2]
+
+    def get_runs(self, key: str) -> Optional[Tuple[List[Run], float, Dict[str, Any]]]:
+        if not self.enabled:
+            self.misses += 1
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                result = decode_runs(f.read())
+            os.utime(path)  # refresh LRU position
+        except (OSError, ValueError, KeyError, zlib.error):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(
+        self, key: str, symbols: List[str], step_s: float, meta: Optional[Dict[str, Any]] = None
+    ) -> None:
+        self.put_runs(key, runs_from_symbols(symbols), step_s, meta)
+
+    def put_runs(
+        self, key: str, runs: List[Run], step_s: float, meta: Optional[Dict[str, Any]] = None
+    ) -> None:
+        if not self.enabled:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(encode_runs(runs, step_s, meta))
+        os.replace(tmp_path, path)
+
+    def evict(self) -> None:
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        if not self.enabled or not os.path.isdir(self.cache_dir):
+            return
+        entries = []
+        total = 0
+        for root, _dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(ENTRY_SUFFIX):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        entries.sort()
+        for _mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def stats_line(self) -> str:
+        state = self.cache_dir if self.enabled else "disabled"
+        return f"# cache hits={self.hits} misses={self.misses} ({state})"
@@ -0,0 +1,35 @@
+// Arduino.h for hostsim: just what the song player uses, on a desktop
+// compiler. PROGMEM data lives in ordinary memory.
+#pragma once
+
+#include <math.h>
+#include <stddef.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#define PROGMEM
+#define pgm_read_byte(addr) (*(const uint8_t*)(addr))
+#define pgm_read_word(addr) (*(const uint16_t*)(addr))
+#define memcpy_P memcpy
+
+static const uint8_t A10 = 64;
+
+unsigned long millis();
+unsigned long micros();
+void tone(uint8_t pin, unsigned int frequency, unsigned long durationMs);
+void noTone(uint8_t pin);
+
+// Serial as the song streamer uses it. hostsim.cpp backs it with a file
+// descriptor (one end of a pseudo-terminal) in --stream mode.
+class HardwareSerial {
+ public:
+  void begin(unsigned long baud);
+  int available();
+  int read();
+  size_t write(uint8_t b);
+  size_t write(const uint8_t* data, size_t length);
+};
+
+extern HardwareSerial Serial;
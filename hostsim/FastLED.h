@@ -0,0 +1,86 @@
+// FastLED.h for hostsim: a simulated strip. FastLED.show() copies the LED
+// buffer into `shown` (what the strip would display) and counts the calls;
+// with showUs set it also takes that long, like writing the real strip.
+#pragma once
+
+#include <stdint.h>
+#include <chrono>
+#include <vector>
+
+struct CHSV {
+  uint8_t h, s, v;
+  CHSV(uint8_t hue, uint8_t sat, uint8_t val) : h(hue), s(sat), v(val) {}
+};
+
+struct CRGB {
+  enum HTMLColorCode { Black = 0x000000 };
+
+  uint8_t r, g, b;
+
+  CRGB() : r(0), g(0), b(0) {}
+  CRGB(HTMLColorCode code) : r((code >> 16) & 0xFF), g((code >> 8) & 0xFF), b(code & 0xFF) {}
+  CRGB(const CHSV& hsv) {
+    // Plain six-sector HSV; hostsim only needs distinct colours.
+    uint8_t sector = hsv.h / 43;
+    uint8_t rise = (uint8_t)((hsv.h - sector * 43) * 6);
+    uint8_t lo = (uint8_t)(hsv.v * (255 - hsv.s) / 255);
+    uint8_t down = (uint8_t)(hsv.v * (255 - (hsv.s * rise) / 255) / 255);
+    uint8_t up = (uint8_t)(hsv.v * (255 - (hsv.s * (255 - rise)) / 255) / 255);
+    switch (sector) {
+      case 0: r = hsv.v; g = up; b = lo; break;
+      case 1: r = down; g = hsv.v; b = lo; break;
+      case 2: r = lo; g = hsv.v; b = up; break;
+      case 3: r = lo; g = down; b = hsv.v; break;
+      case 4: r = up; g = lo; b = hsv.v; break;
+      default: r = hsv.v; g = lo; b = down; break;
+    }
+  }
+
+  explicit operator bool() const { return r || g || b; }
+};
+
+inline void fill_solid(CRGB* leds, int count, const CRGB& color) {
+  for (int i = 0; i < count; i++) {
+    leds[i] = color;
+  }
+}
+
+enum EOrder { RGB, GRB };
+struct WS2812B {};
+
+class CFastLED {
+ public:
+  std::vector<CRGB> shown;
+  unsigned long shows = 0;
+  unsigned long showUs = 0;
+
+  template <typename CHIPSET, uint8_t DATA_PIN, EOrder RGB_ORDER>
+  void addLeds(CRGB* leds, int count) {
+    leds_ = leds;
+    count_ = count;
+    shown.assign(count, CRGB());
+  }
+  void setBrightness(uint8_t) {}
+  void clear(bool writeData = false) {
+    fill_solid(leds_, count_, CRGB::Black);
+    if (writeData) {
+      show();
+    }
+  }
+  void show() {
+    shown.assign(leds_, leds_ + count_);
+    shows++;
+    if (showUs > 0) {
+      std::chrono::steady_clock::time_point until =
+          std::chrono::steady_clock::now() + std::chrono::microseconds(showUs);
+      while (std::chrono::steady_clock::now() < until) {
+      }
+    }
+  }
+
+ private:
+  CRGB* leds_ = nullptr;
+  int count_ = 0;
+};
+
+static CFastLED FastLED;
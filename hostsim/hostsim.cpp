@@ -0,0 +1,231 @@
+// hostsim.cpp
+//
+// Host build of the song player (DemoSong.ino + LedStrip.ino) against a
+// simulated strip, to time the step handler and check what each Songs.h
+// format displays. Driven by `python bench.py firmware` and tests/test_firmware.py; by hand:
+//
+//   mkdir build && cp PianoStrip/{Config.h,DemoSong.ino,LedStrip.ino} build/
+//   python midi2array2.py song.mid --out-header build/Songs.h --out-format frames
+//   g++ -O2 -std=c++11 -I hostsim -I build -o build/hostsim hostsim/hostsim.cpp
+//   build/hostsim [--dump] [--repeat N]
+//   build/hostsim --stream FD [--baud B] [--show-us US] [--corrupt N] [--seconds S]
+//
+// Per song it prints "song <index> steps=.. mean_ns=.. p99_ns=.. shows=..":
+// advanceSongStep() time over all steps and repeats, and FastLED.show()
+// calls per pass (each one a full strip write on the real board); with --dump also
+// "step <song> <step> <lit LEDs, hex bitmask of LED 0..> <buzzer Hz>" for
+// the first pass.
+//
+// --stream runs the Song demo loop in real time as the board would, with
+// Serial on file descriptor FD (the master end of a pseudo-terminal; driven
+// by `python bench.py stream`, songstream.py on the other end). The line
+// delivers at most B/10 bytes/s into a 64-byte receive buffer, show() takes
+// US microseconds, and every Nth received byte gets a bit flipped. It stops
+// when the other end closes or after S seconds and prints
+// "stream rx_bytes=.. corrupted=.. shows=..".
+
+#include <errno.h>
+#include <fcntl.h>
+#include <unistd.h>
+
+#include <algorithm>
+#include <chrono>
+#include <deque>
+#include <string>
+#include <vector>
+
+#include "Arduino.h"
+#include "FastLED.h"
+
+typedef std::chrono::steady_clock Clock;
+
+static unsigned long gMillis = 0;
+static unsigned int gToneHz = 0;
+static bool gRealTime = false;
+static const Clock::time_point gStart = Clock::now();
+
+static double elapsedSeconds() {
+  return std::chrono::duration<double>(Clock::now() - gStart).count();
+}
+
+unsigned long millis() { return gRealTime ? (unsigned long)(elapsedSeconds() * 1e3) : gMillis; }
+unsigned long micros() { return gRealTime ? (unsigned long)(elapsedSeconds() * 1e6) : gMillis * 1000UL; }
+void tone(uint8_t, unsigned int frequency, unsigned long) { gToneHz = frequency; }
+void noTone(uint8_t) {}
+
+static const size_t kSerialRxBuffer = 64;
+static int gSerialFd = -1;
+static bool gSerialClosed = false;
+static unsigned long gLineBaud = 0;
+static unsigned long gCorruptEvery = 0;
+static unsigned long gSerialRxBytes = 0;
+static unsigned long gSerialCorrupted = 0;
+static double gLineCredit = 0.0;  // bytes the line could have delivered by now
+static double gLineCreditAt = 0.0;
+static std::deque<uint8_t> gSerialRx;
+
+HardwareSerial Serial;
+
+void HardwareSerial::begin(unsigned long) {}  // the line speed is --baud
+
+int HardwareSerial::available() {
+  if (gSerialFd < 0 || gSerialClosed) {
+    return (int)gSerialRx.size();
+  }
+  double now = elapsedSeconds();
+  gLineCredit = std::min((double)kSerialRxBuffer, gLineCredit + (now - gLineCreditAt) * gLineBaud / 10.0);
+  gLineCreditAt = now;
+  size_t want = std::min(kSerialRxBuffer - gSerialRx.size(), (size_t)gLineCredit);
+  if (want > 0) {
+    uint8_t buffer[kSerialRxBuffer];
+    ssize_t n = ::read(gSerialFd, buffer, want);
+    if (n > 0) {
+      gLineCredit -= n;
+      for (ssize_t i = 0; i < n; i++) {
+        uint8_t b = buffer[i];
+        gSerialRxBytes++;
+        if (gCorruptEvery > 0 && gSerialRxBytes % gCorruptEvery == 0) {
+          b ^= 0x01;
+          gSerialCorrupted++;
+        }
+        gSerialRx.push_back(b);
+      }
+    } else if (n == 0 || (errno != EAGAIN && errno != EINTR)) {
+      gSerialClosed = true;  // EIO: the other end of the pty was closed
+    }
+  }
+  return (int)gSerialRx.size();
+}
+
+int HardwareSerial::read() {
+  if (gSerialRx.empty()) {
+    return -1;
+  }
+  uint8_t b = gSerialRx.front();
+  gSerialRx.pop_front();
+  return b;
+}
+
+size_t HardwareSerial::write(uint8_t b) { return write(&b, 1); }
+
+size_t HardwareSerial::write(const uint8_t* data, size_t length) {
+  size_t done = 0;
+  while (gSerialFd >= 0 && !gSerialClosed && done < length) {
+    ssize_t n = ::write(gSerialFd, data + done, length - done);
+    if (n > 0) {
+      done += n;
+    } else if (errno == EAGAIN || errno == EINTR) {
+      usleep(100);
+    } else {
+      gSerialClosed = true;
+    }
+  }
+  return length;
+}
+
+#include "LedStrip.ino"
+#include "DemoSong.ino"
+
+static int runStream(int fd, double seconds) {
+  gSerialFd = fd;
+  gRealTime = true;
+  fcntl(fd, F_SETFL, fcntl(fd, F_GETFL) | O_NONBLOCK);
+  setupLedStrip();
+  setupSongStream();
+  resetSongDemo();
+  char detail[32];
+  while (!gSerialClosed && elapsedSeconds() < seconds) {
+    updateSongDemo(detail, sizeof(detail));
+    usleep(50);
+  }
+  printf("stream rx_bytes=%lu corrupted=%lu shows=%lu\n", gSerialRxBytes, gSerialCorrupted, FastLED.shows);
+  return 0;
+}
+
+static std::string shownMask() {
+  std::string hex;
+  for (size_t i = (FastLED.shown.size() + 3) / 4; i-- > 0;) {
+    unsigned nibble = 0;
+    for (size_t bit = 0; bit < 4; bit++) {
+      size_t led = i * 4 + bit;
+      if (led < FastLED.shown.size() && FastLED.shown[led]) {
+        nibble |= 1u << bit;
+      }
+    }
+    hex += "0123456789abcdef"[nibble];
+  }
+  return hex;
+}
+
+int main(int argc, char** argv) {
+  bool dump = false;
+  int repeat = 1;
+  int streamFd = -1;
+  double seconds = 600.0;
+  gLineBaud = kSongStreamBaud;
+  for (int i = 1; i < argc; i++) {
+    std::string arg = argv[i];
+    if (arg == "--dump") {
+      dump = true;
+    } else if (arg == "--repeat" && i + 1 < argc) {
+      repeat = atoi(argv[++i]);
+    } else if (arg == "--stream" && i + 1 < argc) {
+      streamFd = atoi(argv[++i]);
+    } else if (arg == "--baud" && i + 1 < argc) {
+      gLineBaud = strtoul(argv[++i], nullptr, 10);
+    } else if (arg == "--show-us" && i + 1 < argc) {
+      FastLED.showUs = strtoul(argv[++i], nullptr, 10);
+    } else if (arg == "--corrupt" && i + 1 < argc) {
+      gCorruptEvery = strtoul(argv[++i], nullptr, 10);
+    } else if (arg == "--seconds" && i + 1 < argc) {
+      seconds = atof(argv[++i]);
+    } else {
+      fprintf(stderr,
+              "usage: %s [--dump] [--repeat N]\n"
+              "       %s --stream FD [--baud B] [--show-us US] [--corrupt N] [--seconds S]\n",
+              argv[0], argv[0]);
+      return 2;
+    }
+  }
+  if (streamFd >= 0) {
+    return runStream(streamFd, seconds);
+  }
+
+  setupLedStrip();
+  for (size_t s = 0; s < kSongCount; s++) {
+    const Song& song = kSongs[s];
+    std::vector<double> stepNs;
+    stepNs.reserve(song.stepCount * (size_t)repeat);
+    unsigned long shows = 0;
+    for (int r = 0; r < repeat; r++) {
+      gSongIndex = s;
+      resetSongDemo();
+      unsigned long showsBefore = FastLED.shows;
+      for (size_t i = 0; i < song.stepCount; i++) {
+        gToneHz = 0;
+        Clock::time_point t0 = Clock::now();
+        advanceSongStep();
+        stepNs.push_back(std::chrono::duration<double, std::nano>(Clock::now() - t0).count());
+        gMillis += gStepMs;
+        if (dump && r == 0) {
+          printf("step %zu %zu %s %u\n", s, i, shownMask().c_str(), gToneHz);
+        }
+      }
+      shows = FastLED.shows - showsBefore;
+    }
+    double meanNs = 0.0;
+    double p99Ns = 0.0;
+    if (!stepNs.empty()) {
+      for (double ns : stepNs) {
+        meanNs += ns;
+      }
+      meanNs /= stepNs.size();
+      std::vector<double>::iterator p99 = stepNs.begin() + (stepNs.size() * 99) / 100;
+      std::nth_element(stepNs.begin(), p99, stepNs.end());
+      p99Ns = *p99;
+    }
+    printf("song %zu steps=%zu mean_ns=%.1f p99_ns=%.1f shows=%lu\n", s, song.stepCount, meanNs,
+           p99Ns, shows);
+  }
+  return 0;
+}
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+micdetect.py
+
+Host-side reference of the DemoMic.ino note detector, batched with numpy,
+for tuning kFftSamples / kFftSampleRate (Config.h) without flashing the board.
+
+Per block of fft_size samples the pipeline is the firmware's: mean removal
+(sampleFftBlock), Hamming window (arduinoFFT FFT_WIN_TYP_HAMMING), magnitude
+spectrum, the TOP_BINS strongest bins from FIRST_BIN to fft_size/2 - 1
+(findTopBins, strongest first, ties to the lower bin) and the nearest MIDI
+note of each (freqToMidi). The first one is the main note (the matrix
+letter), all of them light the strip. Here all blocks of a recording go
+through at once: strided views of the samples, one rfft call per batch.
+Blocks follow each other like the loop on the board: fft_size samples, then
+--compute-ms (FFT + display time) during which nothing is sampled.
+
+Audio comes from WAV files, or is synthesized from MIDI files (decaying
+harmonics per note). Either way it is point-sampled at the board's rate
+(analogRead has no anti-aliasing filter) and scaled to the 10-bit ADC.
+Detections are scored against the MIDI notes (notearray.notes.parse_events,
+the extract_note_events notes as a table). A note counts as sounding in a
+block when it covers half the block (or half of itself, if shorter):
+- main: blocks whose main note sounds (exact, and up to octave errors),
+  out of the blocks where something sounds
+- lit: blocks where any of the detected notes sounds
+- latency: note onset -> end of the first block that detects it, plus
+  --compute-ms, for the notes detected while they sound
+- throughput: blocks and seconds of audio processed per second
+
+Usage:
+    python micdetect.py song.mid                    # Config.h settings
+    python micdetect.py *.mid --fft-sizes 128 256 512 1024 --sample-rates 4000 8000 16000
+    python micdetect.py --wav take.wav --truth song.mid --compute-ms 40
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import time
+import wave
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from notearray.names import PITCH_NAMES
+from notearray.notes import NoteEventTable, parse_events
+
+# Config.h / DemoMic.ino
+FFT_SAMPLES = 256  # kFftSamples
+FFT_SAMPLE_RATE = 8000.0  # kFftSampleRate
+TOP_BINS = 4  # findTopBins(topBins, 4)
+FIRST_BIN = 2  # findTopBins skips DC and bin 1
+ADC_BITS = 10  # analogRead
+DRUM_CHANNEL = 9  # GM percussion (channel 10): no pitch to detect
+
+# Blocks per rfft call: bounds the temporary spectra to ~BATCH_SAMPLES values.
+BATCH_SAMPLES = 1 << 20
+
+# Synthesis: relative amplitude of harmonic h (1-based) is 1/h**HARMONIC_ROLLOFF.
+SYNTH_HARMONICS = 6
+HARMONIC_ROLLOFF = 1.0
+SYNTH_DECAY_S = 1.2  # exp(-t / decay) while held
+SYNTH_RELEASE_S = 0.08  # linear fade after note off
+
+
+@dataclass
+class Detections:
+    """Per block: time span and the TOP_BINS strongest bins and their MIDI notes (-1: none)."""
+
+    fft_size: int
+    sample_rate: float
+    block_start_s: np.ndarray
+    block_end_s: np.ndarray
+    bins: np.ndarray  # (blocks, TOP_BINS), strongest first
+    midi: np.ndarray  # (blocks, TOP_BINS)
+
+    def __len__(self) -> int:
+        return len(self.bins)
+
+    @property
+    def main(self) -> np.ndarray:
+        return self.midi[:, 0]
+
+
+@dataclass
+class DetectionScore:
+    label: str
+    fft_size: int
+    sample_rate: float
+    blocks: int
+    scored_blocks: int  # blocks where some note sounds
+    main_exact: int
+    main_pitch_class: int
+    lit: int
+    notes: int
+    latencies_s: np.ndarray  # one per detected note
+    audio_s: float
+    process_s: float
+
+    def summary(self) -> str:
+        scored = max(self.scored_blocks, 1)
+        lat = self.latencies_s * 1e3
+        latency = (
+            f"p50 {np.percentile(lat, 50):6.1f} ms p90 {np.percentile(lat, 90):6.1f} ms"
+            if len(lat)
+            else "      -            -     "
+        )
+        block_ms = self.fft_size / self.sample_rate * 1e3
+        accuracy = (
+            f"main {100.0 * self.main_exact / scored:5.1f}% (pc {100.0 * self.main_pitch_class / scored:5.1f}%) "
+            f"lit {100.0 * self.lit / scored:5.1f}%  "
+            f"notes found {100.0 * len(lat) / self.notes:5.1f}% latency {latency}"
+            if self.notes
+            else f"{'(no ground truth)':97s}"
+        )
+        return (
+            f"N={self.fft_size:5d} fs={self.sample_rate:6.0f}  block {block_ms:6.1f} ms "
+            f"res {self.sample_rate / self.fft_size:5.1f} Hz  {accuracy}  "
+            f"{self.blocks / self.process_s / 1e3:8.1f} kblocks/s "
+            f"({self.audio_s / self.process_s:6.0f}x realtime)"
+        )
+
+
+def freq_to_midi(freq: np.ndarray) -> np.ndarray:
+    """freqToMidi: nearest MIDI note (lroundf), -1 for freq <= 0."""
+    freq = np.asarray(freq, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        note = np.floor(69.0 + 12.0 * np.log2(freq / 440.0) + 0.5)
+    return np.where(freq > 0, note, -1).astype(np.int64)
+
+
+def bin_midi_table(fft_size: int, sample_rate: float) -> np.ndarray:
+    """MIDI note of every bin below fft_size/2; -1 where none (DC, above note 127)."""
+    midi = freq_to_midi(np.arange(fft_size // 2) * sample_rate / fft_size)
+    return np.where(midi > 127, -1, midi)
+
+
+def block_starts(n_samples: int, fft_size: int, gap: int = 0) -> np.ndarray:
+    """First sample of every complete block, blocks fft_size + gap samples apart."""
+    if n_samples < fft_size:
+        return np.zeros(0, dtype=np.int64)
+    return np.arange(0, n_samples - fft_size + 1, fft_size + gap, dtype=np.int64)
+
+
+def detect(
+    samples: np.ndarray,
+    fft_size: int = FFT_SAMPLES,
+    sample_rate: float = FFT_SAMPLE_RATE,
+    *,
+    compute_s: float = 0.0,
+    top_bins: int = TOP_BINS,
+) -> Detections:
+    """
+    Run the DemoMic pipeline over samples (ADC counts at sample_rate), one
+    block after another with compute_s of unsampled time between blocks.
+    """
+    if fft_size // 2 - FIRST_BIN < top_bins:
+        raise ValueError(f"fft_size {fft_size} has fewer than {top_bins} usable bins")
+    samples = np.asarray(samples, dtype=np.float64)
+    starts = block_starts(len(samples), fft_size, int(round(compute_s * sample_rate)))
+    frames = sliding_window_view(samples, fft_size)[starts] if len(starts) else np.zeros((0, fft_size))
+    window = np.hamming(fft_size)
+    table = bin_midi_table(fft_size, sample_rate)
+
+    bins = np.empty((len(starts), top_bins), dtype=np.int64)
+    per_batch = max(1, BATCH_SAMPLES // fft_size)
+    for a in range(0, len(starts), per_batch):
+        block = frames[a : a + per_batch]
+        block = (block - block.mean(axis=1, keepdims=True)) * window
+        mag = np.abs(np.fft.rfft(block, axis=1)[:, FIRST_BIN : fft_size // 2])
+        # Stable sort on -magnitude: strongest first, ties to the lower bin, as findTopBins.
+        bins[a : a + per_batch] = np.argsort(-mag, axis=1, kind="stable")[:, :top_bins] + FIRST_BIN
+    return Detections(
+        fft_size,
+        sample_rate,
+        starts / sample_rate,
+        (starts + fft_size) / sample_rate,
+        bins,
+        table[bins],
+    )
+
+
+def note_arrays(events: NoteEventTable) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(start_s, end_s, note, velocity) of the pitched notes (not channel 10 drums) that have a duration."""
+    start = np.frombuffer(events.start_s, dtype=np.float64)
+    end = np.frombuffer(events.end_s, dtype=np.float64)
+    note = np.frombuffer(events.note, dtype=np.uint8).astype(np.int64)
+    velocity = np.frombuffer(events.velocity, dtype=np.uint8).astype(np.int64)
+    keep = (end > start) & (np.frombuffer(events.channel, dtype=np.uint8) != DRUM_CHANNEL)
+    return start[keep], end[keep], note[keep], velocity[keep]
+
+
+def synthesize(events: NoteEventTable, sample_rate: float, *, tail_s: float = 0.5) -> np.ndarray:
+    """
+    Additive rendering of the notes at sample_rate: SYNTH_HARMONICS harmonics
+    (aliased above Nyquist, as an unfiltered ADC would), exponential decay
+    while held, a short linear release. Returns float samples.
+    """
+    start, end, note, velocity = note_arrays(events)
+    n_total = int(math.ceil(((end.max() if len(end) else 0.0) + SYNTH_RELEASE_S + tail_s) * sample_rate))
+    out = np.zeros(n_total)
+    harmonics = np.arange(1, SYNTH_HARMONICS + 1, dtype=np.float64)
+    weights = harmonics**-HARMONIC_ROLLOFF
+    release = int(SYNTH_RELEASE_S * sample_rate)
+    fade = np.linspace(1.0, 0.0, release, endpoint=False)
+    i0 = np.rint(start * sample_rate).astype(np.int64)
+    held = np.maximum(np.rint(end * sample_rate).astype(np.int64) - i0, 1)
+    # The decaying tone only depends on the pitch: render it once, as long as
+    # its longest note, and cut every note (plus its release) from it.
+    for p in np.unique(note).tolist():
+        of_pitch = np.flatnonzero(note == p)
+        t = np.arange(int(held[of_pitch].max()) + release) / sample_rate
+        f0 = 440.0 * 2.0 ** ((p - 69) / 12.0)
+        tone = (weights @ np.sin(2.0 * np.pi * f0 * np.outer(harmonics, t))) * np.exp(-t / SYNTH_DECAY_S)
+        for k in of_pitch.tolist():
+            a, n = int(i0[k]), int(held[k])
+            seg = tone[: n + release] * (velocity[k] / 127.0)
+            seg[n:] *= fade
+            b = min(a + len(seg), n_total)
+            out[a:b] += seg[: b - a]
+    return out
+
+
+def read_wav(path: str, sample_rate: float) -> np.ndarray:
+    """PCM WAV, channels averaged, point-sampled at sample_rate (linear interpolation). Floats in -1..1."""
+    with wave.open(path, "rb") as w:
+        channels, width, rate, frames = w.getnchannels(), w.getsampwidth(), w.getframerate(), w.getnframes()
+        raw = w.readframes(frames)
+    if width == 1:
+        data = (np.frombuffer(raw, dtype=np.uint8).astype(np.float64) - 128.0) / 128.0
+    elif width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        value = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        data = np.where(value >= 1 << 23, value - (1 << 24), value) / float(1 << 23)
+    elif width in (2, 4):
+        data = np.frombuffer(raw, dtype="<i%d" % width) / float(1 << (8 * width - 1))
+    else:
+        raise ValueError(f"{path}: unsupported sample width {width}")
+    data = data.reshape(-1, channels).mean(axis=1)
+    t = np.arange(int(len(data) * sample_rate / rate)) / sample_rate
+    return np.interp(t, np.arange(len(data)) / rate, data)
+
+
+def to_adc(signal: np.ndarray, *, bits: int = ADC_BITS, headroom: float = 0.9, noise: float = 1.0, seed: int = 0) -> np.ndarray:
+    """
+    Scale a signal around mid-scale so its peak uses headroom of the ADC
+    range, add noise (std, in counts), round and clip like analogRead.
+    """
+    half = (1 << (bits - 1)) - 1
+    peak = float(np.abs(signal).max()) if len(signal) else 0.0
+    counts = signal * (headroom * half / peak if peak > 0 else 0.0) + (1 << (bits - 1))
+    if noise > 0:
+        counts = counts + np.random.default_rng(seed).normal(0.0, noise, len(counts))
+    return np.clip(np.rint(counts), 0, (1 << bits) - 1)
+
+
+def sounding_roll(det: Detections, start: np.ndarray, end: np.ndarray, note: np.ndarray) -> np.ndarray:
+    """(blocks, 128) bool: note p sounds in block k (covers half the block, or half of itself)."""
+    roll = np.zeros((len(det), 128), dtype=bool)
+    block_s = det.fft_size / det.sample_rate
+    need = np.minimum(0.5 * block_s, 0.5 * (end - start))
+    # Blocks are equally long, so the ones a note covers enough of are contiguous.
+    lo = np.searchsorted(det.block_end_s, start + need, side="left")
+    hi = np.searchsorted(det.block_start_s, end - need, side="right")
+    for k in np.flatnonzero(hi > lo).tolist():
+        roll[lo[k] : hi[k], note[k]] = True
+    return roll
+
+
+def score(
+    det: Detections,
+    events: NoteEventTable,
+    *,
+    compute_s: float = 0.0,
+    label: str = "",
+    audio_s: float = 0.0,
+    process_s: float = 0.0,
+) -> DetectionScore:
+    start, end, note, _velocity = note_arrays(events)
+    truth = sounding_roll(det, start, end, note)
+    rows = np.arange(len(det))
+    scored = truth.any(axis=1)
+    main = det.main
+    has_main = main >= 0
+    main_exact = scored & has_main & truth[rows, np.maximum(main, 0)]
+    truth_pc = np.zeros((len(det), 12), dtype=bool)
+    for pc in range(12):
+        truth_pc[:, pc] = truth[:, pc::12].any(axis=1)
+    main_pc = scored & has_main & truth_pc[rows, np.maximum(main, 0) % 12]
+    midi = det.midi
+    lit = scored & ((midi >= 0) & truth[rows[:, None], np.maximum(midi, 0)]).any(axis=1)
+
+    # Latency: first block overlapping the note whose detected notes include it.
+    found = np.zeros((len(det), 128), dtype=bool)
+    for j in range(midi.shape[1]):
+        ok = midi[:, j] >= 0
+        found[rows[ok], midi[ok, j]] = True
+    lo = np.searchsorted(det.block_end_s, start, side="right")
+    hi = np.searchsorted(det.block_start_s, end, side="left")
+    latencies: List[float] = []
+    for k in range(len(start)):
+        hits = np.flatnonzero(found[lo[k] : hi[k], note[k]])
+        if len(hits):
+            latencies.append(det.block_end_s[lo[k] + hits[0]] + compute_s - start[k])
+    return DetectionScore(
+        label,
+        det.fft_size,
+        det.sample_rate,
+        len(det),
+        int(scored.sum()),
+        int(main_exact.sum()),
+        int(main_pc.sum()),
+        int(lit.sum()),
+        len(start),
+        np.asarray(latencies),
+        audio_s,
+        process_s,
+    )
+
+
+def merge_scores(scores: Sequence[DetectionScore], label: str) -> DetectionScore:
+    """One score over several files (same fft_size / sample_rate)."""
+    first = scores[0]
+    return DetectionScore(
+        label,
+        first.fft_size,
+        first.sample_rate,
+        sum(s.blocks for s in scores),
+        sum(s.scored_blocks for s in scores),
+        sum(s.main_exact for s in scores),
+        sum(s.main_pitch_class for s in scores),
+        sum(s.lit for s in scores),
+        sum(s.notes for s in scores),
+        np.concatenate([s.latencies_s for s in scores]),
+        sum(s.audio_s for s in scores),
+        sum(s.process_s for s in scores),
+    )
+
+
+def sweep(
+    sources: Sequence[Tuple[str, Optional[str], Optional[str]]],
+    fft_sizes: Sequence[int],
+    sample_rates: Sequence[float],
+    *,
+    compute_s: float = 0.0,
+    noise: float = 1.0,
+    repeat: int = 3,
+    parser: str = "raw",
+) -> List[List[DetectionScore]]:
+    """
+    Score every (fft_size, sample_rate) on every source (label, wav or None,
+    MIDI truth path or None). Returns one list of per-source scores per
+    setting, sources without truth scored for throughput only.
+    """
+    truths = [parse_events(midi, parser=parser)[0] if midi else NoteEventTable() for _l, _w, midi in sources]
+    results: List[List[DetectionScore]] = []
+    for sample_rate in sample_rates:
+        audio = []
+        for (label, wav, _midi), events in zip(sources, truths):
+            signal = read_wav(wav, sample_rate) if wav else synthesize(events, sample_rate)
+            audio.append(to_adc(signal, noise=noise))
+        for fft_size in fft_sizes:
+            row = []
+            for (label, _wav, _midi), events, samples in zip(sources, truths, audio):
+                best = math.inf
+                for _ in range(max(repeat, 1)):
+                    t0 = time.perf_counter()
+                    det = detect(samples, fft_size, sample_rate, compute_s=compute_s)
+                    best = min(best, time.perf_counter() - t0)
+                row.append(
+                    score(det, events, compute_s=compute_s, label=label, audio_s=len(samples) / sample_rate, process_s=best)
+                )
+            results.append(row)
+    return results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Offline reference of the DemoMic.ino FFT note detector")
+    ap.add_argument("midi", nargs="*", help="MIDI files to synthesize and score against")
+    ap.add_argument("--wav", action="append", default=[], help="WAV recording (repeatable)")
+    ap.add_argument(
+        "--truth", action="append", default=[], help="MIDI ground truth of each --wav, in order (optional)"
+    )
+    ap.add_argument("--fft-sizes", type=int, nargs="+", default=[FFT_SAMPLES], help="kFftSamples values")
+    ap.add_argument("--sample-rates", type=float, nargs="+", default=[FFT_SAMPLE_RATE], help="kFftSampleRate values")
+    ap.add_argument(
+        "--compute-ms", type=float, default=0.0, help="Board time per block for FFT + display (no sampling meanwhile)"
+    )
+    ap.add_argument("--noise", type=float, default=1.0, help="ADC noise, std in counts")
+    ap.add_argument("--repeat", type=int, default=3, help="Time detection best of N")
+    ap.add_argument("--parser", default="raw", choices=["mido", "raw"], help="MIDI reader for the ground truth")
+    ap.add_argument("--show-blocks", type=int, default=0, help="Print the first N blocks of each source")
+    args = ap.parse_args()
+    if not args.midi and not args.wav:
+        ap.error("give MIDI file(s) and/or --wav")
+    if len(args.truth) > len(args.wav):
+        ap.error("more --truth than --wav")
+
+    sources: List[Tuple[str, Optional[str], Optional[str]]] = [
+        (os.path.basename(path), None, path) for path in args.midi
+    ]
+    for i, wav in enumerate(args.wav):
+        sources.append((os.path.basename(wav), wav, args.truth[i] if i < len(args.truth) else None))
+
+    compute_s = args.compute_ms / 1000.0
+    results = sweep(
+        sources,
+        args.fft_sizes,
+        args.sample_rates,
+        compute_s=compute_s,
+        noise=args.noise,
+        repeat=args.repeat,
+        parser=args.parser,
+    )
+    for row in results:
+        for s in row:
+            print(f"{s.label[:32]:32s} {s.summary()}")
+        if len(row) > 1:
+            print(f"{'all':32s} {merge_scores(row, 'all').summary()}")
+
+    if args.show_blocks:
+        for label, wav, midi in sources:
+            events = parse_events(midi, parser=args.parser)[0] if midi else NoteEventTable()
+            signal = read_wav(wav, args.sample_rates[0]) if wav else synthesize(events, args.sample_rates[0])
+            det = detect(to_adc(signal, noise=args.noise), args.fft_sizes[0], args.sample_rates[0], compute_s=compute_s)
+            print(f"# {label}")
+            for k in range(min(args.show_blocks, len(det))):
+                names = " ".join(PITCH_NAMES[m] if m >= 0 else "--" for m in det.midi[k])
+                print(f"{det.block_start_s[k]:9.3f}s  {names}")
+
+
+if __name__ == "__main__":
+    main()
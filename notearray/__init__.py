@@ -0,0 +1,87 @@
+"""
+notearray
+
+MIDI -> step array conversion behind midi2array.py and midi2array2.py,
+importable as one package. Two quantizers:
+- "notes" (notes.py): one note name per step; a note sounds in every bin it
+  overlaps and a policy picks among overlapping notes. Musical or fixed-ms
+  grids, mido or the built-in SMF reader.
+- "chords" (chords.py): chord symbols of the notes starting (onset) or held
+  (sustain) at each step, rounded to the nearest step of a steps-per-beat
+  grid. pretty_midi; also the firmware header formats.
+
+Importing the package is cheap. The quantizer modules load on first use,
+and they load mido, pretty_midi and numpy the same way (see backends.py).
+Pitch <-> name tables are shared (names.py). Both quantizers key the
+conversion cache on source_version(): a hash of every module a conversion
+runs through.
+
+Usage:
+    import notearray
+    tokens, step_s, segments = notearray.convert("song.mid", grid="16th", policy="highest")
+    symbols, step_s, segments = notearray.convert("song.mid", quantizer="chords", steps_per_beat=4)
+    notearray.PITCH_NAMES[60]                      # "C4"
+    notearray.notes.TempoMap, notearray.chords.pack_symbols, ...
+"""
+
+from __future__ import annotations
+
+import functools
+import glob
+import importlib
+import importlib.util
+import os
+from typing import Any, List, Tuple
+
+from notearray.backends import get_parser, lazy_import, parser_names, register_parser
+from notearray.names import NOTE_NAMES, PITCH_BY_NAME, PITCH_NAMES, name_to_pitch, pitch_to_name
+
+QUANTIZERS = ("notes", "chords")
+
+# Modules outside the package that conversions run through.
+SOURCE_MODULES = ("autogrid", "convcache", "noteindex", "smfreader")
+
+
+def convert(midi_path: str, *, quantizer: str = "notes", **options: Any) -> Tuple[List[str], float, List[Tuple[int, float]]]:
+    """
+    Convert one file with either quantizer: (tokens, step_seconds, step_segments).
+    options are the quantizer's own: notes.convert_midi_file (grid / grid_ms,
+    policy, silence_token, engine, follow_tempo, parser) or
+    chords.midi_to_symbol_song (steps_per_beat, mode, symbol_silence,
+    chord_join, follow_tempo, tempo_source, instrument_index).
+    """
+    if quantizer == "notes":
+        from notearray.notes import convert_midi_file
+
+        return convert_midi_file(midi_path, **options)
+    if quantizer == "chords":
+        from notearray.chords import midi_to_symbol_song
+
+        return midi_to_symbol_song(midi_path, **options)
+    raise ValueError(f"quantizer must be one of {', '.join(QUANTIZERS)}")
+
+
+def source_files() -> List[str]:
+    """All of notearray/*.py plus SOURCE_MODULES: what the cache version covers."""
+    files = glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.py"))
+    for name in SOURCE_MODULES:
+        spec = importlib.util.find_spec(name)
+        if spec is None or spec.origin is None:
+            raise ImportError(f"No module named {name!r}", name=name)
+        files.append(spec.origin)
+    return sorted(files)
+
+
+@functools.lru_cache(maxsize=None)
+def source_version() -> str:
+    """Cache key version of both quantizers (convcache.tool_version of source_files)."""
+    from convcache import tool_version
+
+    return tool_version(source_files())
+
+
+def __getattr__(name: str) -> Any:
+    # notearray.notes / notearray.chords without importing them up front.
+    if name in QUANTIZERS:
+        return importlib.import_module(f"notearray.{name}")
+    raise AttributeError(f"module 'notearray' has no attribute {name!r}")
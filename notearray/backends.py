@@ -0,0 +1,77 @@
+"""
+notearray/backends.py
+
+Lazy loading of the heavy libraries (mido, pretty_midi, numpy) and the
+registry of MIDI parse backends.
+
+lazy_import returns a module whose code only runs on first attribute
+access (importlib.util.LazyLoader), so a converter can name mido, numpy
+or pretty_midi at the top and still start in a few milliseconds when a
+run never touches them: --help, cache hits, --parser raw.
+
+Parse backends turn a file into (NoteEventTable, TempoMap) for the
+"notes" quantizer. They are registered by name as "module:function" and
+only imported when first asked for, so a backend can live anywhere.
+
+Usage:
+    np = lazy_import("numpy", optional=True)   # None if not installed
+    mido = lazy_import("mido")
+    register_parser("mine", "myreader:parse")
+    events, tempo_map = get_parser("raw")("song.mid")
+"""
+
+from __future__ import annotations
+
+import importlib
+import importlib.util
+import sys
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional, Union
+
+_parsers: Dict[str, Union[str, Callable[[str], Any]]] = {
+    "mido": "notearray.notes:parse_events_mido",
+    "raw": "notearray.notes:parse_events_raw",
+}
+
+
+def lazy_import(name: str, *, optional: bool = False) -> Optional[ModuleType]:
+    """
+    The module `name`, executed on first attribute access. Already imported
+    modules are returned as they are. A missing module raises ImportError
+    now (or returns None with optional=True), not on first use.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        if optional:
+            return None
+        raise ImportError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def register_parser(name: str, parser: Union[str, Callable[[str], Any]]) -> None:
+    """Add (or replace) a parse backend: a callable or "module:function", imported on first use."""
+    _parsers[name] = parser
+
+
+def parser_names() -> List[str]:
+    return list(_parsers)
+
+
+def get_parser(name: str) -> Callable[[str], Any]:
+    """The parse function of backend `name` (midi_path -> (NoteEventTable, TempoMap))."""
+    try:
+        parser = _parsers[name]
+    except KeyError:
+        raise ValueError(f"Unknown parser: {name}") from None
+    if isinstance(parser, str):
+        module_name, _, attr = parser.partition(":")
+        parser = _parsers[name] = getattr(importlib.import_module(module_name), attr)
+    return parser
@@ -0,0 +1,1969 @@
+"""
+notearray/chords.py
+
+The "chords" quantizer behind midi2array2.py. Reads a MIDI file and
+converts it into a time-quantized array of symbols:
+- "." for silence
+- "C4", "F#3" for single notes
+- "C4+E4+G4" for chords (multiple notes starting in the same time slot)
+
+Quantization default: 16th-note grid (steps_per_beat=4).
+With --follow-tempo the grid is laid out in MIDI ticks, so steps stay on beat
+subdivisions across every tempo change; the header then carries per-segment
+step durations (Song.tempos) instead of one global stepSeconds.
+Otherwise the fixed grid's tempo comes from --tempo-source (see detect_tempo);
+the time spent detecting it is reported per file.
+Conversions are cached on disk keyed by file contents + options (see convcache.py).
+With --watch DIR the header is kept in sync with DIR: only changed files are
+reconverted and the header is rewritten (atomically) only when it changes.
+
+Header output (--out-header) comes in several formats (--out-format):
+- "text": one string literal per step (parsed by the firmware at runtime)
+- "packed": one PROGMEM byte stream for all songs, silence run-length encoded
+  and chords stored as uint8 MIDI pitches (see pack_symbols)
+- "phrases": packed, but passages repeated within a song are stored once and
+  replayed through a phrase table and a per-song play order (see encode_phrases)
+- "frames": per-step LED bitmask frames (--led-base-midi/--led-count), stored
+  as changes against the previous step, plus the buzzer pitch (see encode_frames)
+--out-steps writes the symbols as a binary step array instead (uint16 index
+per step into a symbol table, memory-mappable; see steparray.py).
+--auto-grid picks --steps-per-beat per file: the coarsest candidate whose
+onset timing error stays within --max-error-ms (see autogrid.py).
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import os
+import re
+import sys
+import tempfile
+import time
+from typing import Any, List, Dict, Optional, Tuple
+
+from autogrid import GridScore, format_scores, pick_grid, score_grid
+from convcache import ConversionCache
+from noteindex import NoteIndex
+from smfreader import parse_smf
+from steparray import StepArrayWriter
+
+from notearray import source_version
+from notearray.backends import lazy_import
+from notearray.cli import add_auto_grid_arguments, add_cache_arguments, cache_from_args
+from notearray.names import (
+    NOTE_NAMES,
+    PITCH_BY_NAME,
+    PITCH_NAMES,
+    name_to_pitch as note_name_to_pitch,
+    pitch_to_name as midi_pitch_to_name,
+)
+
+# Loaded on first use: cache hits and header-only work never import them.
+np = lazy_import("numpy")
+pretty_midi = lazy_import("pretty_midi")
+
+
+def mask_pitches(mask: int) -> List[int]:
+    """Ascending MIDI pitches of a pitch mask (bit p set = pitch p sounds)."""
+    pitches: List[int] = []
+    while mask:
+        low = mask & -mask
+        pitches.append(low.bit_length() - 1)
+        mask ^= low
+    return pitches
+
+
+def masks_to_symbols(
+    masks: List[int], *, symbol_silence: str = " ", chord_join: str = "+"
+) -> List[str]:
+    """Step pitch masks -> symbols; each distinct chord string is built once."""
+    chords: Dict[int, str] = {0: symbol_silence}
+    for mask in set(masks):
+        if mask not in chords:
+            chords[mask] = chord_join.join(PITCH_NAMES[p] for p in mask_pitches(mask))
+    return list(map(chords.__getitem__, masks))
+
+
+def choose_best_instrument(pm: pretty_midi.PrettyMIDI) -> int:
+    """
+    Pick the "main" instrument track:
+    - prefer non-drum
+    - prefer the one with most notes
+    Returns index in pm.instruments.
+    """
+    candidates = [
+        (i, inst) for i, inst in enumerate(pm.instruments) if not inst.is_drum
+    ]
+    if not candidates:
+        return 0 if pm.instruments else -1
+    return max(candidates, key=lambda x: len(x[1].notes))[0]
+
+
+def quantize_time_to_step(t: float, step_s: float) -> int:
+    """Round to nearest step index."""
+    return int(round(t / step_s))
+
+
+def quantize_tick_to_step(tick: int, step_ticks: float) -> int:
+    """Round an absolute tick to the nearest step of a tick-domain grid."""
+    return int(round(tick / step_ticks))
+
+
+# (start_step, step_seconds): steps from start_step on last step_seconds each
+StepSegment = Tuple[int, float]
+
+
+def tempo_step_segments(
+    pm: pretty_midi.PrettyMIDI, step_ticks: float, n_steps: int
+) -> List[StepSegment]:
+    """
+    Run-length step durations of a tick-domain grid over the tempo map.
+    Steps inside one tempo get an exact duration; a step straddling a tempo
+    change gets the measured one (rounded to 1 us).
+    """
+    times, bpms = pm.get_tempo_changes()
+    change_ticks = [pm.time_to_tick(t) for t in times]
+    tick_scales = [60.0 / (bpm * pm.resolution) for bpm in bpms]
+
+    segments: List[StepSegment] = []
+    k = 0
+    for s in range(n_steps):
+        a = int(round(s * step_ticks))
+        b = int(round((s + 1) * step_ticks))
+        while k + 1 < len(change_ticks) and change_ticks[k + 1] <= a:
+            k += 1
+        if k + 1 >= len(change_ticks) or change_ticks[k + 1] >= b:
+            step = (b - a) * tick_scales[k]
+        else:
+            step = round(pm.tick_to_time(b) - pm.tick_to_time(a), 6)
+        if not segments or segments[-1][1] != step:
+            segments.append((s, step))
+    return segments
+
+
+# Where the fixed grid's tempo comes from (ignored with follow_tempo):
+#   "pretty_midi": pm.estimate_tempo(), greedy IOI clustering (original behavior)
+#   "declared":    the file's initial set_tempo (120 bpm if it has none)
+#   "estimated":   estimate_tempo_histogram over all onsets
+#   "auto":        declared if the file has a set_tempo, estimated otherwise
+TEMPO_SOURCES = ("pretty_midi", "declared", "estimated", "auto")
+DEFAULT_BPM = 120.0
+
+# estimate_tempo_histogram: IOIs outside (min, max) are ignored, shorter ones
+# are doubled up to the fold floor (as pretty_midi does), then binned.
+TEMPO_IOI_MIN_S = 0.05
+TEMPO_IOI_MAX_S = 2.0
+TEMPO_IOI_FOLD_S = 0.2
+TEMPO_BIN_S = 0.005
+TEMPO_CLUSTER_S = 0.025
+
+
+def load_pretty_midi(
+    midi_path: str, tempo_source: str = "pretty_midi"
+) -> Tuple[pretty_midi.PrettyMIDI, Optional[bool]]:
+    """
+    (pretty_midi.PrettyMIDI(midi_path), declares_tempo). declares_tempo says
+    whether the file has any set_tempo, which pretty_midi's tempo map cannot
+    tell (see declared_bpm). It is only read, with smfreader from the same
+    bytes, for the tempo sources that look at it ("declared", "auto"); None
+    otherwise or where smfreader rejects a file pretty_midi accepts.
+    """
+    if tempo_source not in ("declared", "auto"):
+        return pretty_midi.PrettyMIDI(midi_path), None
+    with open(midi_path, "rb") as f:
+        data = f.read()
+    pm = pretty_midi.PrettyMIDI(io.BytesIO(data))
+    try:
+        declares_tempo: Optional[bool] = bool(parse_smf(data).tempo_changes)
+    except ValueError:
+        declares_tempo = None
+    return pm, declares_tempo
+
+
+def declared_bpm(pm: pretty_midi.PrettyMIDI, declares_tempo: Optional[bool] = None) -> Optional[float]:
+    """
+    Initial tempo from the file's tempo map, or None if the file has no
+    set_tempo (declares_tempo, see load_pretty_midi). Without that flag, a
+    bare 120 bpm map is taken as pretty_midi's default, so a file declaring
+    exactly 120 bpm then also gives None.
+    """
+    _times, bpms = pm.get_tempo_changes()
+    if declares_tempo is None:
+        declares_tempo = not (len(bpms) == 1 and abs(bpms[0] - DEFAULT_BPM) < 1e-6)
+    return float(bpms[0]) if declares_tempo else None
+
+
+def note_onsets(pm: pretty_midi.PrettyMIDI) -> np.ndarray:
+    """Sorted onset times (s) of all notes of all instruments, duplicates kept."""
+    onsets = np.fromiter(
+        (n.start for inst in pm.instruments for n in inst.notes), dtype=np.float64
+    )
+    onsets.sort()
+    return onsets
+
+
+def estimate_tempo_histogram(onsets: np.ndarray) -> Optional[float]:
+    """
+    Tempo (BPM) of the most common inter-onset interval.
+
+    Same IOI selection and octave folding as pretty_midi.estimate_tempo, but
+    instead of clustering IOIs one by one, they are binned into a fixed
+    histogram (TEMPO_BIN_S), smoothed over one cluster width, and the tempo is
+    the mean IOI within half a cluster width of the peak. O(n) numpy work plus
+    a fixed number of bins. None if no usable IOI exists.
+    """
+    ioi = np.diff(onsets)  # duplicate onsets give 0, dropped below
+    ioi = ioi[(ioi > TEMPO_IOI_MIN_S) & (ioi < TEMPO_IOI_MAX_S)]
+    if ioi.size == 0:
+        return None
+    short = ioi < TEMPO_IOI_FOLD_S
+    ioi[short] *= np.exp2(np.ceil(np.log2(TEMPO_IOI_FOLD_S / ioi[short])))
+
+    n_bins = int(round((TEMPO_IOI_MAX_S - TEMPO_IOI_FOLD_S) / TEMPO_BIN_S))
+    hist, edges = np.histogram(ioi, bins=n_bins, range=(TEMPO_IOI_FOLD_S, TEMPO_IOI_MAX_S))
+    width = max(1, int(round(TEMPO_CLUSTER_S / TEMPO_BIN_S)))
+    peak = int(np.argmax(np.convolve(hist, np.ones(width), mode="same")))
+    center = 0.5 * (edges[peak] + edges[peak + 1])
+    cluster = ioi[np.abs(ioi - center) <= 0.5 * TEMPO_CLUSTER_S]
+    return 60.0 / float(cluster.mean())
+
+
+def detect_tempo(
+    pm: pretty_midi.PrettyMIDI, tempo_source: str = "pretty_midi", declares_tempo: Optional[bool] = None
+) -> Tuple[float, str]:
+    """
+    BPM for the fixed grid. Returns (bpm, source) where source is the one
+    actually used: "auto" resolves to "declared" or "estimated", and
+    "estimated" falls back to "declared" when there is nothing to estimate.
+    declares_tempo is passed on to declared_bpm.
+    """
+    if tempo_source not in TEMPO_SOURCES:
+        raise ValueError(f"tempo_source must be one of {', '.join(TEMPO_SOURCES)}")
+    if tempo_source == "pretty_midi":
+        return pm.estimate_tempo(), tempo_source
+    if tempo_source in ("declared", "auto"):
+        bpm = declared_bpm(pm, declares_tempo)
+        if bpm is not None or tempo_source == "declared":
+            return (DEFAULT_BPM if bpm is None else bpm), "declared"
+    bpm = estimate_tempo_histogram(note_onsets(pm))
+    if bpm is None:
+        return declared_bpm(pm, declares_tempo) or DEFAULT_BPM, "declared"
+    return bpm, "estimated"
+
+
+def midi_to_symbol_array(
+    midi_path: str,
+    *,
+    steps_per_beat: int = 4,  # 4 => 16th notes
+    symbol_silence: str = " ",
+    instrument_index: int | None = None,
+    mode: str = "onset",  # "onset" or "sustain"
+    chord_join: str = "+",
+    follow_tempo: bool = False,
+    tempo_source: str = "pretty_midi",
+) -> Tuple[List[str], float]:
+    """
+    Convert MIDI to a symbol array.
+
+    mode:
+      - "onset": mark only when notes start; other steps are silence unless new onset happens
+      - "sustain": mark every step while note is held (good for piano-roll-like sequences)
+
+    follow_tempo: quantize in ticks so steps follow every tempo change (the
+    returned step duration is then the first one; see midi_to_symbol_song).
+
+    tempo_source: where the fixed grid's tempo comes from (TEMPO_SOURCES).
+
+    Returns: (symbols, step_duration_seconds)
+    """
+    symbols, step_s, _segments = midi_to_symbol_song(
+        midi_path,
+        steps_per_beat=steps_per_beat,
+        symbol_silence=symbol_silence,
+        instrument_index=instrument_index,
+        mode=mode,
+        chord_join=chord_join,
+        follow_tempo=follow_tempo,
+        tempo_source=tempo_source,
+    )
+    return symbols, step_s
+
+
+def midi_to_symbol_song(
+    midi_path: str,
+    *,
+    steps_per_beat: int = 4,
+    symbol_silence: str = " ",
+    instrument_index: int | None = None,
+    mode: str = "onset",
+    chord_join: str = "+",
+    follow_tempo: bool = False,
+    tempo_source: str = "pretty_midi",
+) -> Tuple[List[str], float, List[StepSegment]]:
+    """
+    Same as midi_to_symbol_array, plus the per-segment step durations.
+
+    Returns: (symbols, step_duration_seconds, step_segments); step_segments
+    is [(0, step_duration_seconds)] unless follow_tempo is set.
+    """
+    pm, declares_tempo = load_pretty_midi(midi_path, tempo_source)
+    bpm = None
+    if pm.instruments and not follow_tempo:
+        bpm, _source = detect_tempo(pm, tempo_source, declares_tempo)
+    return pretty_midi_to_symbol_song(
+        pm,
+        steps_per_beat=steps_per_beat,
+        symbol_silence=symbol_silence,
+        instrument_index=instrument_index,
+        mode=mode,
+        chord_join=chord_join,
+        follow_tempo=follow_tempo,
+        tempo_source=tempo_source,
+        bpm=bpm,
+    )
+
+
+def pretty_midi_to_symbol_song(
+    pm: pretty_midi.PrettyMIDI,
+    *,
+    steps_per_beat: int = 4,
+    symbol_silence: str = " ",
+    instrument_index: int | None = None,
+    mode: str = "onset",
+    chord_join: str = "+",
+    follow_tempo: bool = False,
+    tempo_source: str = "pretty_midi",
+    bpm: Optional[float] = None,
+) -> Tuple[List[str], float, List[StepSegment]]:
+    """
+    midi_to_symbol_song on an already parsed file (lets callers time parsing separately).
+    bpm, if given, is used for the fixed grid instead of detecting it (see detect_tempo).
+    """
+    masks, step_s, segments = pretty_midi_to_step_masks(
+        pm,
+        steps_per_beat=steps_per_beat,
+        instrument_index=instrument_index,
+        mode=mode,
+        follow_tempo=follow_tempo,
+        tempo_source=tempo_source,
+        bpm=bpm,
+    )
+    symbols = masks_to_symbols(masks, symbol_silence=symbol_silence, chord_join=chord_join)
+    return symbols, step_s, segments
+
+
+def pretty_midi_to_step_masks(
+    pm: pretty_midi.PrettyMIDI,
+    *,
+    steps_per_beat: int = 4,
+    instrument_index: int | None = None,
+    mode: str = "onset",
+    follow_tempo: bool = False,
+    tempo_source: str = "pretty_midi",
+    bpm: Optional[float] = None,
+) -> Tuple[List[int], float, List[StepSegment]]:
+    """
+    Quantize to one pitch mask per step (bit p set = MIDI pitch p); 0 is silence.
+    Returns: (masks, step_duration_seconds, step_segments)
+    """
+    if not pm.instruments:
+        return [], 0.0, []
+
+    if instrument_index is None:
+        instrument_index = choose_best_instrument(pm)
+    if instrument_index < 0 or instrument_index >= len(pm.instruments):
+        raise ValueError(f"Invalid instrument_index={instrument_index}")
+
+    inst = pm.instruments[instrument_index]
+
+    # Determine step duration from the detected tempo (see detect_tempo):
+    # beat duration = 60 / BPM
+    # step duration = beat duration / steps_per_beat
+    # If multiple tempi exist, this is still one fixed grid.
+    # With follow_tempo the grid lives in ticks instead: step = resolution / steps_per_beat.
+    if follow_tempo:
+        step_ticks = pm.resolution / steps_per_beat
+    else:
+        if bpm is None:
+            bpm, _source = detect_tempo(pm, tempo_source)
+        beat_s = 60.0 / bpm
+        step_s = beat_s / steps_per_beat
+
+    # Collect events into steps
+    # onset: (step, pitch) pairs, OR-ed into per-step masks below
+    onsets: List[Tuple[int, int]] = []
+    # sustain: held notes as [start_step, end_step) intervals, swept with a NoteIndex
+    starts: List[int] = []
+    ends: List[int] = []
+    pitches: List[int] = []
+
+    max_step = 0
+
+    if mode not in ("onset", "sustain"):
+        raise ValueError("mode must be 'onset' or 'sustain'")
+
+    for n in inst.notes:
+        if follow_tempo:
+            start_step = quantize_tick_to_step(pm.time_to_tick(n.start), step_ticks)
+            end_step = quantize_tick_to_step(pm.time_to_tick(n.end), step_ticks)
+        else:
+            start_step = quantize_time_to_step(n.start, step_s)
+            end_step = quantize_time_to_step(n.end, step_s)
+
+        if mode == "onset":
+            onsets.append((start_step, n.pitch))
+            max_step = max(max_step, start_step)
+        else:  # sustain
+            if end_step <= start_step:
+                end_step = start_step + 1
+            starts.append(start_step)
+            ends.append(end_step)
+            pitches.append(n.pitch)
+            max_step = max(max_step, end_step - 1)
+
+    masks = [0] * (max_step + 1)
+    if mode == "sustain":
+        # The held set only changes where a note starts or ends; reuse the mask in between.
+        bits = [1 << p for p in pitches]
+        index = NoteIndex(starts, ends)
+        mask = 0
+        for s, (active, changed) in enumerate(index.iter_bins((s, s + 1) for s in range(max_step + 1))):
+            if changed:
+                mask = 0
+                for k in active:
+                    mask |= bits[k]
+            masks[s] = mask
+    else:
+        for s, pitch in onsets:
+            masks[s] |= 1 << pitch
+
+    if follow_tempo:
+        segments = tempo_step_segments(pm, step_ticks, len(masks))
+        return masks, segments[0][1], segments
+    return masks, step_s, [(0, step_s)]
+
+
+# --auto-grid candidates (steps per beat), coarsest first, triplet grids included.
+AUTO_GRID_STEPS_PER_BEAT = (1, 2, 3, 4, 6, 8, 12, 16, 24, 32)
+
+
+def _tempo_segments_array(pm: pretty_midi.PrettyMIDI) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(change ticks, change times, seconds per tick) of the tempo map, for the bulk conversions below."""
+    _times, bpms = pm.get_tempo_changes()
+    change_ticks = np.array([pm.time_to_tick(t) for t in _times], dtype=np.float64)
+    change_times = np.array([pm.tick_to_time(int(tick)) for tick in change_ticks], dtype=np.float64)
+    return change_ticks, change_times, 60.0 / (np.asarray(bpms, dtype=np.float64) * pm.resolution)
+
+
+def auto_grid_scores(
+    pm: pretty_midi.PrettyMIDI,
+    *,
+    instrument_index: int | None = None,
+    mode: str = "onset",
+    follow_tempo: bool = False,
+    tempo_source: str = "pretty_midi",
+    bpm: Optional[float] = None,
+    candidates: Tuple[int, ...] = AUTO_GRID_STEPS_PER_BEAT,
+) -> List[GridScore]:
+    """
+    Score each steps_per_beat candidate on the onsets of the instrument
+    pretty_midi_to_step_masks would convert, rounding to the nearest step as
+    it does (see autogrid.py). One score per candidate, in order; [] without
+    instruments.
+    """
+    if not pm.instruments:
+        return []
+    if instrument_index is None:
+        instrument_index = choose_best_instrument(pm)
+    if instrument_index < 0 or instrument_index >= len(pm.instruments):
+        raise ValueError(f"Invalid instrument_index={instrument_index}")
+    notes = pm.instruments[instrument_index].notes
+    starts = np.array([n.start for n in notes], dtype=np.float64)
+    ends = np.array([n.end for n in notes], dtype=np.float64)
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+
+    if follow_tempo:
+        # Positions in whole ticks, as pm.time_to_tick gives them.
+        change_ticks, change_times, tick_scales = _tempo_segments_array(pm)
+        k = np.maximum(np.searchsorted(change_times, starts, side="right") - 1, 0)
+        start_pos = np.rint(change_ticks[k] + (starts - change_times[k]) / tick_scales[k])
+        k = np.maximum(np.searchsorted(change_times, ends, side="right") - 1, 0)
+        end_pos = np.rint(change_ticks[k] + (ends - change_times[k]) / tick_scales[k])
+    else:
+        if bpm is None:
+            bpm, _source = detect_tempo(pm, tempo_source)
+        start_pos, end_pos = starts, ends
+
+    scores = []
+    for steps_per_beat in candidates:
+        if follow_tempo:
+            unit = pm.resolution / steps_per_beat  # step_ticks
+        else:
+            unit = 60.0 / bpm / steps_per_beat  # step_s
+        start_step = np.rint(start_pos / unit)
+        if not len(start_step):
+            steps = 1
+        elif mode == "onset":
+            steps = int(start_step.max()) + 1
+        else:
+            steps = int(np.maximum(np.rint(end_pos / unit), start_step + 1).max())
+        if follow_tempo:
+            ticks = np.rint(np.concatenate((start_step, [1.0])) * unit)
+            k = np.maximum(np.searchsorted(change_ticks, ticks, side="right") - 1, 0)
+            times = change_times[k] + (ticks - change_ticks[k]) * tick_scales[k]
+            step_time, step_s = times[:-1], float(times[-1])
+        else:
+            step_time, step_s = start_step * unit, unit
+        scores.append(
+            score_grid(f"{steps_per_beat}/beat", step_s, steps, starts, start_step.astype(np.int64), step_time)
+        )
+    return scores
+
+
+def choose_auto_grid(
+    pm: pretty_midi.PrettyMIDI, midi_path: str, options: Dict[str, Any], max_error_ms: float
+) -> Optional["AutoGridChoice"]:
+    """
+    --auto-grid for one parsed file: score the candidates and return the
+    chosen steps_per_beat with its report lines. None if there is nothing to
+    score (no instruments); the conversion then reports the problem.
+    """
+    t0 = time.perf_counter()
+    scores = auto_grid_scores(
+        pm,
+        instrument_index=options.get("instrument_index"),
+        mode=options.get("mode", "onset"),
+        follow_tempo=options.get("follow_tempo", False),
+        tempo_source=options.get("tempo_source", "pretty_midi"),
+        bpm=options.get("bpm"),
+    )
+    if not scores:
+        return None
+    best, met = pick_grid(scores, max_error_ms)
+    t_done = time.perf_counter()
+
+    report = [f"# auto-grid {os.path.basename(midi_path)}"]
+    report += ["#" + line for line in format_scores(scores, best)]
+    if not met:
+        report.append(f"# auto-grid: no candidate within {max_error_ms:g} ms max onset error, using the most accurate one")
+    steps_per_beat = int(best.label.split("/")[0])
+    report.append(
+        f"# auto-grid: steps_per_beat={steps_per_beat} step={best.step_s * 1e3:.3f}ms "
+        f"steps={best.steps} onset error mean={best.mean_error_ms:.3f}ms max={best.max_error_ms:.3f}ms "
+        f"collided onsets={best.collisions} ({len(scores)} candidates in {(t_done - t0) * 1e3:.1f} ms)"
+    )
+    return steps_per_beat, report
+
+
+# (bpm, source, seconds): the fixed grid's tempo, where it came from (see
+# detect_tempo) and how long detecting it took.
+TempoDetection = Tuple[float, str, float]
+
+# --auto-grid outcome for one file: (chosen steps_per_beat, report lines).
+AutoGridChoice = Tuple[int, List[str]]
+
+# (symbols, step_s, step_segments, elapsed_s, error, tempo, auto_grid) for one
+# input file; error is None on success, tempo is None for cache hits and
+# follow_tempo, auto_grid is None unless options ask for --auto-grid.
+ConversionResult = Tuple[
+    List[str], float, List[StepSegment], float, Optional[str], Optional[TempoDetection], Optional[AutoGridChoice]
+]
+
+def convert_file(midi_path: str, options: Dict[str, Any]) -> ConversionResult:
+    """
+    Run midi_to_symbol_song on one file, capturing wall time, tempo detection
+    time and any error. With options["auto_grid_max_error_ms"] the file's
+    steps_per_beat is chosen (choose_auto_grid) from the same parse and tempo.
+    Top-level so it can be shipped to worker processes.
+    """
+    t0 = time.perf_counter()
+    tempo: Optional[TempoDetection] = None
+    song_options = dict(options)
+    max_error_ms = song_options.pop("auto_grid_max_error_ms", None)
+    tempo_source = song_options.pop("tempo_source", "pretty_midi")
+    try:
+        pm, declares_tempo = load_pretty_midi(midi_path, tempo_source)
+    except Exception as exc:  # mido raises its own errors on malformed files
+        return [], 0.0, [], time.perf_counter() - t0, f"{type(exc).__name__}: {exc}", None, None
+    auto_grid = None
+    try:
+        if pm.instruments and not options.get("follow_tempo"):
+            t_tempo = time.perf_counter()
+            bpm, source = detect_tempo(pm, tempo_source, declares_tempo)
+            tempo = (bpm, source, time.perf_counter() - t_tempo)
+            song_options["bpm"] = bpm
+        if max_error_ms is not None:
+            auto_grid = choose_auto_grid(pm, midi_path, song_options, max_error_ms)
+            if auto_grid is not None:
+                song_options["steps_per_beat"] = auto_grid[0]
+        symbols, step_s, segments = pretty_midi_to_symbol_song(pm, **song_options)
+    except Exception as exc:  # one bad file must not abort the batch
+        return [], 0.0, [], time.perf_counter() - t0, f"{type(exc).__name__}: {exc}", tempo, auto_grid
+    return symbols, step_s, segments, time.perf_counter() - t0, None, tempo, auto_grid
+
+
+def convert_files(
+    midi_paths: List[str],
+    options: Dict[str, Any],
+    jobs: int = 1,
+    cache: Optional[ConversionCache] = None,
+) -> List[ConversionResult]:
+    """
+    Convert many files, optionally across a process pool (jobs=0: one per CPU).
+    Files found in the cache are not reconverted; new results are stored
+    (with the --auto-grid choice, if any). Results are returned in input
+    order regardless of completion order.
+    """
+    results: List[Optional[ConversionResult]] = [None] * len(midi_paths)
+    keys: Dict[int, str] = {}
+    if cache is not None:
+        version = source_version()
+        for i, path in enumerate(midi_paths):
+            t0 = time.perf_counter()
+            try:
+                keys[i] = cache.key(path, "midi2array2", version, options)
+            except OSError:
+                continue  # unreadable: let convert_file report it
+            hit = cache.get(keys[i])
+            if hit is not None:
+                symbols, step_s, meta = hit
+                segments = [tuple(seg) for seg in meta.get("step_segments", [(0, step_s)])]
+                auto_grid = meta.get("auto_grid")
+                results[i] = (
+                    symbols,
+                    step_s,
+                    segments,
+                    time.perf_counter() - t0,
+                    None,
+                    None,
+                    (auto_grid[0], auto_grid[1]) if auto_grid else None,
+                )
+
+    todo = [i for i, res in enumerate(results) if res is None]
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(todo))
+    if jobs <= 1:
+        converted = [convert_file(midi_paths[i], options) for i in todo]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            converted = list(
+                pool.map(convert_file, [midi_paths[i] for i in todo], [options] * len(todo))
+            )
+
+    for i, res in zip(todo, converted):
+        results[i] = res
+        symbols, step_s, segments, _elapsed, error, _tempo, auto_grid = res
+        if cache is not None and error is None and i in keys:
+            meta: Dict[str, Any] = {"step_segments": segments}
+            if auto_grid is not None:
+                meta["auto_grid"] = list(auto_grid)
+            cache.put(keys[i], symbols, step_s, meta=meta)
+    if cache is not None:
+        cache.evict()
+    return [res for res in results if res is not None]
+
+
+def format_symbol_rows(header: str, symbols: List[str], per_row: int = 20) -> str:
+    """--out text: the header line, then rows of per_row symbols, each one followed by ","."""
+    rows = [",".join(symbols[i : i + per_row]) + ",\n" for i in range(0, len(symbols), per_row)]
+    return header + "\n" + "".join(rows) + "\n"
+
+
+def output_path(path: str, midi_path: str, multiple: bool, default_ext: str) -> str:
+    """--out/--out-steps path for one input: song name appended when there are several."""
+    if not multiple:
+        return path
+    root, ext = os.path.splitext(path)
+    base = os.path.splitext(os.path.basename(midi_path))[0]
+    return f"{root}_{sanitize_name(base)}{ext or default_ext}"
+
+
+# Chords make more distinct symbols than a byte can index.
+STEP_INDEX_BYTES = 2
+
+
+def sanitize_name(name: str) -> str:
+    cleaned = re.sub(r"[^a-zA-Z0-9_]+", "_", name.strip())
+    cleaned = cleaned.strip("_")
+    return cleaned or "Song"
+
+
+# Packed step stream, one record per step run:
+#   byte b with b & 0x80  -> (b & 0x7F) + 1 silent steps
+#   byte b < 0x80         -> one step with a chord of b notes, followed by
+#                            b uint8 MIDI pitches in ascending order
+PACKED_SILENCE_FLAG = 0x80
+PACKED_MAX_SILENCE_RUN = 0x80
+PACKED_MAX_CHORD = 0x7F
+
+# Flash cost model of the text header on AVR: one 2-byte pointer per step plus
+# each distinct string literal once (the compiler merges identical literals).
+TEXT_POINTER_BYTES = 2
+
+
+def pack_symbols(
+    symbols: List[str], *, symbol_silence: str = " ", chord_join: str = "+"
+) -> bytes:
+    """Encode a symbol array into the packed step stream."""
+    return _pack_with_offsets(symbols, symbol_silence=symbol_silence, chord_join=chord_join)[0]
+
+
+def _pack_with_offsets(
+    symbols: List[str], *, symbol_silence: str = " ", chord_join: str = "+"
+) -> Tuple[bytes, List[int]]:
+    """pack_symbols plus, per step, the byte offset of its chord record (-1 if silent)."""
+    out = bytearray()
+    offsets: List[int] = []
+    silent = 0
+
+    def flush_silence() -> None:
+        nonlocal silent
+        while silent > 0:
+            run = min(silent, PACKED_MAX_SILENCE_RUN)
+            out.append(PACKED_SILENCE_FLAG | (run - 1))
+            silent -= run
+
+    records: Dict[str, bytes] = {}  # chord symbol -> encoded step record
+    for symbol in symbols:
+        if symbol == symbol_silence:
+            silent += 1
+            offsets.append(-1)
+            continue
+        flush_silence()
+        record = records.get(symbol)
+        if record is None:
+            pitches = [PITCH_BY_NAME[nn] for nn in symbol.split(chord_join)]
+            if len(pitches) > PACKED_MAX_CHORD:
+                raise ValueError(f"Chord too large for packed format: {symbol}")
+            record = records[symbol] = bytes([len(pitches)] + pitches)
+        offsets.append(len(out))
+        out += record
+    flush_silence()
+    return bytes(out), offsets
+
+
+def unpack_symbols(
+    data: bytes, *, symbol_silence: str = " ", chord_join: str = "+"
+) -> List[str]:
+    """Decode a packed step stream back to the text symbol array."""
+    symbols: List[str] = []
+    _unpack_steps(data, 0, None, symbols, symbol_silence=symbol_silence, chord_join=chord_join)
+    return symbols
+
+
+def _unpack_steps(
+    data: bytes,
+    pos: int,
+    count: Optional[int],
+    symbols: List[str],
+    *,
+    symbol_silence: str = " ",
+    chord_join: str = "+",
+) -> int:
+    """
+    Decode count steps (None: to the end) of a packed stream from pos onto
+    symbols, stopping mid silent run if need be. Returns the bytes read.
+    """
+    start = pos
+    left = count
+    while pos < len(data) and (left is None or left > 0):
+        head = data[pos]
+        pos += 1
+        if head & PACKED_SILENCE_FLAG:
+            run = (head & ~PACKED_SILENCE_FLAG) + 1
+            if left is not None:
+                run = min(run, left)
+            symbols.extend([symbol_silence] * run)
+        else:
+            pitches = data[pos : pos + head]
+            pos += head
+            symbols.append(chord_join.join(PITCH_NAMES[p] for p in pitches))
+            run = 1
+        if left is not None:
+            left -= run
+    return pos - start
+
+
+def text_header_size(symbols: List[str]) -> int:
+    """Approximate flash bytes used by one song in the text header format."""
+    literals = sum(len(sym) + 1 for sym in set(symbols))
+    return TEXT_POINTER_BYTES * len(symbols) + literals
+
+
+# Phrase format (--out-format phrases): each song's packed stream holds only
+# material not repeated earlier in the song; the song plays as a sequence of
+# uint16 order entries:
+#   e & 0x8000 -> (e & 0x7FFF) + 1 silent steps
+#   e < 0x8000 -> phrase e: stepCount steps of packed data from dataOffset
+# Phrases always start on a chord record; they may end inside a silent run.
+PHRASE_SILENCE_FLAG = 0x8000
+PHRASE_MAX_SILENCE_RUN = 0x8000
+PHRASE_MAX_ID = 0x7FFF
+PHRASE_MAX_STEPS = 0xFFFF
+PHRASE_ENTRY_BYTES = 6  # SongPhrase: uint32 dataOffset + uint16 stepCount
+ORDER_ENTRY_BYTES = 2
+# A repeat is referenced rather than stored again once its packed bytes reach
+# this: it costs an order entry, usually a phrase, and splits a literal run.
+PHRASE_MIN_MATCH_BYTES = 16
+# Repeats are found through hash chains on this many steps, trying at most
+# PHRASE_MAX_CANDIDATES earlier positions (most recent first) per step.
+PHRASE_HASH_STEPS = 4
+PHRASE_MAX_CANDIDATES = 64
+
+# (data offset into the song's packed bytes, step count)
+Phrase = Tuple[int, int]
+# (packed bytes, phrases, order entries) of one song; order entries index
+# the song's own phrase list
+SongPhrases = Tuple[bytes, List[Phrase], List[int]]
+
+
+def find_repeats(
+    tokens: List[int], record_bytes: List[int], *, min_bytes: int = PHRASE_MIN_MATCH_BYTES
+) -> List[Tuple[int, int, int]]:
+    """
+    Greedy LZ77-style parse of a token sequence: at each step take the
+    earlier, non-overlapping occurrence with the most packed bytes
+    (record_bytes per step), if it reaches min_bytes.
+    Returns (start, length, source) triples in order, source + length <= start.
+    """
+    n = len(tokens)
+    k = PHRASE_HASH_STEPS
+    prefix = [0]
+    for b in record_bytes:
+        prefix.append(prefix[-1] + b)
+    chains: Dict[Tuple[int, ...], List[int]] = {}
+
+    def insert(p: int) -> None:
+        if p + k <= n:
+            chains.setdefault(tuple(tokens[p : p + k]), []).append(p)
+
+    repeats: List[Tuple[int, int, int]] = []
+    i = 0
+    while i < n:
+        best_len, best_bytes, best_src = 0, 0, -1
+        if i + k <= n:
+            for j in reversed(chains.get(tuple(tokens[i : i + k]), [])[-PHRASE_MAX_CANDIDATES:]):
+                limit = min(i - j, n - i)
+                if limit < k or prefix[i + limit] - prefix[i] <= best_bytes:
+                    continue
+                length = k
+                while length < limit and tokens[j + length] == tokens[i + length]:
+                    length += 1
+                nbytes = prefix[i + length] - prefix[i]
+                if nbytes > best_bytes:
+                    best_len, best_bytes, best_src = length, nbytes, j
+        if best_bytes >= min_bytes:
+            repeats.append((i, best_len, best_src))
+            for p in range(i, i + best_len):
+                insert(p)
+            i += best_len
+        else:
+            insert(i)
+            i += 1
+    return repeats
+
+
+def encode_phrases(
+    symbols: List[str], *, symbol_silence: str = " ", chord_join: str = "+"
+) -> SongPhrases:
+    """
+    Phrase-compress one song: repeats found by find_repeats are played from
+    the earlier copy, so the packed data only holds the rest. Every step maps
+    to a position in that data; the song becomes runs of consecutive
+    positions (phrases, shared when identical) and silent runs.
+    """
+    vocab: Dict[str, int] = {}
+    tokens = [vocab.setdefault(sym, len(vocab)) for sym in symbols]
+    record_bytes = [0 if sym == symbol_silence else 2 + sym.count(chord_join) for sym in symbols]
+
+    # Literal steps, and for every song step its index among them
+    literal: List[str] = []
+    lit_pos = [0] * len(symbols)
+    i = 0
+    for start, length, source in find_repeats(tokens, record_bytes):
+        for p in range(i, start):
+            lit_pos[p] = len(literal)
+            literal.append(symbols[p])
+        lit_pos[start : start + length] = lit_pos[source : source + length]
+        i = start + length
+    for p in range(i, len(symbols)):
+        lit_pos[p] = len(literal)
+        literal.append(symbols[p])
+    data, offsets = _pack_with_offsets(literal, symbol_silence=symbol_silence, chord_join=chord_join)
+
+    phrases: List[Phrase] = []
+    phrase_ids: Dict[Phrase, int] = {}
+    order: List[int] = []
+
+    def add_silence(count: int) -> None:
+        while count > 0:
+            if order and order[-1] & PHRASE_SILENCE_FLAG:
+                room = PHRASE_MAX_SILENCE_RUN - ((order[-1] & ~PHRASE_SILENCE_FLAG) + 1)
+                if room > 0:
+                    run = min(count, room)
+                    order[-1] += run
+                    count -= run
+                    continue
+            run = min(count, PHRASE_MAX_SILENCE_RUN)
+            order.append(PHRASE_SILENCE_FLAG | (run - 1))
+            count -= run
+
+    def add_slice(a: int, count: int) -> None:
+        """Play literal steps a .. a+count-1."""
+        while count > 0:
+            lead = 0  # a phrase must start on a chord record
+            while lead < count and offsets[a + lead] < 0:
+                lead += 1
+            add_silence(lead)
+            a, count = a + lead, count - lead
+            if count == 0:
+                return
+            steps = min(count, PHRASE_MAX_STEPS)
+            phrase = (offsets[a], steps)
+            if phrase not in phrase_ids:
+                phrase_ids[phrase] = len(phrases)
+                phrases.append(phrase)
+            order.append(phrase_ids[phrase])
+            a, count = a + steps, count - steps
+
+    run_start = 0
+    for p in range(1, len(symbols) + 1):
+        if p == len(symbols) or lit_pos[p] != lit_pos[p - 1] + 1:
+            add_slice(lit_pos[run_start], p - run_start)
+            run_start = p
+    return data, phrases, order
+
+
+def decode_phrases(
+    song: SongPhrases, *, symbol_silence: str = " ", chord_join: str = "+"
+) -> Tuple[List[str], int]:
+    """
+    Expand a phrase-compressed song back to its symbols, as the firmware
+    plays it. Returns (symbols, PROGMEM bytes read: data, phrase and order entries).
+    """
+    data, phrases, order = song
+    symbols: List[str] = []
+    nbytes = ORDER_ENTRY_BYTES * len(order)
+    for entry in order:
+        if entry & PHRASE_SILENCE_FLAG:
+            symbols.extend([symbol_silence] * ((entry & ~PHRASE_SILENCE_FLAG) + 1))
+            continue
+        offset, steps = phrases[entry]
+        nbytes += PHRASE_ENTRY_BYTES + _unpack_steps(
+            data, offset, steps, symbols, symbol_silence=symbol_silence, chord_join=chord_join
+        )
+    return symbols, nbytes
+
+
+def phrase_song_size(song: SongPhrases) -> int:
+    """Flash bytes of one phrase-compressed song (data + phrase table + order)."""
+    data, phrases, order = song
+    return len(data) + PHRASE_ENTRY_BYTES * len(phrases) + ORDER_ENTRY_BYTES * len(order)
+
+
+# Frame format (--out-format frames): the host maps every step to the LEDs it
+# lights (bit i = LED i = MIDI kLedBaseMidi + i; pitches off the strip only
+# sound) and the buzzer pitch (lowest note), and stores each step as the
+# change against the previous step's frame, one record per step run:
+#   b & 0x80        -> (b & 0x7F) + 1 steps that change nothing and are silent
+#   otherwise       -> one step; unless b & 0x40, a byte with the MIDI pitch
+#                      for the buzzer follows, then with n = b & 0x3F:
+#     n == 0x3F     -> the XOR mask (ceil(ledCount / 8) bytes, LED i = bit
+#                      i & 7 of byte i >> 3)
+#     n < 0x3F      -> n indices of LEDs to toggle
+# Frames start from a dark strip at step 0, so a looping song needs no
+# closing record.
+FRAME_RUN_FLAG = 0x80
+FRAME_MAX_RUN = 0x80
+FRAME_NO_TONE_FLAG = 0x40
+FRAME_MASK_RECORD = 0x3F
+FRAME_MAX_LEDS = 64
+# Must match kLedBaseMidi / kLedCount in PianoStrip/Config.h (the firmware
+# refuses to build a frames header made for another mapping).
+LED_BASE_MIDI = 36
+LED_COUNT = 60
+
+# (LED bitmask, buzzer MIDI pitch or -1) of one step
+Frame = Tuple[int, int]
+
+
+def step_frames(
+    symbols: List[str],
+    *,
+    symbol_silence: str = " ",
+    chord_join: str = "+",
+    led_base_midi: int = LED_BASE_MIDI,
+    led_count: int = LED_COUNT,
+) -> List[Frame]:
+    """What the strip and buzzer show at each step (as played from the packed format)."""
+    frames: List[Frame] = []
+    cache: Dict[str, Frame] = {}
+    for symbol in symbols:
+        if symbol == symbol_silence:
+            frames.append((0, -1))
+            continue
+        frame = cache.get(symbol)
+        if frame is None:
+            pitches = [PITCH_BY_NAME[nn] for nn in symbol.split(chord_join)]
+            mask = 0
+            for p in pitches:
+                if 0 <= p - led_base_midi < led_count:
+                    mask |= 1 << (p - led_base_midi)
+            frame = cache[symbol] = (mask, min(pitches))
+        frames.append(frame)
+    return frames
+
+
+def encode_frames(
+    symbols: List[str],
+    *,
+    symbol_silence: str = " ",
+    chord_join: str = "+",
+    led_base_midi: int = LED_BASE_MIDI,
+    led_count: int = LED_COUNT,
+) -> bytes:
+    """Encode a symbol array into the delta frame stream."""
+    if not 0 < led_count <= FRAME_MAX_LEDS:
+        raise ValueError(f"frames format supports 1..{FRAME_MAX_LEDS} LEDs, got {led_count}")
+    mask_bytes = (led_count + 7) // 8
+    out = bytearray()
+    idle = 0
+
+    def flush_idle() -> None:
+        nonlocal idle
+        while idle > 0:
+            run = min(idle, FRAME_MAX_RUN)
+            out.append(FRAME_RUN_FLAG | (run - 1))
+            idle -= run
+
+    shown = 0
+    frames = step_frames(
+        symbols,
+        symbol_silence=symbol_silence,
+        chord_join=chord_join,
+        led_base_midi=led_base_midi,
+        led_count=led_count,
+    )
+    for mask, buzzer in frames:
+        diff = mask ^ shown
+        shown = mask
+        if diff == 0 and buzzer < 0:
+            idle += 1
+            continue
+        flush_idle()
+        toggles = [i for i in range(led_count) if diff >> i & 1]
+        head = FRAME_MASK_RECORD if len(toggles) > mask_bytes else len(toggles)
+        if buzzer < 0:
+            out.append(FRAME_NO_TONE_FLAG | head)
+        else:
+            out += bytes([head, buzzer])
+        if head == FRAME_MASK_RECORD:
+            out += diff.to_bytes(mask_bytes, "little")
+        else:
+            out += bytes(toggles)
+    flush_idle()
+    return bytes(out)
+
+
+def decode_frames(data: bytes, *, led_count: int = LED_COUNT) -> Tuple[List[Frame], int]:
+    """
+    Replay a delta frame stream as the firmware does. Returns the frame of
+    every step and the number of LED writes (toggles) it took.
+    """
+    mask_bytes = (led_count + 7) // 8
+    frames: List[Frame] = []
+    shown = 0
+    writes = 0
+    pos = 0
+    while pos < len(data):
+        head = data[pos]
+        if head & FRAME_RUN_FLAG:
+            frames.extend([(shown, -1)] * ((head & ~FRAME_RUN_FLAG) + 1))
+            pos += 1
+            continue
+        pos += 1
+        tone = -1
+        if not head & FRAME_NO_TONE_FLAG:
+            tone = data[pos]
+            pos += 1
+        count = head & FRAME_MASK_RECORD
+        if count == FRAME_MASK_RECORD:
+            diff = int.from_bytes(data[pos : pos + mask_bytes], "little")
+            pos += mask_bytes
+        else:
+            diff = 0
+            for i in data[pos : pos + count]:
+                diff |= 1 << i
+            pos += count
+        shown ^= diff
+        writes += bin(diff).count("1")
+        frames.append((shown, tone))
+    return frames, writes
+
+
+def _tempo_table_name(song_name: str) -> str:
+    return f"kSongTempo_{sanitize_name(song_name)}"
+
+
+def _tempo_table_lines(song_name: str, segments: List[StepSegment]) -> List[str]:
+    """PROGMEM SongTempo table for songs whose step duration changes."""
+    if len(segments) <= 1:
+        return []
+    table = _tempo_table_name(song_name)
+    lines = [f"static const SongTempo {table}[] PROGMEM = {{"]
+    for start_step, step_s in segments:
+        lines.append(f"  {{{start_step}UL, {step_s:.6f}f}},")
+    lines.append("};")
+    lines.append("")
+    return lines
+
+
+def _tempo_field_lines(song_name: str, segments: List[StepSegment]) -> List[str]:
+    if len(segments) <= 1:
+        return ["    nullptr,", "    0"]
+    table = _tempo_table_name(song_name)
+    return [f"    {table},", f"    sizeof({table}) / sizeof({table}[0])"]
+
+
+def _song_tempo_struct_lines() -> List[str]:
+    return [
+        "// Step duration changes: from startStep on, each step lasts stepSeconds.",
+        "struct SongTempo {",
+        "  uint32_t startStep;",
+        "  float stepSeconds;",
+        "};",
+        "",
+    ]
+
+
+def write_header(header_path: str, text: str) -> bool:
+    """
+    Replace header_path with text atomically (temp file + rename), and only if
+    its contents differ, so an unchanged header keeps its mtime and does not
+    trigger a rebuild. Returns True if the file was written.
+    """
+    try:
+        with open(header_path, "r", encoding="utf-8") as f:
+            if f.read() == text:
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+    directory = os.path.dirname(os.path.abspath(header_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".songs-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.chmod(tmp_path, 0o666 & ~_umask())  # mkstemp creates 0600
+        os.replace(tmp_path, header_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return True
+
+
+def _umask() -> int:
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+def emit_packed_header(
+    songs: List[Tuple[str, List[str], float]],
+    header_path: str,
+    *,
+    symbol_silence: str = " ",
+    chord_join: str = "+",
+    song_tempos: Optional[List[List[StepSegment]]] = None,
+) -> List[Tuple[str, int, int, int]]:
+    """
+    Write the packed header: all songs share one PROGMEM byte array and
+    kSongs holds each song's offset/size into it.
+    song_tempos (parallel to songs) adds per-segment step durations.
+    Returns [(song_name, steps, packed_bytes, text_bytes), ...] for reporting.
+    """
+    text, report = render_packed_header(
+        songs, symbol_silence=symbol_silence, chord_join=chord_join, song_tempos=song_tempos
+    )
+    write_header(header_path, text)
+    return report
+
+
+def render_packed_header(
+    songs: List[Tuple[str, List[str], float]],
+    *,
+    symbol_silence: str = " ",
+    chord_join: str = "+",
+    song_tempos: Optional[List[List[StepSegment]]] = None,
+) -> Tuple[str, List[Tuple[str, int, int, int]]]:
+    """Contents of the packed header and the emit_packed_header report."""
+    if song_tempos is None:
+        song_tempos = [[(0, step_s)] for _name, _symbols, step_s in songs]
+    blobs = [
+        pack_symbols(symbols, symbol_silence=symbol_silence, chord_join=chord_join)
+        for _song_name, symbols, _step_s in songs
+    ]
+
+    lines: List[str] = []
+    lines.append("#pragma once")
+    lines.append("")
+    lines.append("#include <Arduino.h>")
+    lines.append("")
+    lines.append("// Packed steps (midi2array2.py --out-format packed):")
+    lines.append("//   b & 0x80 -> (b & 0x7F) + 1 silent steps")
+    lines.append("//   b < 0x80 -> chord of b notes, followed by b MIDI pitch bytes")
+    lines.append("#define SONG_FORMAT_PACKED 1")
+    lines.append("")
+    lines.extend(_song_tempo_struct_lines())
+    lines.append("struct Song {")
+    lines.append("  const char* name;")
+    lines.append("  uint32_t dataOffset;")
+    lines.append("  uint32_t dataSize;")
+    lines.append("  size_t stepCount;")
+    lines.append("  float stepSeconds;")
+    lines.append("  const SongTempo* tempos;  // PROGMEM; nullptr = fixed stepSeconds")
+    lines.append("  size_t tempoCount;")
+    lines.append("};")
+    lines.append("")
+
+    lines.append("static const uint8_t kSongData[] PROGMEM = {")
+    for (song_name, _symbols, _step_s), blob in zip(songs, blobs):
+        lines.append(f"  // {song_name}")
+        for i in range(0, len(blob), 16):
+            lines.append("  " + ", ".join(f"0x{b:02X}" for b in blob[i : i + 16]) + ",")
+    if not any(blobs):
+        lines.append("  0x00")
+    lines.append("};")
+    lines.append("")
+
+    for (song_name, _symbols, _step_s), segments in zip(songs, song_tempos):
+        lines.extend(_tempo_table_lines(song_name, segments))
+
+    report: List[Tuple[str, int, int, int]] = []
+    offset = 0
+    lines.append("static const Song kSongs[] = {")
+    for (song_name, symbols, step_s), blob, segments in zip(songs, blobs, song_tempos):
+        lines.append("  {")
+        lines.append(f"    \"{song_name}\",")
+        lines.append(f"    {offset}UL,")
+        lines.append(f"    {len(blob)}UL,")
+        lines.append(f"    {len(symbols)},")
+        lines.append(f"    {step_s:.6f}f,")
+        lines.extend(_tempo_field_lines(song_name, segments))
+        lines.append("  },")
+        offset += len(blob)
+        report.append((song_name, len(symbols), len(blob), text_header_size(symbols)))
+    lines.append("};")
+    lines.append("")
+    lines.append("static const size_t kSongCount = sizeof(kSongs) / sizeof(kSongs[0]);")
+    lines.append("")
+
+    return "\n".join(lines), report
+
+
+def emit_phrase_header(
+    songs: List[Tuple[str, List[str], float]],
+    header_path: str,
+    *,
+    symbol_silence: str = " ",
+    chord_join: str = "+",
+    song_tempos: Optional[List[List[StepSegment]]] = None,
+) -> List[Tuple[str, int, int, int, int, int]]:
+    """
+    Write the phrase header: all songs' remaining packed data in one PROGMEM
+    byte array, one shared phrase table and one order array (see encode_phrases).
+    Returns [(song_name, steps, phrase_bytes, packed_bytes, text_bytes,
+    bytes_read_per_play), ...] for reporting.
+    """
+    text, report = render_phrase_header(
+        songs, symbol_silence=symbol_silence, chord_join=chord_join, song_tempos=song_tempos
+    )
+    write_header(header_path, text)
+    return report
+
+
+def render_phrase_header(
+    songs: List[Tuple[str, List[str], float]],
+    *,
+    symbol_silence: str = " ",
+    chord_join: str = "+",
+    song_tempos: Optional[List[List[StepSegment]]] = None,
+) -> Tuple[str, List[Tuple[str, int, int, int, int, int]]]:
+    """Contents of the phrase header and the emit_phrase_header report."""
+    if song_tempos is None:
+        song_tempos = [[(0, step_s)] for _name, _symbols, step_s in songs]
+    encoded = [
+        encode_phrases(symbols, symbol_silence=symbol_silence, chord_join=chord_join)
+        for _song_name, symbols, _step_s in songs
+    ]
+    if sum(len(phrases) for _data, phrases, _order in encoded) > PHRASE_MAX_ID + 1:
+        raise ValueError("Too many phrases for the phrase format")
+
+    lines: List[str] = []
+    lines.append("#pragma once")
+    lines.append("")
+    lines.append("#include <Arduino.h>")
+    lines.append("")
+    lines.append("// Phrase-compressed steps (midi2array2.py --out-format phrases):")
+    lines.append("//   kSongOrder[orderOffset ...] plays each song, one uint16 entry at a time:")
+    lines.append("//     e & 0x8000 -> (e & 0x7FFF) + 1 silent steps")
+    lines.append("//     e < 0x8000 -> kSongPhrases[e]: stepCount packed steps from dataOffset")
+    lines.append("//   kSongData is packed as in --out-format packed:")
+    lines.append("//     b & 0x80 -> (b & 0x7F) + 1 silent steps")
+    lines.append("//     b < 0x80 -> chord of b notes, followed by b MIDI pitch bytes")
+    lines.append("#define SONG_FORMAT_PHRASES 1")
+    lines.append("")
+    lines.extend(_song_tempo_struct_lines())
+    lines.append("struct SongPhrase {")
+    lines.append("  uint32_t dataOffset;")
+    lines.append("  uint16_t stepCount;")
+    lines.append("};")
+    lines.append("")
+    lines.append("struct Song {")
+    lines.append("  const char* name;")
+    lines.append("  uint32_t orderOffset;")
+    lines.append("  uint32_t orderCount;")
+    lines.append("  size_t stepCount;")
+    lines.append("  float stepSeconds;")
+    lines.append("  const SongTempo* tempos;  // PROGMEM; nullptr = fixed stepSeconds")
+    lines.append("  size_t tempoCount;")
+    lines.append("};")
+    lines.append("")
+
+    lines.append("static const uint8_t kSongData[] PROGMEM = {")
+    for (song_name, _symbols, _step_s), (data, _phrases, _order) in zip(songs, encoded):
+        lines.append(f"  // {song_name}")
+        for i in range(0, len(data), 16):
+            lines.append("  " + ", ".join(f"0x{b:02X}" for b in data[i : i + 16]) + ",")
+    if not any(data for data, _phrases, _order in encoded):
+        lines.append("  0x00")
+    lines.append("};")
+    lines.append("")
+
+    lines.append("static const SongPhrase kSongPhrases[] PROGMEM = {")
+    data_offset = 0
+    for (song_name, _symbols, _step_s), (data, phrases, _order) in zip(songs, encoded):
+        lines.append(f"  // {song_name}")
+        for offset, steps in phrases:
+            lines.append(f"  {{{data_offset + offset}UL, {steps}}},")
+        data_offset += len(data)
+    if not any(phrases for _data, phrases, _order in encoded):
+        lines.append("  {0UL, 0}")
+    lines.append("};")
+    lines.append("")
+
+    lines.append("static const uint16_t kSongOrder[] PROGMEM = {")
+    phrase_base = 0
+    for (song_name, _symbols, _step_s), (_data, phrases, order) in zip(songs, encoded):
+        lines.append(f"  // {song_name}")
+        entries = [e if e & PHRASE_SILENCE_FLAG else e + phrase_base for e in order]
+        for i in range(0, len(entries), 12):
+            lines.append("  " + ", ".join(f"0x{e:04X}" for e in entries[i : i + 12]) + ",")
+        phrase_base += len(phrases)
+    if not any(order for _data, _phrases, order in encoded):
+        lines.append("  0x0000")
+    lines.append("};")
+    lines.append("")
+
+    for (song_name, _symbols, _step_s), segments in zip(songs, song_tempos):
+        lines.extend(_tempo_table_lines(song_name, segments))
+
+    report: List[Tuple[str, int, int, int, int, int]] = []
+    order_offset = 0
+    lines.append("static const Song kSongs[] = {")
+    for (song_name, symbols, step_s), song, segments in zip(songs, encoded, song_tempos):
+        order = song[2]
+        lines.append("  {")
+        lines.append(f"    \"{song_name}\",")
+        lines.append(f"    {order_offset}UL,")
+        lines.append(f"    {len(order)}UL,")
+        lines.append(f"    {len(symbols)},")
+        lines.append(f"    {step_s:.6f}f,")
+        lines.extend(_tempo_field_lines(song_name, segments))
+        lines.append("  },")
+        order_offset += len(order)
+        packed_bytes = len(pack_symbols(symbols, symbol_silence=symbol_silence, chord_join=chord_join))
+        _decoded, read_bytes = decode_phrases(song, symbol_silence=symbol_silence, chord_join=chord_join)
+        report.append(
+            (song_name, len(symbols), phrase_song_size(song), packed_bytes, text_header_size(symbols), read_bytes)
+        )
+    lines.append("};")
+    lines.append("")
+    lines.append("static const size_t kSongCount = sizeof(kSongs) / sizeof(kSongs[0]);")
+    lines.append("")
+    return "\n".join(lines), report
+
+
+def emit_frame_header(
+    songs: List[Tuple[str, List[str], float]],
+    header_path: str,
+    *,
+    symbol_silence: str = " ",
+    chord_join: str = "+",
+    song_tempos: Optional[List[List[StepSegment]]] = None,
+    led_base_midi: int = LED_BASE_MIDI,
+    led_count: int = LED_COUNT,
+) -> List[Tuple[str, int, int, int, int]]:
+    """
+    Write the frames header: every song's delta frame stream (see
+    encode_frames) in one PROGMEM byte array, laid out like the packed header.
+    Returns [(song_name, steps, frame_bytes, packed_bytes, led_writes), ...]
+    for reporting.
+    """
+    text, report = render_frame_header(
+        songs,
+        symbol_silence=symbol_silence,
+        chord_join=chord_join,
+        song_tempos=song_tempos,
+        led_base_midi=led_base_midi,
+        led_count=led_count,
+    )
+    write_header(header_path, text)
+    return report
+
+
+def render_frame_header(
+    songs: List[Tuple[str, List[str], float]],
+    *,
+    symbol_silence: str = " ",
+    chord_join: str = "+",
+    song_tempos: Optional[List[List[StepSegment]]] = None,
+    led_base_midi: int = LED_BASE_MIDI,
+    led_count: int = LED_COUNT,
+) -> Tuple[str, List[Tuple[str, int, int, int, int]]]:
+    """Contents of the frames header and the emit_frame_header report."""
+    if song_tempos is None:
+        song_tempos = [[(0, step_s)] for _name, _symbols, step_s in songs]
+    blobs = [
+        encode_frames(
+            symbols,
+            symbol_silence=symbol_silence,
+            chord_join=chord_join,
+            led_base_midi=led_base_midi,
+            led_count=led_count,
+        )
+        for _song_name, symbols, _step_s in songs
+    ]
+
+    lines: List[str] = []
+    lines.append("#pragma once")
+    lines.append("")
+    lines.append("#include <Arduino.h>")
+    lines.append("")
+    lines.append("// LED frame deltas (midi2array2.py --out-format frames), bit i = LED i:")
+    lines.append("//   b & 0x80 -> (b & 0x7F) + 1 steps with no change and no tone")
+    lines.append("//   else one step: buzzer MIDI pitch byte unless b & 0x40, then")
+    lines.append("//     (b & 0x3F) == 0x3F -> SONG_FRAMES_MASK_BYTES of XOR mask")
+    lines.append("//     (b & 0x3F) < 0x3F -> that many indices of LEDs to toggle")
+    lines.append("#define SONG_FORMAT_FRAMES 1")
+    lines.append(f"#define SONG_FRAMES_LED_BASE_MIDI {led_base_midi}")
+    lines.append(f"#define SONG_FRAMES_LED_COUNT {led_count}")
+    lines.append(f"#define SONG_FRAMES_MASK_BYTES {(led_count + 7) // 8}")
+    lines.append("")
+    lines.extend(_song_tempo_struct_lines())
+    lines.append("struct Song {")
+    lines.append("  const char* name;")
+    lines.append("  uint32_t dataOffset;")
+    lines.append("  uint32_t dataSize;")
+    lines.append("  size_t stepCount;")
+    lines.append("  float stepSeconds;")
+    lines.append("  const SongTempo* tempos;  // PROGMEM; nullptr = fixed stepSeconds")
+    lines.append("  size_t tempoCount;")
+    lines.append("};")
+    lines.append("")
+
+    lines.append("static const uint8_t kSongData[] PROGMEM = {")
+    for (song_name, _symbols, _step_s), blob in zip(songs, blobs):
+        lines.append(f"  // {song_name}")
+        for i in range(0, len(blob), 16):
+            lines.append("  " + ", ".join(f"0x{b:02X}" for b in blob[i : i + 16]) + ",")
+    if not any(blobs):
+        lines.append("  0x00")
+    lines.append("};")
+    lines.append("")
+
+    for (song_name, _symbols, _step_s), segments in zip(songs, song_tempos):
+        lines.extend(_tempo_table_lines(song_name, segments))
+
+    report: List[Tuple[str, int, int, int, int]] = []
+    offset = 0
+    lines.append("static const Song kSongs[] = {")
+    for (song_name, symbols, step_s), blob, segments in zip(songs, blobs, song_tempos):
+        lines.append("  {")
+        lines.append(f"    \"{song_name}\",")
+        lines.append(f"    {offset}UL,")
+        lines.append(f"    {len(blob)}UL,")
+        lines.append(f"    {len(symbols)},")
+        lines.append(f"    {step_s:.6f}f,")
+        lines.extend(_tempo_field_lines(song_name, segments))
+        lines.append("  },")
+        offset += len(blob)
+        packed_bytes = len(pack_symbols(symbols, symbol_silence=symbol_silence, chord_join=chord_join))
+        _frames, writes = decode_frames(blob, led_count=led_count)
+        report.append((song_name, len(symbols), len(blob), packed_bytes, writes))
+    lines.append("};")
+    lines.append("")
+    lines.append("static const size_t kSongCount = sizeof(kSongs) / sizeof(kSongs[0]);")
+    lines.append("")
+    return "\n".join(lines), report
+
+
+def emit_header(
+    songs: List[Tuple[str, List[str], float]],
+    header_path: str,
+    song_tempos: Optional[List[List[StepSegment]]] = None,
+) -> None:
+    write_header(header_path, render_header(songs, song_tempos))
+
+
+def render_header(
+    songs: List[Tuple[str, List[str], float]],
+    song_tempos: Optional[List[List[StepSegment]]] = None,
+) -> str:
+    """Contents of the text header (one string literal per step)."""
+    if song_tempos is None:
+        song_tempos = [[(0, step_s)] for _name, _symbols, step_s in songs]
+
+    lines: List[str] = []
+    lines.append("#pragma once")
+    lines.append("")
+    lines.append("#include <Arduino.h>")
+    lines.append("")
+    lines.extend(_song_tempo_struct_lines())
+    lines.append("struct Song {")
+    lines.append("  const char* name;")
+    lines.append("  const char* const* steps;")
+    lines.append("  size_t stepCount;")
+    lines.append("  float stepSeconds;")
+    lines.append("  const SongTempo* tempos;  // PROGMEM; nullptr = fixed stepSeconds")
+    lines.append("  size_t tempoCount;")
+    lines.append("};")
+    lines.append("")
+
+    for (song_name, symbols, step_s), segments in zip(songs, song_tempos):
+        array_name = f"kSong_{sanitize_name(song_name)}"
+        lines.append(f"static const char* const {array_name}[] = {{")
+        for symbol in symbols:
+            token = symbol.replace("\"", "\\\"")
+            lines.append(f"  \"{token}\",")
+        lines.append("};")
+        lines.append("")
+        lines.extend(_tempo_table_lines(song_name, segments))
+
+    lines.append("static const Song kSongs[] = {")
+    for (song_name, symbols, step_s), segments in zip(songs, song_tempos):
+        array_name = f"kSong_{sanitize_name(song_name)}"
+        lines.append("  {")
+        lines.append(f"    \"{song_name}\",")
+        lines.append(f"    {array_name},")
+        lines.append(f"    sizeof({array_name}) / sizeof({array_name}[0]),")
+        lines.append(f"    {step_s:.6f}f,")
+        lines.extend(_tempo_field_lines(song_name, segments))
+        lines.append("  },")
+    lines.append("};")
+    lines.append("")
+    lines.append("static const size_t kSongCount = sizeof(kSongs) / sizeof(kSongs[0]);")
+    lines.append("")
+
+    return "\n".join(lines)
+
+
+MIDI_EXTENSIONS = (".mid", ".midi")
+
+# (mtime_ns, size): a file counts as changed when either differs
+FileStamp = Tuple[int, int]
+
+
+def scan_midi_files(directory: str) -> Dict[str, FileStamp]:
+    """MIDI files directly inside directory -> their FileStamp."""
+    found: Dict[str, FileStamp] = {}
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return found
+    for entry in entries:
+        if not entry.name.lower().endswith(MIDI_EXTENSIONS) or entry.name.startswith("."):
+            continue
+        try:
+            st = entry.stat()
+        except OSError:
+            continue  # removed between listing and stat
+        if entry.is_file():
+            found[entry.path] = (st.st_mtime_ns, st.st_size)
+    return found
+
+
+def watch_directory(
+    directory: str,
+    header_path: str,
+    options: Dict[str, Any],
+    *,
+    out_format: str = "text",
+    poll_interval: float = 0.5,
+    jobs: int = 1,
+    cache: Optional[ConversionCache] = None,
+    max_polls: Optional[int] = None,
+    led_base_midi: int = LED_BASE_MIDI,
+    led_count: int = LED_COUNT,
+) -> None:
+    """
+    Keep header_path in sync with the MIDI files in directory (polling, no
+    extra dependencies). Converted songs stay in memory; on each change only
+    added/modified files are reconverted, removed ones dropped, and the header
+    rebuilt and written atomically if its contents changed.
+
+    A modified file is converted once its stamp is unchanged over two polls,
+    so a save in progress is not read half-written. A file that fails to
+    convert keeps its last good version until it changes again.
+    Songs are ordered by file name. max_polls stops the loop (None: forever).
+    led_base_midi / led_count set the LED mapping of the frames format.
+    """
+    songs: Dict[str, Tuple[List[str], float, List[StepSegment]]] = {}
+    converted_stamps: Dict[str, FileStamp] = {}
+    pending: Dict[str, FileStamp] = {}
+    polls = 0
+    first = True
+    while max_polls is None or polls < max_polls:
+        polls += 1
+        current = scan_midi_files(directory)
+        removed = [path for path in converted_stamps if path not in current]
+        for path in removed:
+            del converted_stamps[path]
+            songs.pop(path, None)
+        for path in list(pending):
+            if path not in current:
+                del pending[path]
+
+        ready: List[str] = []
+        for path, stamp in sorted(current.items()):
+            if converted_stamps.get(path) == stamp:
+                pending.pop(path, None)
+            elif first or pending.get(path) == stamp:
+                ready.append(path)
+                pending.pop(path, None)
+            else:
+                pending[path] = stamp  # changed since last poll: wait for it to settle
+
+        if first or ready or removed:
+            t0 = time.perf_counter()
+            failed = 0
+            for path, (symbols, step_s, segments, _elapsed, error, _tempo, _auto_grid) in zip(
+                ready, convert_files(ready, options, jobs=jobs, cache=cache)
+            ):
+                converted_stamps[path] = current[path]
+                if error is not None:
+                    failed += 1
+                    kept = " (keeping previous version)" if path in songs else ""
+                    print(f"# watch: error {path}: {error}{kept}", file=sys.stderr)
+                    continue
+                songs[path] = (symbols, step_s, segments)
+            convert_s = time.perf_counter() - t0
+
+            order = sorted(songs, key=os.path.basename)
+            song_list = [
+                (os.path.splitext(os.path.basename(path))[0], songs[path][0], songs[path][1])
+                for path in order
+            ]
+            song_tempos = [songs[path][2] for path in order]
+            if out_format == "packed":
+                text, _report = render_packed_header(
+                    song_list,
+                    symbol_silence=options.get("symbol_silence", " "),
+                    chord_join=options.get("chord_join", "+"),
+                    song_tempos=song_tempos,
+                )
+            elif out_format == "phrases":
+                text, _report = render_phrase_header(
+                    song_list,
+                    symbol_silence=options.get("symbol_silence", " "),
+                    chord_join=options.get("chord_join", "+"),
+                    song_tempos=song_tempos,
+                )
+            elif out_format == "frames":
+                text, _report = render_frame_header(
+                    song_list,
+                    symbol_silence=options.get("symbol_silence", " "),
+                    chord_join=options.get("chord_join", "+"),
+                    song_tempos=song_tempos,
+                    led_base_midi=led_base_midi,
+                    led_count=led_count,
+                )
+            else:
+                text = render_header(song_list, song_tempos)
+            written = write_header(header_path, text)
+
+            status = "updated" if written else "unchanged"
+            line = (
+                f"# watch: {len(ready)} converted, {len(removed)} removed, {failed} failed "
+                f"in {convert_s:.3f}s; {len(song_list)} songs, {header_path} {status}"
+            )
+            if ready and not first:
+                # mtime of the newest save -> header on disk
+                last_save_s = max(current[path][0] for path in ready) / 1e9
+                line += f"; latency {time.time() - last_save_s:.3f}s since save"
+            print(line, file=sys.stderr, flush=True)
+            first = False
+
+        if max_polls is None or polls < max_polls:
+            time.sleep(poll_interval)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("midi", nargs="*", help="Path(s) to .mid/.midi file(s)")
+    ap.add_argument(
+        "--steps-per-beat", type=int, default=4, help="4=16th notes, 2=8th, 1=quarter"
+    )
+    ap.add_argument("--mode", choices=["onset", "sustain"], default="onset")
+    ap.add_argument(
+        "--instrument-index",
+        type=int,
+        default=None,
+        help="Which track to use (default: auto best)",
+    )
+    ap.add_argument("--silence", default=" ", help="Symbol to use for silence")
+    ap.add_argument("--join", default="+", help="Joiner for chords")
+    ap.add_argument(
+        "--print", dest="do_print", action="store_true", help="Print the array"
+    )
+    ap.add_argument(
+        "--out", default=None, help="Optional output .txt file (one symbol per step)"
+    )
+    ap.add_argument(
+        "--out-steps",
+        default=None,
+        help="Optional output binary step array (memory-mappable, see steparray.py)",
+    )
+    ap.add_argument(
+        "--out-header",
+        default=None,
+        help="Optional output .h file with arrays and a kSongs meta array",
+    )
+    ap.add_argument(
+        "--out-format",
+        choices=["text", "packed", "phrases", "frames"],
+        default="text",
+        help="Header format: text (string per step), packed (PROGMEM bytes), "
+        "phrases (packed, repeated passages stored once) or frames (per-step LED deltas)",
+    )
+    ap.add_argument(
+        "--led-base-midi",
+        type=int,
+        default=LED_BASE_MIDI,
+        help="MIDI note of LED 0 for --out-format frames (kLedBaseMidi in Config.h)",
+    )
+    ap.add_argument(
+        "--led-count",
+        type=int,
+        default=LED_COUNT,
+        help="LEDs on the strip for --out-format frames (kLedCount in Config.h)",
+    )
+    ap.add_argument(
+        "--song-name",
+        action="append",
+        default=None,
+        help="Override song name (repeatable, matches order of MIDI inputs)",
+    )
+    ap.add_argument(
+        "--follow-tempo",
+        action="store_true",
+        help="Quantize in MIDI ticks so steps follow every tempo change",
+    )
+    ap.add_argument(
+        "--tempo-source",
+        choices=TEMPO_SOURCES,
+        default="pretty_midi",
+        help="Fixed grid tempo: pretty_midi estimate, declared set_tempo, "
+        "histogram estimate, or auto (declared if present, else estimated)",
+    )
+    ap.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Convert files in N worker processes (0 = one per CPU)",
+    )
+    add_cache_arguments(ap)
+    ap.add_argument(
+        "--watch",
+        default=None,
+        metavar="DIR",
+        help="Keep --out-header in sync with the MIDI files in DIR (polling; Ctrl-C to stop)",
+    )
+    ap.add_argument(
+        "--poll-interval", type=float, default=0.5, help="Seconds between --watch polls"
+    )
+    add_auto_grid_arguments(
+        ap, "Per file, pick the coarsest --steps-per-beat (fewest steps) within --max-error-ms onset error"
+    )
+    args = ap.parse_args()
+    if args.watch is not None:
+        if args.midi or args.out or args.out_steps or args.do_print or args.song_name or args.auto_grid:
+            ap.error("--watch takes its songs from DIR and only writes --out-header")
+        if not args.out_header:
+            ap.error("--watch needs --out-header")
+    elif not args.midi:
+        ap.error("give MIDI file(s) or --watch DIR")
+    if args.out_format == "frames" and not 0 < args.led_count <= FRAME_MAX_LEDS:
+        ap.error(f"--led-count must be 1..{FRAME_MAX_LEDS} for --out-format frames")
+
+    cache = cache_from_args(args)
+
+    options: Dict[str, Any] = dict(
+        steps_per_beat=args.steps_per_beat,
+        instrument_index=args.instrument_index,
+        mode=args.mode,
+        symbol_silence=args.silence,
+        chord_join=args.join,
+        follow_tempo=args.follow_tempo,
+        tempo_source=args.tempo_source,
+    )
+    if args.watch is not None:
+        print(f"# watching {args.watch} -> {args.out_header} (every {args.poll_interval:g}s)", file=sys.stderr)
+        try:
+            watch_directory(
+                args.watch,
+                args.out_header,
+                options,
+                out_format=args.out_format,
+                poll_interval=args.poll_interval,
+                jobs=args.jobs,
+                cache=cache,
+                led_base_midi=args.led_base_midi,
+                led_count=args.led_count,
+            )
+        except KeyboardInterrupt:
+            pass
+        print(cache.stats_line(), file=sys.stderr)
+        return
+
+    t_start = time.perf_counter()
+    if args.auto_grid:
+        options["auto_grid_max_error_ms"] = args.max_error_ms
+    results = convert_files(args.midi, options, jobs=args.jobs, cache=cache)
+    grids = [args.steps_per_beat if res[6] is None else res[6][0] for res in results]
+    for res in results:
+        for line in res[6][1] if res[6] is not None else []:
+            print(line, file=sys.stderr)
+
+    songs: List[Tuple[str, List[str], float]] = []
+    song_tempos: List[List[StepSegment]] = []
+    failed: List[str] = []
+
+    for index, (midi_path, (symbols, step_s, segments, _elapsed, error, _tempo, _auto_grid)) in enumerate(
+        zip(args.midi, results)
+    ):
+        if error is not None:
+            print(f"# error {midi_path}: {error}", file=sys.stderr)
+            failed.append(midi_path)
+            continue
+        if args.song_name and index < len(args.song_name):
+            song_name = args.song_name[index]
+        else:
+            song_name = os.path.splitext(os.path.basename(midi_path))[0]
+        songs.append((song_name, symbols, step_s))
+        song_tempos.append(segments)
+
+        header = (
+            f"# steps={len(symbols)} step_s={step_s:.6f} mode={args.mode} "
+            f"steps_per_beat={grids[index]}"
+        )
+        if len(segments) > 1:
+            header += f" tempo_segments={len(segments)}"
+        if args.do_print:
+            print(header)
+            print(symbols)
+
+        if args.out:
+            txt_path = output_path(args.out, midi_path, len(args.midi) > 1, ".txt")
+            with open(txt_path, "w", encoding="utf-8") as f:
+                f.write(format_symbol_rows(header, symbols))
+        if args.out_steps:
+            with StepArrayWriter(
+                output_path(args.out_steps, midi_path, len(args.midi) > 1, ".steps"),
+                step_s=step_s,
+                step_segments=segments,
+                index_bytes=STEP_INDEX_BYTES,
+                converter="midi2array2",
+                source=os.path.basename(midi_path),
+                **dict(options, steps_per_beat=grids[index]),
+            ) as w:
+                w.write_tokens(symbols)
+
+    if args.out_header:
+        if args.out_format == "packed":
+            report = emit_packed_header(
+                songs,
+                args.out_header,
+                symbol_silence=args.silence,
+                chord_join=args.join,
+                song_tempos=song_tempos,
+            )
+            for song_name, steps, packed_bytes, text_bytes in report:
+                per_step = steps or 1
+                print(
+                    f"# packed {song_name}: steps={steps} "
+                    f"packed={packed_bytes}B ({packed_bytes / per_step:.2f} B/step) "
+                    f"text~{text_bytes}B ({text_bytes / per_step:.2f} B/step)",
+                    file=sys.stderr,
+                )
+        elif args.out_format == "phrases":
+            report = emit_phrase_header(
+                songs,
+                args.out_header,
+                symbol_silence=args.silence,
+                chord_join=args.join,
+                song_tempos=song_tempos,
+            )
+            for song_name, steps, phrase_bytes, packed_bytes, text_bytes, read_bytes in report:
+                per_step = steps or 1
+                print(
+                    f"# phrases {song_name}: steps={steps} "
+                    f"phrases={phrase_bytes}B ({packed_bytes / max(phrase_bytes, 1):.2f}x vs packed "
+                    f"{packed_bytes}B, {text_bytes / max(phrase_bytes, 1):.2f}x vs text~{text_bytes}B) "
+                    f"expansion {read_bytes / per_step:.2f} B read/step "
+                    f"(packed {packed_bytes / per_step:.2f})",
+                    file=sys.stderr,
+                )
+        elif args.out_format == "frames":
+            report = emit_frame_header(
+                songs,
+                args.out_header,
+                symbol_silence=args.silence,
+                chord_join=args.join,
+                song_tempos=song_tempos,
+                led_base_midi=args.led_base_midi,
+                led_count=args.led_count,
+            )
+            for song_name, steps, frame_bytes, packed_bytes, led_writes in report:
+                per_step = steps or 1
+                print(
+                    f"# frames {song_name}: steps={steps} "
+                    f"frames={frame_bytes}B ({frame_bytes / per_step:.2f} B/step, "
+                    f"packed {packed_bytes}B) LED writes {led_writes / per_step:.2f}/step",
+                    file=sys.stderr,
+                )
+        else:
+            emit_header(songs, args.out_header, song_tempos)
+
+    for midi_path, (symbols, _step_s, _segments, elapsed, error, tempo, _auto_grid) in zip(args.midi, results):
+        status = "FAILED" if error is not None else f"steps={len(symbols)}"
+        if tempo is not None:
+            bpm, source, tempo_s = tempo
+            status += f"  tempo {tempo_s * 1e3:.2f}ms ({source} {bpm:.2f} bpm)"
+        print(f"# time {elapsed:8.3f}s  {os.path.basename(midi_path)}  {status}", file=sys.stderr)
+    if len(args.midi) > 1:
+        print(
+            f"# total {time.perf_counter() - t_start:8.3f}s  files={len(args.midi)} "
+            f"failed={len(failed)} jobs={args.jobs}",
+            file=sys.stderr,
+        )
+
+    print(cache.stats_line(), file=sys.stderr)
+
+    if failed:
+        raise SystemExit(1)
+
@@ -0,0 +1,53 @@
+"""
+notearray/cli.py
+
+Command-line pieces both converters share: the conversion cache options
+and --auto-grid.
+
+Usage:
+    ap = argparse.ArgumentParser()
+    add_cache_arguments(ap)
+    add_auto_grid_arguments(ap, "Pick the coarsest grid within --max-error-ms")
+    args = ap.parse_args()
+    cache = cache_from_args(args)
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from convcache import ConversionCache, DEFAULT_MAX_BYTES
+
+# --max-error-ms default: onset timing error budget of --auto-grid.
+DEFAULT_MAX_ERROR_MS = 10.0
+
+
+def add_cache_arguments(ap: argparse.ArgumentParser) -> None:
+    """--cache-dir, --cache-max-mb and --no-cache."""
+    ap.add_argument("--cache-dir", default=None, help="Conversion cache directory (default: ~/.cache/pianostrip)")
+    ap.add_argument(
+        "--cache-max-mb",
+        type=float,
+        default=DEFAULT_MAX_BYTES / (1024 * 1024),
+        help="Evict least recently used cache entries beyond this size",
+    )
+    ap.add_argument("--no-cache", action="store_true", help="Always reconvert, do not read or write the cache")
+
+
+def cache_from_args(args: argparse.Namespace) -> ConversionCache:
+    return ConversionCache(
+        args.cache_dir,
+        max_bytes=int(args.cache_max_mb * 1024 * 1024),
+        enabled=not args.no_cache,
+    )
+
+
+def add_auto_grid_arguments(ap: argparse.ArgumentParser, help: str) -> None:
+    """--auto-grid (described by help) and its --max-error-ms budget."""
+    ap.add_argument("--auto-grid", action="store_true", help=help)
+    ap.add_argument(
+        "--max-error-ms",
+        type=float,
+        default=DEFAULT_MAX_ERROR_MS,
+        help="Onset timing error budget for --auto-grid",
+    )
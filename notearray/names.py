@@ -0,0 +1,36 @@
+"""
+notearray/names.py
+
+Pitch <-> note name tables shared by both quantizers, computed once at
+import: scientific pitch notation with sharps, MIDI note 60 = C4, so
+0 = C-1 and 127 = G9.
+
+Usage:
+    PITCH_NAMES[61]         # "C#4"
+    pitch_to_name(54)       # "F#3"
+    name_to_pitch("C-1")    # 0
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Tuple
+
+NOTE_NAMES: Tuple[str, ...] = ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B")
+
+PITCH_NAMES: Tuple[str, ...] = tuple(f"{NOTE_NAMES[p % 12]}{p // 12 - 1}" for p in range(128))
+PITCH_BY_NAME: Dict[str, int] = {name: p for p, name in enumerate(PITCH_NAMES)}
+
+
+def pitch_to_name(pitch: int) -> str:
+    """MIDI note number (0-127) -> name like C4, F#3."""
+    if not 0 <= pitch <= 127:
+        raise ValueError(f"Invalid MIDI note number: {pitch}")
+    return PITCH_NAMES[pitch]
+
+
+def name_to_pitch(name: str) -> int:
+    """Inverse of pitch_to_name (e.g. "F#3" -> 54, "C-1" -> 0)."""
+    try:
+        return PITCH_BY_NAME[name]
+    except KeyError:
+        raise ValueError(f"Invalid note name: {name!r}") from None
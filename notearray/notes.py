@@ -0,0 +1,1526 @@
+"""
+notearray/notes.py
+
+The "notes" quantizer behind midi2array.py. Converts a MIDI file into a
+time-quantized array of note names:
+- Each time step contains either "SIL" or a note like "C4", "F#3".
+- Uses a fixed grid (e.g., 16th notes or 10 ms), or with --follow-tempo a musical
+  grid whose bins stay on beat subdivisions across every tempo change.
+- Handles tempo changes via midi ticks -> seconds conversion.
+- Handles overlaps with a selectable policy: "loudest", "highest", "lowest", "first".
+- Caches results on disk keyed by file contents + options (see convcache.py, --no-cache).
+- --parser raw reads the file with the built-in memory-mapped SMF reader
+  (smfreader.py) instead of mido: same events, far fewer allocations.
+- --variants converts to several (grid, policy, silence) outputs from one
+  parse, each saved to its own file (see convert_midi_file_variants).
+- --live PORT quantizes a MIDI input port in real time, printing each bin
+  as soon as it closes (see OnlineQuantizer).
+- --save-format steps saves a binary step array instead of text: one byte
+  per step indexing a token table, memory-mappable (see steparray.py).
+- --auto-grid picks the grid for you: the coarsest candidate whose onset
+  timing error stays within --max-error-ms (see autogrid.py, needs numpy).
+
+Dependencies:
+  pip install mido python-rtmidi
+(You don't strictly need python-rtmidi unless you also do realtime I/O, i.e. --live.)
+Optional:
+  pip install numpy   (enables --engine numpy, a vectorized piano-roll quantizer, and --auto-grid)
+mido and numpy are imported lazily (see backends.py): --help, cache hits and
+--parser raw never load mido, and numpy is only loaded by the code that uses it.
+
+Usage:
+  python midi2array.py input.mid --grid 16th --policy highest
+  python midi2array.py input.mid --grid-ms 10 --policy loudest
+  python midi2array.py input.mid --grid-ms 1 --engine numpy
+  python midi2array.py input.mid --grid 16th --follow-tempo
+  python midi2array.py input.mid --grid-ms 10 --parser raw
+  python midi2array.py input.mid --variants 16th 8th:loudest 10ms:lowest:REST --save out.txt
+  python midi2array.py input.mid --grid-ms 10 --save out.steps --save-format steps
+  python midi2array.py input.mid --auto-grid --max-error-ms 10
+  python midi2array.py --live "USB MIDI Keyboard" --grid 16th --bpm 96
+"""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import math
+import os
+import re
+import sys
+import time
+from array import array
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Sequence, Tuple, Optional, Union
+
+from noteindex import NoteIndex
+from smfreader import RawMidi, read_smf
+from steparray import StepArrayWriter
+
+from notearray import source_version
+from notearray.backends import get_parser, lazy_import, parser_names
+from notearray.cli import add_auto_grid_arguments, add_cache_arguments, cache_from_args
+from notearray.names import PITCH_NAMES, pitch_to_name as midi_note_to_name
+
+if TYPE_CHECKING:
+    from autogrid import GridScore
+
+mido = lazy_import("mido")
+np = lazy_import("numpy", optional=True)  # only needed for engine="numpy" and --auto-grid
+
+
+@dataclass(frozen=True)
+class NoteEvent:
+    start_s: float
+    end_s: float
+    note: int
+    velocity: int
+    channel: int
+    track: int
+
+
+class NoteEventTable:
+    """
+    Columnar store of note events: one typed array per NoteEvent field
+    (about 21 bytes per note instead of one dataclass object).
+
+    Usage:
+        table = extract_note_table(mid)
+        table.start_s, table.note          # array("d"), array("B") columns
+        table[i]                           # one NoteEvent (built on demand)
+        for e in table: ...                # NoteEvent view, in table order
+        table.sorted()                     # new table in canonical order
+    """
+
+    def __init__(self, start_s=(), end_s=(), note=(), velocity=(), channel=(), track=()):
+        self.start_s = array("d", start_s)
+        self.end_s = array("d", end_s)
+        self.note = array("B", note)
+        self.velocity = array("B", velocity)
+        self.channel = array("B", channel)
+        self.track = array("H", track)
+        if len({len(col) for col in self.columns()}) > 1:
+            raise ValueError("NoteEventTable columns must have the same length")
+
+    @classmethod
+    def from_events(cls, events: Iterable[NoteEvent]) -> "NoteEventTable":
+        table = cls()
+        for e in events:
+            table.append(e.start_s, e.end_s, e.note, e.velocity, e.channel, e.track)
+        return table
+
+    def columns(self) -> Tuple[array, array, array, array, array, array]:
+        return self.start_s, self.end_s, self.note, self.velocity, self.channel, self.track
+
+    def append(self, start_s: float, end_s: float, note: int, velocity: int, channel: int, track: int) -> None:
+        self.start_s.append(start_s)
+        self.end_s.append(end_s)
+        self.note.append(note)
+        self.velocity.append(velocity)
+        self.channel.append(channel)
+        self.track.append(track)
+
+    def __len__(self) -> int:
+        return len(self.start_s)
+
+    def __getitem__(self, i: int) -> NoteEvent:
+        return NoteEvent(*(col[i] for col in self.columns()))
+
+    def __iter__(self) -> Iterator[NoteEvent]:
+        for row in zip(*self.columns()):
+            yield NoteEvent(*row)
+
+    def to_events(self) -> List[NoteEvent]:
+        return list(self)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(col.itemsize * len(col) for col in self.columns())
+
+    def sort_order(self) -> List[int]:
+        """Row order by (start_s, end_s, track, channel, note), stable (as extract_note_events sorts)."""
+        if np is not None:
+            # lexsort: last key is the primary one
+            keys = (self.note, self.channel, self.track, self.end_s, self.start_s)
+            return np.lexsort([np.frombuffer(col, dtype=col.typecode) for col in keys]).tolist()
+        start_s, end_s, note, channel, track = self.start_s, self.end_s, self.note, self.channel, self.track
+        return sorted(range(len(self)), key=lambda i: (start_s[i], end_s[i], track[i], channel[i], note[i]))
+
+    def start_order(self) -> List[int]:
+        """Row order by start_s only, stable (the quantizers' sweep order)."""
+        if np is not None:
+            return np.argsort(np.frombuffer(self.start_s, dtype="d"), kind="stable").tolist()
+        return sorted(range(len(self)), key=self.start_s.__getitem__)
+
+    def take(self, order: Iterable[int]) -> "NoteEventTable":
+        order = list(order)
+        return NoteEventTable(*([col[i] for i in order] for col in self.columns()))
+
+    def sorted(self) -> "NoteEventTable":
+        return self.take(self.sort_order())
+
+
+# Everything that takes note events accepts either form
+NoteEvents = Union[List[NoteEvent], NoteEventTable]
+
+
+def as_note_table(events: NoteEvents) -> NoteEventTable:
+    """Accept a NoteEventTable or a List[NoteEvent] (compatibility with the list API)."""
+    if isinstance(events, NoteEventTable):
+        return events
+    return NoteEventTable.from_events(events)
+
+
+def tick2second(tick: float, ticks_per_beat: int, tempo: int) -> float:
+    """mido.tick2second (same arithmetic), so tempo maps need no mido."""
+    scale = tempo * 1e-6 / ticks_per_beat
+    return tick * scale
+
+
+class TempoMap:
+    """
+    Piecewise-constant tempo map for one MIDI file, built once and reused.
+
+    segments are parallel lists sorted by tick:
+      ticks[i]   : absolute tick where segment i starts
+      tempos[i]  : tempo (us per beat) in effect from ticks[i]
+      seconds[i] : absolute seconds at ticks[i]
+    Lookups bisect into ticks, so a conversion is O(log n_tempo_changes).
+    """
+
+    DEFAULT_TEMPO = 500000  # 120 bpm
+
+    def __init__(self, ticks_per_beat: int, tempo_changes: List[Tuple[int, int]]):
+        self.ticks_per_beat = ticks_per_beat
+
+        changes = [(0, self.DEFAULT_TEMPO)] + list(tempo_changes)
+        changes.sort(key=lambda x: x[0])
+
+        # Remove duplicates at same tick by keeping the last one
+        dedup: List[Tuple[int, int]] = []
+        for t, tempo in changes:
+            if dedup and dedup[-1][0] == t:
+                dedup[-1] = (t, tempo)
+            else:
+                dedup.append((t, tempo))
+
+        # Precompute cumulative seconds at each tempo change
+        self.ticks: List[int] = []
+        self.tempos: List[int] = []
+        self.seconds: List[float] = []
+        sec_acc = 0.0
+        prev_tick, prev_tempo = dedup[0]
+        for tick, tempo in dedup:
+            sec_acc += tick2second(tick - prev_tick, ticks_per_beat, prev_tempo)
+            self.ticks.append(tick)
+            self.tempos.append(tempo)
+            self.seconds.append(sec_acc)
+            prev_tick, prev_tempo = tick, tempo
+
+        # First explicit set_tempo in file order (what "initial tempo" meant before).
+        self.first_tempo = tempo_changes[0][1] if tempo_changes else self.DEFAULT_TEMPO
+
+    @classmethod
+    def from_midi(cls, mid: mido.MidiFile) -> "TempoMap":
+        """Collect set_tempo meta events from all tracks (absolute ticks)."""
+        tempo_changes: List[Tuple[int, int]] = []
+        for track in mid.tracks:
+            abs_t = 0
+            for msg in track:
+                abs_t += msg.time
+                if msg.type == "set_tempo":
+                    tempo_changes.append((abs_t, msg.tempo))
+        return cls(mid.ticks_per_beat, tempo_changes)
+
+    @classmethod
+    def from_raw(cls, raw: RawMidi) -> "TempoMap":
+        """Same as from_midi for a file read with smfreader.read_smf."""
+        return cls(raw.ticks_per_beat, raw.tempo_changes)
+
+    def __len__(self) -> int:
+        return len(self.ticks)
+
+    def segment_index(self, abs_tick: int) -> int:
+        """Index of the last segment starting at or before abs_tick."""
+        return max(bisect.bisect_right(self.ticks, abs_tick) - 1, 0)
+
+    def tempo_at(self, abs_tick: int) -> int:
+        return self.tempos[self.segment_index(abs_tick)]
+
+    def ticks_to_seconds(self, abs_tick: int) -> float:
+        i = self.segment_index(abs_tick)
+        return self.seconds[i] + tick2second(
+            abs_tick - self.ticks[i], self.ticks_per_beat, self.tempos[i]
+        )
+
+    def seconds_to_ticks(self, sec: float) -> float:
+        """Inverse of ticks_to_seconds (fractional ticks)."""
+        i = max(bisect.bisect_right(self.seconds, sec) - 1, 0)
+        return self.ticks[i] + (sec - self.seconds[i]) * self.ticks_per_beat / (self.tempos[i] * 1e-6)
+
+    def ticks_to_seconds_array(self, abs_ticks):
+        """
+        Bulk conversion of a sequence of absolute ticks (returns a numpy float64 array).
+        Same arithmetic as ticks_to_seconds, so results are bit-identical.
+        """
+        if np is None:
+            raise RuntimeError("ticks_to_seconds_array requires numpy (pip install numpy)")
+        ticks = np.asarray(abs_ticks, dtype=np.int64)
+        seg_ticks = np.asarray(self.ticks, dtype=np.int64)
+        idx = np.maximum(np.searchsorted(seg_ticks, ticks, side="right") - 1, 0)
+        # mido.tick2second: tick * (tempo * 1e-6 / ticks_per_beat)
+        scale = np.asarray(self.tempos, dtype=np.float64) * 1e-6 / self.ticks_per_beat
+        sec0 = np.asarray(self.seconds, dtype=np.float64)
+        return sec0[idx] + (ticks - seg_ticks[idx]) * scale[idx]
+
+
+# (start_step, step_seconds): steps from start_step on last step_seconds each
+StepSegment = Tuple[int, float]
+
+
+class TempoGrid:
+    """
+    Musical grid that follows the tempo map: bin i starts at tick
+    i * ticks_per_beat // subdivisions, so every bin sits on a real beat
+    subdivision and its length in seconds changes with each set_tempo.
+    """
+
+    def __init__(self, tempo_map: TempoMap, subdivisions: int):
+        self.tempo_map = tempo_map
+        self.subdivisions = subdivisions
+
+    def edge_tick(self, i: int) -> int:
+        return i * self.tempo_map.ticks_per_beat // self.subdivisions
+
+    def bin_start(self, i: int) -> float:
+        return self.tempo_map.ticks_to_seconds(self.edge_tick(i))
+
+    def bin_starts_array(self, n: int):
+        """Start times of bins 0..n-1 as a numpy array."""
+        ticks = np.arange(n, dtype=np.int64) * self.tempo_map.ticks_per_beat // self.subdivisions
+        return self.tempo_map.ticks_to_seconds_array(ticks)
+
+    def bin_count(self, t_end: float) -> int:
+        """Smallest n such that bins 0..n-1 cover [0, t_end)."""
+        ticks = self.tempo_map.seconds_to_ticks(t_end)
+        n = int(math.ceil(ticks * self.subdivisions / self.tempo_map.ticks_per_beat))
+        while self.bin_start(n) < t_end:
+            n += 1
+        while n > 0 and self.bin_start(n - 1) >= t_end:
+            n -= 1
+        return n
+
+    def step_segments(self, n: int) -> List[StepSegment]:
+        """
+        Run-length step durations for the first n bins. A bin inside one tempo
+        segment gets its exact duration; a bin straddling a tempo change gets
+        the measured one (rounded to 1 us).
+        """
+        tm = self.tempo_map
+        segments: List[StepSegment] = []
+        for i in range(n):
+            a, b = self.edge_tick(i), self.edge_tick(i + 1)
+            k = tm.segment_index(a)
+            if k + 1 >= len(tm.ticks) or tm.ticks[k + 1] >= b:
+                step = tick2second(b - a, tm.ticks_per_beat, tm.tempos[k])
+            else:
+                step = round(tm.ticks_to_seconds(b) - tm.ticks_to_seconds(a), 6)
+            if not segments or segments[-1][1] != step:
+                segments.append((i, step))
+        return segments
+
+
+def step_time(segments: List[StepSegment], i: int) -> float:
+    """Start time in seconds of step i under per-segment step durations."""
+    t = 0.0
+    for k, (start, step) in enumerate(segments):
+        end = segments[k + 1][0] if k + 1 < len(segments) else None
+        if end is None or i < end:
+            return t + (i - start) * step
+        t += (end - start) * step
+    return t
+
+
+def extract_note_events(mid: mido.MidiFile, tempo_map: Optional[TempoMap] = None) -> List[NoteEvent]:
+    """
+    Parse MIDI into note events with start/end in seconds.
+    Uses mido's tick->second conversion with tempo changes.
+    Pass a prebuilt tempo_map to avoid rebuilding it.
+    List view of extract_note_table.
+    """
+    return extract_note_table(mid, tempo_map=tempo_map).to_events()
+
+
+def extract_note_table(mid: mido.MidiFile, tempo_map: Optional[TempoMap] = None) -> NoteEventTable:
+    """extract_note_events into a NoteEventTable, sorted the same way."""
+    # Approach:
+    # 1) Convert all messages to absolute ticks in *their track*.
+    # 2) Build (or reuse) the global tempo map for ticks->seconds.
+    # 3) Re-walk each track, translate abs ticks to seconds, and match note_on/note_off.
+
+    # Step 1: absolute ticks per track
+    track_abs_msgs: List[List[Tuple[int, mido.Message]]] = []
+    for ti, track in enumerate(mid.tracks):
+        abs_t = 0
+        out = []
+        for msg in track:
+            abs_t += msg.time
+            out.append((abs_t, msg))
+        track_abs_msgs.append(out)
+
+    # Step 2: tempo map from set_tempo meta events across all tracks
+    if tempo_map is None:
+        tempo_changes = [
+            (abs_t, msg.tempo) for tr in track_abs_msgs for abs_t, msg in tr if msg.type == "set_tempo"
+        ]
+        tempo_map = TempoMap(mid.ticks_per_beat, tempo_changes)
+    ticks_to_seconds = tempo_map.ticks_to_seconds
+
+    # Step 3: collect note events by matching note_on/note_off
+    events = NoteEventTable()
+    add_event = events.append
+    # active[(track, channel, note)] = (start_tick, start_sec, velocity)
+    active: Dict[Tuple[int, int, int], Tuple[int, float, int]] = {}
+
+    for ti, tr in enumerate(track_abs_msgs):
+        for abs_t, msg in tr:
+            if msg.type == "note_on" and msg.velocity > 0:
+                start_s = ticks_to_seconds(abs_t)
+                active[(ti, msg.channel, msg.note)] = (abs_t, start_s, msg.velocity)
+
+            elif msg.type in ("note_off", "note_on") and (msg.type == "note_off" or msg.velocity == 0):
+                key = (ti, msg.channel, msg.note)
+                if key in active:
+                    start_tick, start_s, vel = active.pop(key)
+                    end_s = ticks_to_seconds(abs_t)
+                    if end_s > start_s:  # ignore zero/negative
+                        add_event(start_s, end_s, msg.note, vel, msg.channel, ti)
+
+    # If notes are left "hanging", close them at end of file
+    # Estimate end time using max tick across all tracks
+    max_tick = 0
+    for tr in track_abs_msgs:
+        if tr:
+            max_tick = max(max_tick, tr[-1][0])
+    end_file_s = ticks_to_seconds(max_tick)
+
+    for (ti, ch, note), (_start_tick, start_s, vel) in list(active.items()):
+        if end_file_s > start_s:
+            add_event(start_s, end_file_s, note, vel, ch, ti)
+
+    # Sort by start time (then end, track, channel, note)
+    return events.sorted()
+
+
+def extract_note_events_raw(raw: RawMidi, tempo_map: Optional[TempoMap] = None) -> List[NoteEvent]:
+    """
+    extract_note_events for a file read with smfreader.read_smf: same events,
+    without building a mido Message per MIDI event.
+    """
+    return extract_note_table_raw(raw, tempo_map=tempo_map).to_events()
+
+
+def extract_note_table_raw(raw: RawMidi, tempo_map: Optional[TempoMap] = None) -> NoteEventTable:
+    """extract_note_table for a file read with smfreader.read_smf."""
+    if tempo_map is None:
+        tempo_map = TempoMap.from_raw(raw)
+    # All note times in one go (bit-identical to per-tick ticks_to_seconds)
+    if np is not None and len(raw):
+        seconds = tempo_map.ticks_to_seconds_array(raw.ticks).tolist()
+    else:
+        seconds = [tempo_map.ticks_to_seconds(t) for t in raw.ticks]
+
+    events = NoteEventTable()
+    add_event = events.append
+    # active[(track, channel, note)] = (start_sec, velocity)
+    active: Dict[Tuple[int, int, int], Tuple[float, int]] = {}
+
+    for sec, ti, ch, note, vel in zip(seconds, raw.tracks, raw.channels, raw.notes, raw.velocities):
+        if vel > 0:
+            active[(ti, ch, note)] = (sec, vel)
+        else:
+            started = active.pop((ti, ch, note), None)
+            if started is not None:
+                start_s, start_vel = started
+                if sec > start_s:  # ignore zero/negative
+                    add_event(start_s, sec, note, start_vel, ch, ti)
+
+    # Close hanging notes at the end of the file, as extract_note_events does
+    end_file_s = tempo_map.ticks_to_seconds(raw.max_tick)
+    for (ti, ch, note), (start_s, vel) in active.items():
+        if end_file_s > start_s:
+            add_event(start_s, end_file_s, note, vel, ch, ti)
+
+    return events.sorted()
+
+
+def choose_note(candidates: List[NoteEvent], policy: str) -> Optional[int]:
+    """
+    Pick one note for a time slice when multiple overlap.
+    """
+    if not candidates:
+        return None
+
+    if policy == "first":
+        return candidates[0].note
+    if policy == "highest":
+        return max(candidates, key=lambda e: e.note).note
+    if policy == "lowest":
+        return min(candidates, key=lambda e: e.note).note
+    if policy == "loudest":
+        return max(candidates, key=lambda e: (e.velocity, e.note)).note
+
+    raise ValueError(f"Unknown policy: {policy}")
+
+
+def choose_note_rows(table: NoteEventTable, rows: Sequence[int], policy: str) -> Optional[int]:
+    """choose_note over table rows (candidates in sweep order), without building NoteEvents."""
+    if not rows:
+        return None
+
+    notes = table.note
+    if policy == "first":
+        return notes[rows[0]]
+    if policy == "highest":
+        return max(notes[k] for k in rows)
+    if policy == "lowest":
+        return min(notes[k] for k in rows)
+    if policy == "loudest":
+        velocities = table.velocity
+        return max((velocities[k], notes[k]) for k in rows)[1]
+
+    raise ValueError(f"Unknown policy: {policy}")
+
+
+def grid_step_seconds_from_musical(
+    mid: Optional[mido.MidiFile], grid: str, tempo_map: Optional[TempoMap] = None
+) -> float:
+    """
+    Convert a musical grid like '16th' or '8th' to seconds using the *initial* tempo.
+    If the piece has tempo changes, this is still a fixed-time grid.
+    mid is only read when no tempo_map is given.
+    """
+    if tempo_map is None:
+        tempo_map = TempoMap.from_midi(mid)
+    # initial tempo (default 120 bpm)
+    tempo = tempo_map.first_tempo
+
+    # seconds per beat = tempo(us/beat) * 1e-6
+    sec_per_beat = tempo * 1e-6
+
+    return sec_per_beat / grid_subdivisions(grid)
+
+
+def grid_subdivisions(grid: str) -> int:
+    """Bins per beat for a musical grid like '16th' (-> 4)."""
+    grid = grid.lower().strip()
+    if grid in ("quarter", "1/4"):
+        return 1
+    if grid in ("8th", "eighth", "1/8"):
+        return 2
+    if grid in ("16th", "sixteenth", "1/16"):
+        return 4
+    if grid in ("32nd", "1/32"):
+        return 8
+
+    raise ValueError(f"Unsupported musical grid: {grid}")
+
+
+def events_to_array(
+    events: NoteEvents,
+    step_s: float,
+    policy: str = "highest",
+    silence_token: str = "SIL",
+    engine: str = "python",
+    tempo_grid: Optional[TempoGrid] = None,
+) -> List[str]:
+    """
+    Convert note events into a time-quantized array.
+    Each bin covers [i*step_s, (i+1)*step_s), or with a tempo_grid
+    [tempo_grid.bin_start(i), tempo_grid.bin_start(i+1)) (step_s is then ignored).
+
+    engine:
+      - "python": per-bin sweep (no extra dependencies)
+      - "numpy": vectorized piano roll, same output, much faster on fine grids
+    """
+    if engine == "numpy":
+        return events_to_array_numpy(
+            events, step_s, policy=policy, silence_token=silence_token, tempo_grid=tempo_grid
+        )
+    if engine != "python":
+        raise ValueError(f"Unknown engine: {engine}")
+
+    bins = iter_events_to_array(events, step_s, policy, silence_token, tempo_grid=tempo_grid)
+    return [token for _i, token in bins]
+
+
+# (start_bin, length, token): a run of identical consecutive tokens
+Run = Tuple[int, int, str]
+
+
+def iter_events_to_array(
+    events: NoteEvents,
+    step_s: float,
+    policy: str = "highest",
+    silence_token: str = "SIL",
+    run_length: bool = False,
+    tempo_grid: Optional[TempoGrid] = None,
+) -> Iterator:
+    """
+    Streaming events_to_array: yields (bin_index, token) for every bin, or
+    (start_bin, length, token) runs with run_length=True.
+    Memory is O(notes) for the NoteIndex (two float arrays), independent of
+    the number of bins.
+    """
+    bins = _iter_bins(events, step_s, policy, silence_token, tempo_grid)
+    return iter_runs(bins) if run_length else bins
+
+
+def _iter_bins(
+    events: NoteEvents,
+    step_s: float,
+    policy: str,
+    silence_token: str,
+    tempo_grid: Optional[TempoGrid] = None,
+) -> Iterator[Tuple[int, str]]:
+    names = list(PITCH_NAMES)
+    token = silence_token
+    last = None
+    for i, notes in _iter_bin_notes(as_note_table(events), step_s, (policy,), tempo_grid):
+        if notes is not last:
+            last = notes
+            token = silence_token if notes[0] is None else names[notes[0]]
+        yield i, token
+
+
+def _iter_bin_notes(
+    table: NoteEventTable,
+    step_s: float,
+    policies: Sequence[str],
+    tempo_grid: Optional[TempoGrid] = None,
+    index: Optional[NoteIndex] = None,
+) -> Iterator[Tuple[int, Tuple[Optional[int], ...]]]:
+    """
+    One sweep over the bins, choosing a note for every policy at once.
+    Yields (bin_index, notes) with notes[k] the choice of policies[k] (None:
+    silence); the same tuple object is yielded until the active set changes.
+    index (a NoteIndex over the table) can be passed in to share it between grids.
+    """
+    if not table:
+        return
+
+    t_end = max(table.end_s)
+    if tempo_grid is None:
+        n = int(math.ceil(t_end / step_s))
+    else:
+        n = tempo_grid.bin_count(t_end)
+
+    def edges() -> Iterator[Tuple[float, float]]:
+        if tempo_grid is None:
+            for i in range(n):
+                t0 = i * step_s
+                yield t0, t0 + step_s
+        else:
+            t1 = tempo_grid.bin_start(0)
+            for i in range(n):
+                t0, t1 = t1, tempo_grid.bin_start(i + 1)
+                yield t0, t1
+
+    # Sweep the overlap index; the chosen notes only change when the active set does.
+    if index is None:
+        index = NoteIndex(table.start_s, table.end_s)
+    notes: Tuple[Optional[int], ...] = (None,) * len(policies)
+    for i, (active, changed) in enumerate(index.iter_bins(edges())):
+        if changed:
+            notes = tuple(choose_note_rows(table, active, policy=policy) for policy in policies)
+        yield i, notes
+
+
+def iter_runs(bins: Iterable[Tuple[int, str]]) -> Iterator[Run]:
+    """Collapse (bin_index, token) pairs into (start_bin, length, token) runs."""
+    run_start, run_token, count = 0, None, 0
+    for i, token in bins:
+        if token != run_token:
+            if run_token is not None:
+                yield run_start, i - run_start, run_token
+            run_start, run_token = i, token
+        count = i + 1
+    if run_token is not None:
+        yield run_start, count - run_start, run_token
+
+
+def events_to_array_numpy(
+    events: NoteEvents,
+    step_s: float,
+    policy: str = "highest",
+    silence_token: str = "SIL",
+    tempo_grid: Optional[TempoGrid] = None,
+) -> List[str]:
+    """
+    Vectorized equivalent of events_to_array (byte-identical output).
+
+    Builds a (bins x 128) piano roll from the event start/end times and
+    applies the policy as a reduction over the pitch axis:
+      - highest/lowest/loudest: roll holds the max velocity per (bin, pitch)
+      - first: roll holds the lowest sort rank per (bin, pitch)
+    """
+    (pitch,) = _numpy_bin_notes(as_note_table(events), step_s, (policy,), tempo_grid)
+    names = list(PITCH_NAMES) + [silence_token]
+    return [names[i] for i in pitch.tolist()]
+
+
+def _numpy_bin_notes(
+    table: NoteEventTable,
+    step_s: float,
+    policies: Sequence[str],
+    tempo_grid: Optional[TempoGrid] = None,
+) -> List:
+    """
+    events_to_array_numpy for several policies over one grid: each roll is
+    painted once and reduced per policy. Returns one int array per policy
+    with the chosen pitch per bin, 128 for silence.
+    """
+    if np is None:
+        raise RuntimeError("engine='numpy' requires numpy (pip install numpy)")
+    for policy in policies:
+        if policy not in ("highest", "lowest", "loudest", "first"):
+            raise ValueError(f"Unknown policy: {policy}")
+    if not table:
+        return [np.zeros(0, dtype=np.int64) for _policy in policies]
+
+    # Same stable order as the sweep, so "first" picks the same candidate.
+    # The table columns are read in place (np.frombuffer), then gathered.
+    order = np.argsort(np.frombuffer(table.start_s, dtype=np.float64), kind="stable")
+    count = len(table)
+    starts = np.frombuffer(table.start_s, dtype=np.float64)[order]
+    ends = np.frombuffer(table.end_s, dtype=np.float64)[order]
+    notes = np.frombuffer(table.note, dtype=np.uint8)[order].astype(np.int64)
+    velocities = np.frombuffer(table.velocity, dtype=np.uint8)[order].astype(np.int64)
+
+    t_end = float(ends.max())
+    if tempo_grid is None:
+        n = int(math.ceil(t_end / step_s))
+        # Bin edges computed exactly like the sweep (t0 = i*step_s, t1 = t0+step_s),
+        # so the float comparisons below agree bit for bit.
+        t0 = np.arange(n, dtype=np.float64) * step_s
+        t1 = t0 + step_s
+    else:
+        n = tempo_grid.bin_count(t_end)
+        edges = tempo_grid.bin_starts_array(n + 1)
+        t0, t1 = edges[:-1], edges[1:]
+    # An event overlaps bin i iff start_s < t1[i] and end_s > t0[i].
+    lo = np.searchsorted(t1, starts, side="right")
+    hi = np.searchsorted(t0, ends, side="left")
+    spans = np.nonzero(hi > lo)[0]
+
+    rank_roll = None
+    present = None
+    out = []
+    for policy in policies:
+        if policy == "first":
+            if rank_roll is None:
+                # Paint in reverse rank order so the earliest-ranked event wins.
+                rank_dtype = np.min_scalar_type(count + 1)
+                roll = np.zeros((n, 128), dtype=rank_dtype)
+                for k in spans[::-1].tolist():
+                    roll[lo[k]:hi[k], notes[k]] = k + 1
+                rank_roll = np.where(roll > 0, roll, count + 1)
+            pitch = rank_roll.argmin(axis=1)
+            active = rank_roll[np.arange(n), pitch] <= count
+        else:
+            if present is None:
+                # Paint in ascending velocity order so each cell ends up with its max velocity.
+                vel_roll = np.zeros((n, 128), dtype=np.uint8)
+                by_velocity = spans[np.argsort(velocities[spans], kind="stable")]
+                for k in by_velocity.tolist():
+                    vel_roll[lo[k]:hi[k], notes[k]] = velocities[k]
+                present = vel_roll > 0
+                any_present = present.any(axis=1)
+            active = any_present
+            if policy == "highest":
+                pitch = 127 - present[:, ::-1].argmax(axis=1)
+            elif policy == "lowest":
+                pitch = present.argmax(axis=1)
+            else:  # loudest: max (velocity, note)
+                key = np.where(present, vel_roll.astype(np.int32) * 128 + np.arange(128), -1)
+                pitch = key.argmax(axis=1)
+        out.append(np.where(active, pitch, 128))
+    return out
+
+
+def load_events(
+    midi_path: str,
+    *,
+    grid: Optional[str] = None,
+    grid_ms: Optional[float] = None,
+    follow_tempo: bool = False,
+    parser: str = "mido",
+) -> Tuple[NoteEventTable, float, Optional[TempoGrid]]:
+    """
+    Parse one file and resolve its grid. Exactly one of grid / grid_ms must be set;
+    follow_tempo (musical grids only) returns a TempoGrid instead of a fixed step.
+    parser: "mido", or "raw" for the built-in smfreader fast path (same events).
+    Returns: (events as a NoteEventTable, step_seconds, tempo_grid or None)
+    """
+    if (grid is None) == (grid_ms is None):
+        raise ValueError("Choose exactly one: grid (musical) OR grid_ms (fixed time).")
+    if follow_tempo and grid is None:
+        raise ValueError("follow_tempo needs a musical grid, not grid_ms.")
+
+    events, tempo_map = parse_events(midi_path, parser=parser)
+    step_s, tempo_grid = resolve_grid(tempo_map, grid=grid, grid_ms=grid_ms, follow_tempo=follow_tempo)
+    return events, step_s, tempo_grid
+
+
+def parse_events(midi_path: str, parser: str = "mido") -> Tuple[NoteEventTable, TempoMap]:
+    """Parse one file with a parse backend (see backends.py): (events as a NoteEventTable, its TempoMap)."""
+    return get_parser(parser)(midi_path)
+
+
+def parse_events_mido(midi_path: str) -> Tuple[NoteEventTable, TempoMap]:
+    """The "mido" parse backend."""
+    mid = mido.MidiFile(midi_path)
+    tempo_map = TempoMap.from_midi(mid)
+    return extract_note_table(mid, tempo_map=tempo_map), tempo_map
+
+
+def parse_events_raw(midi_path: str) -> Tuple[NoteEventTable, TempoMap]:
+    """The "raw" parse backend: smfreader, without loading mido."""
+    raw = read_smf(midi_path)
+    tempo_map = TempoMap.from_raw(raw)
+    return extract_note_table_raw(raw, tempo_map=tempo_map), tempo_map
+
+
+def resolve_grid(
+    tempo_map: TempoMap,
+    *,
+    grid: Optional[str] = None,
+    grid_ms: Optional[float] = None,
+    follow_tempo: bool = False,
+) -> Tuple[float, Optional[TempoGrid]]:
+    """(step_seconds, tempo_grid or None) of a grid on a parsed file (see load_events)."""
+    tempo_grid = None
+    if grid_ms is not None:
+        step_s = grid_ms / 1000.0
+    else:
+        step_s = grid_step_seconds_from_musical(None, grid, tempo_map=tempo_map)
+        if follow_tempo:
+            tempo_grid = TempoGrid(tempo_map, grid_subdivisions(grid))
+            step_s = tempo_grid.bin_start(1) - tempo_grid.bin_start(0)
+    return step_s, tempo_grid
+
+
+def _step_segments(n: int, step_s: float, tempo_grid: Optional[TempoGrid]) -> List[StepSegment]:
+    if tempo_grid is None:
+        return [(0, step_s)]
+    return tempo_grid.step_segments(n)
+
+
+def convert_midi_file(
+    midi_path: str,
+    *,
+    grid: Optional[str] = None,
+    grid_ms: Optional[float] = None,
+    policy: str = "highest",
+    silence_token: str = "SIL",
+    engine: str = "python",
+    follow_tempo: bool = False,
+    parser: str = "mido",
+) -> Tuple[List[str], float, List[StepSegment]]:
+    """
+    Parse + extract + quantize one file.
+    Returns: (tokens, step_seconds, step_segments); step_segments is
+    [(0, step_seconds)] unless follow_tempo is set.
+    """
+    events, step_s, tempo_grid = load_events(
+        midi_path, grid=grid, grid_ms=grid_ms, follow_tempo=follow_tempo, parser=parser
+    )
+    arr = events_to_array(
+        events,
+        step_s=step_s,
+        policy=policy,
+        silence_token=silence_token,
+        engine=engine,
+        tempo_grid=tempo_grid,
+    )
+    return arr, step_s, _step_segments(len(arr), step_s, tempo_grid)
+
+
+def iter_convert_midi_file(
+    midi_path: str,
+    *,
+    grid: Optional[str] = None,
+    grid_ms: Optional[float] = None,
+    policy: str = "highest",
+    silence_token: str = "SIL",
+    engine: str = "python",
+    follow_tempo: bool = False,
+    parser: str = "mido",
+) -> Tuple[Iterator[Run], float, List[StepSegment]]:
+    """
+    Streaming convert_midi_file: returns (runs, step_seconds, step_segments)
+    where runs lazily yields (start_bin, length, token). The numpy engine
+    builds its roll in one go and is then run-length encoded.
+    """
+    events, step_s, tempo_grid = load_events(
+        midi_path, grid=grid, grid_ms=grid_ms, follow_tempo=follow_tempo, parser=parser
+    )
+    n = 0
+    if events and tempo_grid is not None:
+        n = tempo_grid.bin_count(max(events.end_s))
+    segments = _step_segments(n, step_s, tempo_grid)
+    if engine == "numpy":
+        arr = events_to_array_numpy(
+            events, step_s, policy=policy, silence_token=silence_token, tempo_grid=tempo_grid
+        )
+        return iter_runs(enumerate(arr)), step_s, segments
+    runs = iter_events_to_array(
+        events, step_s, policy, silence_token, run_length=True, tempo_grid=tempo_grid
+    )
+    return runs, step_s, segments
+
+
+POLICIES = ("highest", "lowest", "loudest", "first")
+
+
+@dataclass(frozen=True)
+class Variant:
+    """
+    One output of convert_midi_file_variants: a grid (musical, or fixed grid_ms),
+    a policy and a silence token.
+
+    Usage:
+        Variant.parse("16th")                 # 16th grid, highest, SIL
+        Variant.parse("10ms:loudest:REST")    # GRID[:POLICY[:SILENCE]]
+    """
+
+    grid: Optional[str] = None
+    grid_ms: Optional[float] = None
+    policy: str = "highest"
+    silence_token: str = "SIL"
+
+    @classmethod
+    def parse(cls, spec: str, policy: str = "highest", silence_token: str = "SIL") -> "Variant":
+        """GRID[:POLICY[:SILENCE]]; GRID is a musical grid or <N>ms, missing parts use the defaults."""
+        parts = spec.split(":", 2)
+        grid = parts[0].strip()
+        if len(parts) > 1 and parts[1]:
+            policy = parts[1]
+        if len(parts) > 2:
+            silence_token = parts[2]
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy: {policy}")
+        if grid.lower().endswith("ms"):
+            return cls(grid_ms=float(grid[:-2]), policy=policy, silence_token=silence_token)
+        grid_subdivisions(grid)  # reject unknown grids up front
+        return cls(grid=grid, policy=policy, silence_token=silence_token)
+
+    @property
+    def grid_key(self) -> Tuple[Optional[str], Optional[float]]:
+        return self.grid, self.grid_ms
+
+    @property
+    def name(self) -> str:
+        """Short label for file names: 16th_highest, 10ms_loudest_REST, ..."""
+        grid = self.grid if self.grid is not None else f"{self.grid_ms:g}ms"
+        label = f"{grid}_{self.policy}"
+        if self.silence_token != "SIL":
+            label += f"_{self.silence_token}"
+        return re.sub(r"[^A-Za-z0-9_.-]+", "_", label)
+
+
+def convert_midi_file_variants(
+    midi_path: str,
+    variants: Sequence[Variant],
+    *,
+    engine: str = "python",
+    follow_tempo: bool = False,
+    parser: str = "mido",
+) -> List[Tuple[List[str], float, List[StepSegment]]]:
+    """
+    convert_midi_file for many variants from a single parse: the events are
+    extracted once, then every grid is swept once for all of its policies
+    (the numpy engine paints each roll once per grid). follow_tempo applies
+    to the musical grids only.
+    Returns one (tokens, step_seconds, step_segments) per variant, in order.
+    """
+    if engine not in ("python", "numpy"):
+        raise ValueError(f"Unknown engine: {engine}")
+    events, tempo_map = parse_events(midi_path, parser=parser)
+    index = NoteIndex(events.start_s, events.end_s) if engine == "python" else None
+
+    names = list(PITCH_NAMES)
+    results: List[Optional[Tuple[List[str], float, List[StepSegment]]]] = [None] * len(variants)
+    by_grid: Dict[Tuple[Optional[str], Optional[float]], List[int]] = {}
+    for k, variant in enumerate(variants):
+        by_grid.setdefault(variant.grid_key, []).append(k)
+
+    for (grid, grid_ms), members in by_grid.items():
+        step_s, tempo_grid = resolve_grid(
+            tempo_map, grid=grid, grid_ms=grid_ms, follow_tempo=follow_tempo and grid is not None
+        )
+        policies = sorted({variants[k].policy for k in members})
+        column = {policy: j for j, policy in enumerate(policies)}
+        if engine == "numpy":
+            pitches = [p.tolist() for p in _numpy_bin_notes(events, step_s, policies, tempo_grid)]
+            n = len(pitches[0])
+            for k in members:
+                table = names + [variants[k].silence_token]
+                tokens = [table[p] for p in pitches[column[variants[k].policy]]]
+                results[k] = (tokens, step_s, _step_segments(n, step_s, tempo_grid))
+            continue
+
+        # One sweep for all policies; only the bins where the choices change are kept.
+        changes: List[Tuple[int, Tuple[Optional[int], ...]]] = []
+        n = 0
+        last = None
+        for i, notes in _iter_bin_notes(events, step_s, policies, tempo_grid, index=index):
+            if notes is not last:
+                last = notes
+                changes.append((i, notes))
+            n = i + 1
+        bounds = [i for i, _notes in changes[1:]] + [n]
+        for k in members:
+            j = column[variants[k].policy]
+            silence_token = variants[k].silence_token
+            tokens: List[str] = []
+            for (start, notes), end in zip(changes, bounds):
+                note = notes[j]
+                tokens.extend([silence_token if note is None else names[note]] * (end - start))
+            results[k] = (tokens, step_s, _step_segments(n, step_s, tempo_grid))
+    return [res for res in results if res is not None]
+
+
+# --auto-grid candidates, coarsest first: the musical grids, then fixed ms
+# grids (musical only with follow_tempo). Labels are --variants grid specs.
+AUTO_GRIDS = ("quarter", "8th", "16th", "32nd")
+AUTO_GRID_MS = (100.0, 50.0, 40.0, 25.0, 20.0, 10.0, 5.0, 2.0, 1.0)
+
+
+def auto_grid_scores(
+    events: NoteEventTable,
+    tempo_map: TempoMap,
+    *,
+    follow_tempo: bool = False,
+    grids: Sequence[str] = AUTO_GRIDS,
+    grid_ms: Sequence[float] = AUTO_GRID_MS,
+) -> List[GridScore]:
+    """
+    Score candidate grids on the file's note onsets (see autogrid.py). A note
+    shows from the bin containing its onset, so the error is the time since
+    that bin's start; onsets sharing a bin collide (the policy keeps one).
+    Each score's label is its grid spec ("16th", "10ms"), as Variant.parse takes.
+    """
+    if np is None:
+        raise RuntimeError("auto_grid_scores requires numpy (pip install numpy)")
+    from autogrid import score_grid, sorted_onsets
+
+    starts = np.frombuffer(events.start_s, dtype=np.float64)
+    ends = np.frombuffer(events.end_s, dtype=np.float64)
+    onsets = sorted_onsets(starts[ends > starts])  # zero-length notes never sound
+    t_end = float(ends.max()) if len(ends) else 0.0
+    specs = [(grid, None) for grid in grids]
+    if not follow_tempo:
+        specs += [(None, ms) for ms in grid_ms]
+
+    scores = []
+    for grid, ms in specs:
+        step_s, tempo_grid = resolve_grid(tempo_map, grid=grid, grid_ms=ms, follow_tempo=follow_tempo)
+        # Bin edges exactly as _numpy_bin_notes computes them.
+        if tempo_grid is None:
+            n = int(math.ceil(t_end / step_s))
+            t0 = np.arange(n, dtype=np.float64) * step_s
+            t1 = t0 + step_s
+        else:
+            n = tempo_grid.bin_count(t_end)
+            edges = tempo_grid.bin_starts_array(n + 1)
+            t0, t1 = edges[:-1], edges[1:]
+        bins = np.minimum(np.searchsorted(t1, onsets, side="right"), max(n - 1, 0))
+        label = grid if grid is not None else f"{ms:g}ms"
+        scores.append(score_grid(label, step_s, n, onsets, bins, t0[bins]))
+    return scores
+
+
+def choose_auto_grid(args: argparse.Namespace) -> Tuple[Optional[str], Optional[float]]:
+    """--auto-grid: score the candidates on the file, report them, return the chosen (grid, grid_ms)."""
+    if np is None:
+        raise SystemExit("--auto-grid requires numpy (pip install numpy)")
+    from autogrid import format_scores, pick_grid
+
+    t0 = time.perf_counter()
+    events, tempo_map = parse_events(args.midi_file, parser=args.parser)
+    t_parsed = time.perf_counter()
+    scores = auto_grid_scores(events, tempo_map, follow_tempo=args.follow_tempo)
+    best, met = pick_grid(scores, args.max_error_ms)
+    t_done = time.perf_counter()
+
+    for line in format_scores(scores, best):
+        print("#" + line, file=sys.stderr)
+    if not met:
+        print(
+            f"# auto-grid: no candidate within {args.max_error_ms:g} ms max onset error, "
+            "using the most accurate one",
+            file=sys.stderr,
+        )
+    print(
+        f"# auto-grid: {best.label} step={best.step_s * 1e3:.3f}ms steps={best.steps} "
+        f"onset error mean={best.mean_error_ms:.3f}ms max={best.max_error_ms:.3f}ms "
+        f"collided onsets={best.collisions} "
+        f"({len(scores)} candidates in {(t_done - t_parsed) * 1e3:.1f} ms, parse {(t_parsed - t0) * 1e3:.1f} ms)",
+        file=sys.stderr,
+    )
+    variant = Variant.parse(best.label)
+    return variant.grid, variant.grid_ms
+
+
+def variant_path(save: str, variant: Variant, default_ext: str = ".txt") -> str:
+    """Output file of one variant: --save song.txt -> song_16th_highest.txt."""
+    root, ext = os.path.splitext(save)
+    return f"{root}_{variant.name}{ext or default_ext}"
+
+
+SAVE_FORMATS = ("text", "steps")
+SAVE_EXTENSIONS = {"text": ".txt", "steps": ".steps"}
+# One index byte per step covers every note name plus the silence token.
+STEP_INDEX_BYTES = 1
+
+
+class TokenSink:
+    """
+    --save target for runs of tokens: text (one token per line) or a binary
+    step array (steparray.py) carrying the conversion options as metadata.
+    """
+
+    def __init__(self, path: str, save_format: str, step_s: float, step_segments: List[StepSegment], **meta):
+        if save_format not in SAVE_FORMATS:
+            raise ValueError(f"Unknown save format: {save_format}")
+        self._text = None
+        self._steps = None
+        if save_format == "text":
+            self._text = open(path, "w", encoding="utf-8")
+        else:
+            self._steps = StepArrayWriter(
+                path, step_s=step_s, step_segments=step_segments, index_bytes=STEP_INDEX_BYTES,
+                converter="midi2array", **meta
+            )
+
+    def write_run(self, token: str, length: int) -> None:
+        if self._text is not None:
+            self._text.write((token + "\n") * length)
+        else:
+            self._steps.write_run(token, length)
+
+    def close(self) -> None:
+        if self._text is not None:
+            self._text.close()
+        else:
+            self._steps.close()
+
+
+class OnlineQuantizer:
+    """
+    Incremental events_to_array for live input. Feed it timestamped mido
+    messages in time order; it keeps the sounding notes and returns every
+    bin as (bin_index, token) as soon as the bin has closed, i.e. once a
+    message or advance() reaches its end time. A bin picks its note with
+    choose_note over the notes overlapping it, like the file converters.
+
+    Usage:
+        q = OnlineQuantizer(0.125, policy="highest")
+        for i, token in q.feed(msg, t): ...     # t: seconds since the stream started
+        for i, token in q.advance(now): ...     # between messages: close ended bins
+        for i, token in q.flush(t_end): ...     # release held notes, emit the rest
+
+    Given the same events (see iter_timed_messages) the bins match
+    events_to_array, except where a note is struck again while still held
+    (the file converters drop the first one, here it has already been
+    emitted) and, for "first", between notes that start together and both
+    still sound (ordered by track, channel, note instead of by end time).
+    """
+
+    def __init__(
+        self,
+        step_s: float,
+        policy: str = "highest",
+        silence_token: str = "SIL",
+        tempo_grid: Optional[TempoGrid] = None,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy: {policy}")
+        self.step_s = step_s
+        self.policy = policy
+        self.silence_token = silence_token
+        self.tempo_grid = tempo_grid
+        self.bin_index = 0  # the open bin
+        self.now = 0.0  # latest time seen
+        self._t0, self._t1 = self.bin_edges(0)
+        # Sounding notes (end_s = inf) and notes released inside the open bin
+        self._held: Dict[Tuple[int, int, int], NoteEvent] = {}
+        self._released: List[NoteEvent] = []
+        self._changed = False
+        self._token = silence_token
+        self._max_end = 0.0
+        self._names = list(PITCH_NAMES)
+
+    def bin_edges(self, i: int) -> Tuple[float, float]:
+        """[t0, t1) of bin i, computed as the file converters compute it."""
+        if self.tempo_grid is None:
+            t0 = i * self.step_s
+            return t0, t0 + self.step_s
+        return self.tempo_grid.bin_start(i), self.tempo_grid.bin_start(i + 1)
+
+    def feed(self, msg: mido.Message, t: float, track: int = 0) -> List[Tuple[int, str]]:
+        """
+        Close the bins ending at or before t, then apply msg (only note
+        on/off change anything). track tells apart sources sharing channels.
+        """
+        out = self.advance(t)
+        t = self.now
+        if msg.type == "note_on" and msg.velocity > 0:
+            key = (track, msg.channel, msg.note)
+            self._held[key] = NoteEvent(t, math.inf, msg.note, msg.velocity, msg.channel, track)
+            self._changed = True
+        elif msg.type == "note_off" or msg.type == "note_on":
+            self._release(self._held.pop((track, msg.channel, msg.note), None), t)
+        return out
+
+    def advance(self, t: float) -> List[Tuple[int, str]]:
+        """Close every bin ending at or before t (time never goes backwards)."""
+        if t > self.now:
+            self.now = t
+        out: List[Tuple[int, str]] = []
+        while self._t1 <= self.now:
+            if self._changed:
+                candidates = list(self._held.values()) + self._released
+                if self.policy == "first":
+                    candidates.sort(key=lambda e: (e.start_s, e.end_s, e.track, e.channel, e.note))
+                note = choose_note(candidates, self.policy)
+                self._token = self.silence_token if note is None else self._names[note]
+                # Notes released in this bin are gone from the next one
+                self._changed = bool(self._released)
+                self._released.clear()
+            out.append((self.bin_index, self._token))
+            self.bin_index += 1
+            self._t0, self._t1 = self.bin_edges(self.bin_index)
+        return out
+
+    def flush(self, t_end: float) -> List[Tuple[int, str]]:
+        """
+        End of input at t_end: held notes end there (as hanging notes do at
+        the end of a file) and the bins up to the last note end are emitted.
+        """
+        out = self.advance(t_end)
+        for event in list(self._held.values()):
+            self._release(event, self.now)
+        self._held.clear()
+        if self.tempo_grid is None:
+            n = int(math.ceil(self._max_end / self.step_s))
+        else:
+            n = self.tempo_grid.bin_count(self._max_end)
+        while self.bin_index < n:
+            out.extend(self.advance(self._t1))
+        return out
+
+    def _release(self, event: Optional[NoteEvent], t: float) -> None:
+        if event is None:
+            return
+        self._changed = True
+        if t <= event.start_s:  # zero-length notes are dropped, as in the files
+            return
+        self._max_end = max(self._max_end, t)
+        if t > self._t0:
+            self._released.append(NoteEvent(event.start_s, t, event.note, event.velocity, event.channel, event.track))
+
+
+def iter_timed_messages(
+    mid: mido.MidiFile, tempo_map: Optional[TempoMap] = None
+) -> Iterator[Tuple[float, int, mido.Message]]:
+    """
+    Every message of mid as (seconds, track, message) in playback order (by
+    tick, tracks in file order on ties), timed with the same tempo map as
+    extract_note_events: a port's input with a perfect clock.
+    """
+    if tempo_map is None:
+        tempo_map = TempoMap.from_midi(mid)
+    timed: List[Tuple[int, int, mido.Message]] = []
+    for ti, track in enumerate(mid.tracks):
+        abs_t = 0
+        for msg in track:
+            abs_t += msg.time
+            timed.append((abs_t, ti, msg))
+    timed.sort(key=lambda x: (x[0], x[1]))  # stable: keeps each track's order
+    for abs_t, ti, msg in timed:
+        yield tempo_map.ticks_to_seconds(abs_t), ti, msg
+
+
+def quantize_live(
+    port: mido.ports.BaseInput,
+    quantizer: OnlineQuantizer,
+    *,
+    clock: Callable[[], float] = time.perf_counter,
+    poll_s: float = 0.001,
+) -> Iterator[Tuple[int, str]]:
+    """
+    Quantize a mido input port in real time, yielding each bin as it closes.
+    Messages are timestamped (clock(), relative to the start) when polled,
+    and the quantizer is advanced every poll_s, so a bin is emitted within
+    poll_s of its end. Returns when the port closes; call quantizer.flush
+    afterwards for the last bins.
+    """
+    t_start = clock()
+    while True:
+        closed = port.closed
+        for msg in port.iter_pending():
+            yield from quantizer.feed(msg, clock() - t_start)
+        yield from quantizer.advance(clock() - t_start)
+        if closed:
+            return
+        time.sleep(poll_s)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("midi_file", nargs="?", help="Path to .mid file")
+    ap.add_argument("--grid", default=None, help="Musical grid: 16th, 8th, quarter, etc.")
+    ap.add_argument("--grid-ms", type=float, default=None, help="Fixed time grid in milliseconds (e.g., 10)")
+    ap.add_argument("--policy", default="highest", choices=POLICIES)
+    ap.add_argument("--silence", default="SIL", help="Silence token (default: SIL)")
+    ap.add_argument("--print", action="store_true", help="Print the resulting array, one per line with time index")
+    ap.add_argument("--save", default=None, help="Save output as a text file (one token per line)")
+    ap.add_argument(
+        "--save-format",
+        default="text",
+        choices=SAVE_FORMATS,
+        help="--save as text, or as a binary step array (memory-mappable, see steparray.py)",
+    )
+    ap.add_argument(
+        "--engine",
+        default="python",
+        choices=["python", "numpy"],
+        help="Quantizer implementation (numpy is vectorized, same output)",
+    )
+    ap.add_argument(
+        "--parser",
+        default="mido",
+        choices=parser_names(),
+        help="MIDI reader (raw: built-in memory-mapped SMF reader, same events)",
+    )
+    ap.add_argument(
+        "--follow-tempo",
+        action="store_true",
+        help="With --grid: place bins on beat subdivisions across every tempo change",
+    )
+    add_cache_arguments(ap)
+    ap.add_argument(
+        "--variants",
+        nargs="+",
+        default=None,
+        metavar="GRID[:POLICY[:SILENCE]]",
+        help="Convert to several variants from one parse (e.g. 16th 8th:loudest 10ms:lowest:REST); "
+        "needs --save, each variant goes to its own file",
+    )
+    ap.add_argument(
+        "--live",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="PORT",
+        help="Quantize MIDI input PORT (default port if omitted) in real time instead of a file",
+    )
+    ap.add_argument("--bpm", type=float, default=120.0, help="Tempo of a musical --grid with --live")
+    add_auto_grid_arguments(ap, "Pick the coarsest candidate grid (fewest steps) within --max-error-ms onset error")
+    args = ap.parse_args()
+
+    if args.auto_grid and (args.live is not None or args.variants is not None):
+        raise SystemExit("--auto-grid picks one grid for a file (no --live / --variants).")
+
+    if args.live is not None:
+        main_live(args)
+        return
+    if args.midi_file is None:
+        raise SystemExit("Give a .mid file, or --live PORT.")
+    if args.variants is not None:
+        main_variants(args)
+        return
+
+    if args.auto_grid:
+        if args.grid is not None or args.grid_ms is not None:
+            raise SystemExit("--auto-grid chooses the grid; drop --grid / --grid-ms.")
+        args.grid, args.grid_ms = choose_auto_grid(args)
+    if (args.grid is None) == (args.grid_ms is None):
+        raise SystemExit("Choose exactly one: --grid (musical) OR --grid-ms (fixed time).")
+    if args.follow_tempo and args.grid is None:
+        raise SystemExit("--follow-tempo needs --grid.")
+
+    cache = cache_from_args(args)
+    # engine and parser are not part of the key: both choices produce identical output.
+    options = dict(
+        grid=args.grid,
+        grid_ms=args.grid_ms,
+        policy=args.policy,
+        silence_token=args.silence,
+        follow_tempo=args.follow_tempo,
+    )
+    key = cache.key(args.midi_file, "midi2array", source_version(), options)
+    hit = cache.get_runs(key)
+    if hit is not None:
+        runs, step_s = iter(hit[0]), hit[1]
+        segments = [tuple(seg) for seg in hit[2].get("step_segments", [(0, step_s)])]
+    else:
+        runs, step_s, segments = iter_convert_midi_file(
+            args.midi_file, engine=args.engine, parser=args.parser, **options
+        )
+    print(cache.stats_line(), file=sys.stderr)
+
+    # Consume runs one at a time so memory stays flat regardless of length;
+    # only the (small) run list is kept, for the cache.
+    kept_runs: List[Run] = []
+    steps = 0
+    preview: List[str] = []
+    save_f = None
+    if args.save:
+        save_f = TokenSink(
+            args.save, args.save_format, step_s, segments, source=os.path.basename(args.midi_file), **options
+        )
+    try:
+        for start, length, token in runs:
+            if args.print:
+                for i in range(start, start + length):
+                    t = i * step_s if len(segments) == 1 else step_time(segments, i)
+                    print(f"{t:10.4f}s  {token}")
+            if save_f is not None:
+                save_f.write_run(token, length)
+            if len(preview) < 50:
+                preview.extend([token] * min(length, 50 - len(preview)))
+            steps = start + length
+            if hit is None and cache.enabled:
+                kept_runs.append((start, length, token))
+    finally:
+        if save_f is not None:
+            save_f.close()
+
+    if hit is None:
+        cache.put_runs(key, kept_runs, step_s, meta={"step_segments": segments})
+        cache.evict()
+
+    if not args.print and not args.save:
+        # Default: print a short summary + first 50 tokens
+        print(f"Steps: {steps}  step_s={step_s:.6f}  policy={args.policy}")
+        if len(segments) > 1:
+            print(f"Tempo segments: {len(segments)}  first: {segments[:4]}")
+        print("First 50 tokens:", preview)
+
+
+def main_live(args: argparse.Namespace) -> None:
+    """--live: quantize an input port, one line per bin as it closes, until Ctrl-C."""
+    if args.midi_file is not None or args.variants is not None:
+        raise SystemExit("--live reads a port, not a file (no midi_file / --variants).")
+    if (args.grid is None) == (args.grid_ms is None):
+        raise SystemExit("Choose exactly one: --grid (musical) OR --grid-ms (fixed time).")
+    if args.follow_tempo:
+        raise SystemExit("--follow-tempo needs a file's tempo map; use --bpm with --live.")
+    if args.grid_ms is not None:
+        step_s = args.grid_ms / 1000.0
+    else:
+        step_s = 60.0 / args.bpm / grid_subdivisions(args.grid)
+    quantizer = OnlineQuantizer(step_s, policy=args.policy, silence_token=args.silence)
+
+    try:
+        port = mido.open_input(args.live or None)
+    except ImportError as exc:
+        raise SystemExit(f"--live needs a MIDI backend (pip install python-rtmidi): {exc}")
+    save_f = None
+    if args.save:
+        save_f = TokenSink(
+            args.save, args.save_format, step_s, [(0, step_s)], source=port.name,
+            grid=args.grid, grid_ms=args.grid_ms, policy=args.policy, silence_token=args.silence, bpm=args.bpm,
+        )
+
+    def emit(bins: Iterable[Tuple[int, str]]) -> None:
+        for i, token in bins:
+            print(f"{i * step_s:10.4f}s  {token}", flush=True)
+            if save_f is not None:
+                save_f.write_run(token, 1)
+
+    try:
+        with port:
+            print(f"# live {port.name}: step_s={step_s:.6f} policy={args.policy} (Ctrl-C to stop)", file=sys.stderr)
+            try:
+                emit(quantize_live(port, quantizer))
+            except KeyboardInterrupt:
+                pass
+        emit(quantizer.flush(quantizer.now))
+    finally:
+        if save_f is not None:
+            save_f.close()
+
+
+def main_variants(args: argparse.Namespace) -> None:
+    """--variants: one parse, one output file per variant (cached per variant)."""
+    if args.grid is not None or args.grid_ms is not None:
+        raise SystemExit("--variants replaces --grid/--grid-ms (give the grid in each variant).")
+    if not args.save:
+        raise SystemExit("--variants needs --save (one file per variant is derived from it).")
+    if args.print:
+        raise SystemExit("--print is not supported with --variants.")
+    try:
+        variants = [Variant.parse(spec, policy=args.policy, silence_token=args.silence) for spec in args.variants]
+    except ValueError as exc:
+        raise SystemExit(f"--variants: {exc}")
+    paths = [variant_path(args.save, v, SAVE_EXTENSIONS[args.save_format]) for v in variants]
+    if len(set(paths)) != len(paths):
+        raise SystemExit("--variants: two variants map to the same output file.")
+
+    cache = cache_from_args(args)
+    version = source_version()
+    keys: List[str] = []
+    results: List[Optional[Tuple[List[Run], float, List[StepSegment]]]] = []
+    for v in variants:
+        # Same options (and so the same cache entries) as a single-variant run.
+        options = dict(
+            grid=v.grid,
+            grid_ms=v.grid_ms,
+            policy=v.policy,
+            silence_token=v.silence_token,
+            follow_tempo=args.follow_tempo and v.grid is not None,
+        )
+        keys.append(cache.key(args.midi_file, "midi2array", version, options))
+        hit = cache.get_runs(keys[-1])
+        if hit is None:
+            results.append(None)
+        else:
+            step_s = hit[1]
+            results.append((hit[0], step_s, [tuple(seg) for seg in hit[2].get("step_segments", [(0, step_s)])]))
+
+    todo = [k for k, res in enumerate(results) if res is None]
+    if todo:
+        converted = convert_midi_file_variants(
+            args.midi_file,
+            [variants[k] for k in todo],
+            engine=args.engine,
+            follow_tempo=args.follow_tempo,
+            parser=args.parser,
+        )
+        for k, (tokens, step_s, segments) in zip(todo, converted):
+            runs = list(iter_runs(enumerate(tokens)))
+            results[k] = (runs, step_s, segments)
+            cache.put_runs(keys[k], runs, step_s, meta={"step_segments": segments})
+        cache.evict()
+    print(cache.stats_line(), file=sys.stderr)
+
+    for v, path, (runs, step_s, segments) in zip(variants, paths, results):
+        steps = 0
+        sink = TokenSink(
+            path, args.save_format, step_s, segments, source=os.path.basename(args.midi_file),
+            grid=v.grid, grid_ms=v.grid_ms, policy=v.policy, silence_token=v.silence_token,
+            follow_tempo=args.follow_tempo and v.grid is not None,
+        )
+        try:
+            for start, length, token in runs:
+                sink.write_run(token, length)
+                steps = start + length
+        finally:
+            sink.close()
+        tempo = f"  tempo_segments={len(segments)}" if len(segments) > 1 else ""
+        print(f"{v.name:24s} steps={steps:8d}  step_s={step_s:.6f}{tempo}  -> {path}")
+
@@ -0,0 +1,186 @@
+"""
+noteindex.py
+
+Static overlap index over note intervals [start, end), shared by both
+converters (midi2array.NoteEvent lists, midi2array2 quantized steps).
+
+- notes_at(t) / notes_in(t0, t1): centered interval tree built from the
+  start/end-sorted intervals, O(log n + k) per query.
+- iter_bins(edges): sweep over consecutive bins, reporting the active set
+  and whether it changed since the previous bin, O(n_bins + n) overall.
+
+Intervals are expected to have end >= start. Zero-length ones never sound
+at a point but do overlap a range strictly containing them (as in the
+per-bin sweep), so they are kept in a separate sorted list.
+The tree is built on the first point/range query, so a sweep-only index
+costs two float arrays (plus the sort order if the input is not sorted).
+"""
+
+from __future__ import annotations
+
+import bisect
+import math
+from array import array
+from typing import Generic, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# (center, [(start, i)] ascending, [(end, i)] descending, left, right)
+_Node = Tuple[float, List[Tuple[float, int]], List[Tuple[float, int]], Optional["_Node"], Optional["_Node"]]
+
+
+class NoteIndex(Generic[T]):
+    """
+    Usage:
+        index = NoteIndex([e.start_s for e in events], [e.end_s for e in events], events)
+        index.notes_at(12.5)          # events sounding at t=12.5s
+        index.notes_in(10.0, 10.25)   # events overlapping [10.0, 10.25)
+    Query results keep the input order (ascending index).
+    """
+
+    def __init__(
+        self,
+        starts: Iterable[float],
+        ends: Iterable[float],
+        items: Optional[Sequence[T]] = None,
+    ):
+        self.starts = array("d", starts)
+        self.ends = array("d", ends)
+        if len(self.starts) != len(self.ends):
+            raise ValueError("starts and ends must have the same length")
+        self.items = items
+        # Start-sorted order (stable, so ties keep input order)
+        n = len(self.starts)
+        if all(self.starts[k] <= self.starts[k + 1] for k in range(n - 1)):
+            self.order: Sequence[int] = range(n)
+        else:
+            self.order = sorted(range(n), key=self.starts.__getitem__)
+        self._tree: Optional[_Node] = None
+        self._points: List[Tuple[float, int]] = []
+        self._built = False
+
+    @property
+    def _root(self) -> Optional[_Node]:
+        if not self._built:
+            starts, ends = self.starts, self.ends
+            self._tree = self._build([i for i in self.order if ends[i] > starts[i]])
+            self._points = [(starts[i], i) for i in self.order if ends[i] <= starts[i]]
+            self._built = True
+        return self._tree
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def _build(self, by_start: List[int]) -> Optional[_Node]:
+        """by_start: indices of positive-length intervals, sorted by start."""
+        if not by_start:
+            return None
+        center = self.starts[by_start[len(by_start) // 2]]
+        here: List[int] = []
+        left: List[int] = []
+        right: List[int] = []
+        for i in by_start:
+            if self.ends[i] <= center:
+                left.append(i)
+            elif self.starts[i] > center:
+                right.append(i)
+            else:
+                here.append(i)
+        # The median interval itself contains center, so each level shrinks.
+        node_starts = [(self.starts[i], i) for i in here]
+        node_ends = sorted(((self.ends[i], i) for i in here), reverse=True)
+        return (center, node_starts, node_ends, self._build(left), self._build(right))
+
+    def indices_at(self, t: float) -> List[int]:
+        """Indices of intervals with start <= t < end."""
+        out: List[int] = []
+        node = self._root
+        while node is not None:
+            center, node_starts, node_ends, left, right = node
+            if t < center:
+                for start, i in node_starts:
+                    if start > t:
+                        break
+                    out.append(i)
+                node = left
+            else:
+                for end, i in node_ends:
+                    if end <= t:
+                        break
+                    out.append(i)
+                node = right
+        out.sort()
+        return out
+
+    def indices_in(self, t0: float, t1: float) -> List[int]:
+        """Indices of intervals overlapping [t0, t1), i.e. start < t1 and end > t0."""
+        if t1 <= t0:
+            return []
+        stack = [self._root]
+        points = self._points
+        lo = bisect.bisect_right(points, (t0, math.inf))
+        hi = bisect.bisect_left(points, (t1, -1))
+        out: List[int] = [i for _start, i in points[lo:hi]]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            center, node_starts, node_ends, left, right = node
+            if t1 <= center:
+                for start, i in node_starts:
+                    if start >= t1:
+                        break
+                    out.append(i)
+                stack.append(left)
+            elif t0 >= center:
+                for end, i in node_ends:
+                    if end <= t0:
+                        break
+                    out.append(i)
+                stack.append(right)
+            else:
+                out.extend(i for _start, i in node_starts)
+                stack.append(left)
+                stack.append(right)
+        out.sort()
+        return out
+
+    def notes_at(self, t: float) -> List[T]:
+        return self._items(self.indices_at(t))
+
+    def notes_in(self, t0: float, t1: float) -> List[T]:
+        return self._items(self.indices_in(t0, t1))
+
+    def _items(self, indices: List[int]) -> List[T]:
+        if self.items is None:
+            raise ValueError("NoteIndex was built without items; use indices_at/indices_in")
+        return [self.items[i] for i in indices]
+
+    def iter_bins(self, edges: Iterable[Tuple[float, float]]) -> Iterator[Tuple[List[int], bool]]:
+        """
+        Bulk per-bin query. edges yields (t0, t1) for consecutive bins in time order.
+        Yields (active, changed): indices overlapping [t0, t1) in start order, and
+        whether that set may differ from the previous bin's. `active` is reused
+        between bins; copy it if you keep it.
+        """
+        starts, ends, order = self.starts, self.ends, self.order
+        n = len(order)
+        active: List[int] = []
+        min_end = math.inf
+        j = 0
+        for t0, t1 in edges:
+            changed = False
+            # Add intervals that start before t1
+            while j < n and starts[order[j]] < t1:
+                k = order[j]
+                active.append(k)
+                if ends[k] < min_end:
+                    min_end = ends[k]
+                j += 1
+                changed = True
+            # Remove intervals that ended at/before t0 (only when one has)
+            if min_end <= t0:
+                active = [k for k in active if ends[k] > t0]
+                min_end = min((ends[k] for k in active), default=math.inf)
+                changed = True
+            yield active, changed
@@ -0,0 +1,174 @@
+"""
+smfreader.py
+
+Minimal Standard MIDI File reader: memory-maps the .mid file and decodes
+chunk headers, variable-length deltas and running status straight from the
+buffer, keeping only what the converters use (note on/off and set_tempo)
+in compact arrays. No per-message objects are built.
+
+Decoding follows mido's reader (running status is set by every status byte
+except meta events, sysex lengths, unknown chunks are an error), so the
+note events derived from it match the mido path exactly.
+
+Usage:
+    raw = read_smf("song.mid")
+    raw.ticks_per_beat, raw.tempo_changes, len(raw)   # note on/off count
+"""
+
+from __future__ import annotations
+
+import mmap
+import struct
+from array import array
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+# Bytes following a status byte, per status (None: undefined in a file).
+_DATA_LENGTH: List = [None] * 256
+for _status in range(0x80, 0xF0):
+    _DATA_LENGTH[_status] = 1 if 0xC0 <= _status < 0xE0 else 2
+for _status, _length in ((0xF1, 1), (0xF2, 2), (0xF3, 1), (0xF6, 0), (0xF8, 0), (0xFA, 0), (0xFB, 0), (0xFC, 0), (0xFE, 0)):
+    _DATA_LENGTH[_status] = _length
+
+META = 0xFF
+META_SET_TEMPO = 0x51
+
+
+@dataclass
+class RawMidi:
+    """
+    Note on/off events of every track in file order, as parallel arrays.
+    velocities[i] == 0 marks a note-off (note_off, or note_on with velocity 0).
+    """
+
+    ticks_per_beat: int
+    tempo_changes: List[Tuple[int, int]] = field(default_factory=list)  # (abs_tick, us/beat)
+    ticks: array = field(default_factory=lambda: array("q"))
+    tracks: array = field(default_factory=lambda: array("I"))
+    channels: bytearray = field(default_factory=bytearray)
+    notes: bytearray = field(default_factory=bytearray)
+    velocities: bytearray = field(default_factory=bytearray)
+    track_count: int = 0
+    max_tick: int = 0  # latest message of any kind (incl. end_of_track)
+
+    def __len__(self) -> int:
+        return len(self.ticks)
+
+
+def read_smf(path: str) -> RawMidi:
+    """Memory-map and parse one .mid file."""
+    with open(path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file cannot be mapped
+            return parse_smf(b"")
+    try:
+        return parse_smf(mm)
+    finally:
+        mm.close()
+
+
+def parse_smf(buf) -> RawMidi:
+    """Parse an SMF held in any bytes-like buffer (bytes, mmap, ...)."""
+    if len(buf) < 14 or buf[0:4] != b"MThd":
+        raise ValueError("MThd not found. Probably not a MIDI file")
+    header_size = struct.unpack_from(">L", buf, 4)[0]
+    if header_size < 6:
+        raise ValueError("MIDI header too short")
+    _fmt, n_tracks, division = struct.unpack_from(">hhh", buf, 8)
+    raw = RawMidi(ticks_per_beat=division, track_count=n_tracks)
+
+    pos = 8 + header_size
+    for ti in range(n_tracks):
+        if pos + 8 > len(buf):
+            raise ValueError("unexpected end of file")
+        name, size = struct.unpack_from(">4sL", buf, pos)
+        if name != b"MTrk":
+            raise ValueError("no MTrk header at start of track")
+        pos += 8
+        end = pos + size
+        if end > len(buf):
+            raise ValueError("unexpected end of file")
+        abs_t = _parse_track(buf, pos, end, ti, raw)
+        raw.max_tick = max(raw.max_tick, abs_t)
+        pos = end
+    return raw
+
+
+def _parse_track(buf, pos: int, end: int, ti: int, raw: RawMidi) -> int:
+    """Decode one MTrk body into raw; returns the track's last absolute tick."""
+    ticks, tracks = raw.ticks, raw.tracks
+    channels, notes, velocities = raw.channels, raw.notes, raw.velocities
+    tempo_changes = raw.tempo_changes
+    data_length = _DATA_LENGTH
+    abs_t = 0
+    status = -1
+    try:
+        while pos < end:
+            # Delta time (variable-length quantity)
+            b = buf[pos]
+            pos += 1
+            delta = b & 0x7F
+            while b & 0x80:
+                b = buf[pos]
+                pos += 1
+                delta = (delta << 7) | (b & 0x7F)
+            abs_t += delta
+
+            b = buf[pos]
+            if b & 0x80:
+                pos += 1
+                if b != META:  # meta events do not set running status
+                    status = b
+            elif status < 0:
+                raise ValueError("running status without last_status")
+            else:
+                b = status
+                if b == 0xF0 or b == 0xF7:
+                    pos += 1  # mido drops the peeked byte before a sysex length
+
+            kind = b & 0xF0
+            if kind == 0x90 or kind == 0x80:
+                note = buf[pos]
+                velocity = buf[pos + 1]
+                pos += 2
+                if (note | velocity) & 0x80:
+                    raise ValueError("data byte must be in range 0..127")
+                ticks.append(abs_t)
+                tracks.append(ti)
+                channels.append(b & 0x0F)
+                notes.append(note)
+                velocities.append(velocity if kind == 0x90 else 0)
+            elif b == META:
+                meta_type = buf[pos]
+                pos += 1
+                length, pos = _read_vlq(buf, pos)
+                if meta_type == META_SET_TEMPO:
+                    tempo_changes.append((abs_t, (buf[pos] << 16) | (buf[pos + 1] << 8) | buf[pos + 2]))
+                pos += length
+            elif b == 0xF0 or b == 0xF7:
+                length, pos = _read_vlq(buf, pos)
+                pos += length
+            else:
+                n = data_length[b]
+                if n is None:
+                    raise ValueError(f"undefined status byte 0x{b:02x}")
+                for k in range(pos, pos + n):
+                    if buf[k] & 0x80:
+                        raise ValueError("data byte must be in range 0..127")
+                pos += n
+    except IndexError:
+        raise ValueError("unexpected end of file") from None
+    if pos != end:
+        raise ValueError("track data overruns its MTrk chunk")
+    return abs_t
+
+
+def _read_vlq(buf, pos: int) -> Tuple[int, int]:
+    value = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        value = (value << 7) | (b & 0x7F)
+        if b < 0x80:
+            return value, pos
@@ -0,0 +1,413 @@
+"""
+songstream.py
+
+Streams converted songs to the board over serial, so their length is no
+longer limited by flash: PianoStrip/DemoSong.ino plays them (in Song mode)
+from a small ring buffer while the host keeps it topped up.
+
+Protocol, both directions: frames of
+    0xA5, type, length (<= 64), payload, CRC-8 (poly 0x07) over type..payload
+host -> board:
+    START  0x01  stepUs u32, name (<= 16 bytes)   reset the ring, play at stepUs
+    DATA   0x02  offset u16, stream bytes         kept only at the board's receive
+                                                  offset and if they fit the ring
+    END    0x03                                   no more data: play out, then DONE
+    STOP   0x04                                   abort, DONE
+board -> host:
+    STATUS 0x81  received u16, consumed u16, capacity u16, underruns u16,
+                 steps u32, flags u8 (1 = playing, 2 = END seen);
+                 after every frame and every played step
+    DONE   0x82  steps u32, underruns u16, max late us u32
+Offsets are stream byte positions mod 65536. The stream is packed step
+records (midi2array2 --out-format packed) with 0x7F + stepUs u32 wherever
+the tempo changes (--follow-tempo).
+
+Flow control is by credit: the host never has more than `capacity` bytes
+unplayed on the board, so the ring cannot overflow and, once it is full, a
+played step frees only a few bytes; DATA then goes out in small pieces
+(>= 16 bytes while the ring is half full) between steps instead of long
+bursts the board could drop while it writes the strip. A frame lost or corrupted on the line is resent from the board's
+`received` offset when that stops advancing for --timeout seconds.
+The board starts playing once half its ring is full (or at END).
+
+Serial ports are opened with pyserial when it is installed
+(pip install pyserial), else as a raw POSIX tty.
+
+Usage:
+    python songstream.py song.mid --port /dev/ttyACM0
+    python songstream.py a.mid b.mid --port /dev/ttyACM0 --steps-per-beat 2 --speed 1.5
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import select
+import struct
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from notearray.chords import TEMPO_SOURCES, StepSegment, convert_files, pack_symbols
+from notearray.cli import add_cache_arguments, cache_from_args
+
+try:
+    import serial
+except ImportError:  # optional: only needed for real serial ports on non-POSIX hosts
+    serial = None
+
+try:
+    import termios
+    import tty
+except ImportError:
+    termios = None
+    tty = None
+
+SYNC = 0xA5
+MAX_PAYLOAD = 64
+START = 0x01
+DATA = 0x02
+END = 0x03
+STOP = 0x04
+STATUS = 0x81
+DONE = 0x82
+
+DATA_CHUNK = MAX_PAYLOAD - 2
+MIN_TOP_UP = 16  # smallest DATA sent while the ring is at least half full
+NAME_BYTES = 16
+TEMPO_RECORD = 0x7F  # the packed head of a 127-note chord, so chords stay <= 126
+STATUS_PLAYING = 0x01
+STATUS_ENDED = 0x02
+DEFAULT_BAUD = 115200
+
+
+def _crc8_table() -> List[int]:
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return table
+
+
+_CRC8_TABLE = _crc8_table()
+
+
+def crc8(data: bytes, crc: int = 0) -> int:
+    """CRC-8, polynomial 0x07, no reflection (streamCrc8 in DemoSong.ino)."""
+    for b in data:
+        crc = _CRC8_TABLE[crc ^ b]
+    return crc
+
+
+def encode_frame(frame_type: int, payload: bytes = b"") -> bytes:
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"frame payload of {len(payload)} bytes exceeds {MAX_PAYLOAD}")
+    body = bytes([frame_type, len(payload)]) + payload
+    return bytes([SYNC]) + body + bytes([crc8(body)])
+
+
+class FrameReader:
+    """
+    Incremental frame parser. feed() takes whatever bytes arrived and returns
+    the complete (type, payload) frames among them; on a bad length or CRC it
+    resyncs at the next 0xA5 (errors counts those).
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self.errors = 0
+
+    def feed(self, data: bytes) -> List[Tuple[int, bytes]]:
+        buf = self._buf
+        buf += data
+        frames: List[Tuple[int, bytes]] = []
+        while True:
+            start = buf.find(SYNC)
+            if start < 0:
+                buf.clear()
+                break
+            del buf[:start]
+            if len(buf) < 3:
+                break
+            length = buf[2]
+            if length > MAX_PAYLOAD:
+                self.errors += 1
+                del buf[:1]
+                continue
+            if len(buf) < length + 4:
+                break
+            body = bytes(buf[1 : length + 3])
+            if crc8(body) != buf[length + 3]:
+                self.errors += 1
+                del buf[:1]
+                continue
+            frames.append((body[0], body[2:]))
+            del buf[: length + 4]
+        return frames
+
+
+def step_us(step_s: float, speed: float = 1.0) -> int:
+    return max(1, round(step_s * 1e6 / speed))
+
+
+def encode_stream(
+    symbols: List[str],
+    segments: List[StepSegment],
+    *,
+    symbol_silence: str = " ",
+    chord_join: str = "+",
+    speed: float = 1.0,
+) -> Tuple[int, bytes]:
+    """
+    Song -> (stepUs of its first step, stream bytes): packed records per tempo
+    segment, each later segment preceded by a 0x7F tempo record.
+    """
+    for s in symbols:
+        if s != symbol_silence and s.count(chord_join) + 1 >= TEMPO_RECORD:
+            raise ValueError(f"chord of {s.count(chord_join) + 1} notes; streams allow {TEMPO_RECORD - 1}")
+    first_us = step_us(segments[0][1] if segments else 0.0, speed)
+    out = bytearray()
+    for k, (start, seg_step_s) in enumerate(segments):
+        end = segments[k + 1][0] if k + 1 < len(segments) else len(symbols)
+        if start >= end:
+            continue
+        if k:
+            out.append(TEMPO_RECORD)
+            out += struct.pack("<I", step_us(seg_step_s, speed))
+        out += pack_symbols(symbols[start:end], symbol_silence=symbol_silence, chord_join=chord_join)
+    return first_us, bytes(out)
+
+
+class TtyPort:
+    """
+    A POSIX serial device (or pty) in raw mode, for when pyserial is missing:
+    read(n) returns what arrives within `timeout` seconds (maybe nothing).
+    """
+
+    def __init__(self, path: str, baud: int = DEFAULT_BAUD, timeout: float = 0.01):
+        if termios is None:
+            raise RuntimeError("no termios on this platform; pip install pyserial")
+        self.timeout = timeout
+        self.fd = os.open(path, os.O_RDWR | os.O_NOCTTY)
+        tty.setraw(self.fd)
+        speed = getattr(termios, f"B{baud}", None)
+        if speed is not None:
+            attrs = termios.tcgetattr(self.fd)
+            attrs[4] = attrs[5] = speed
+            termios.tcsetattr(self.fd, termios.TCSANOW, attrs)
+
+    def read(self, size: int) -> bytes:
+        ready, _, _ = select.select([self.fd], [], [], self.timeout)
+        return os.read(self.fd, size) if ready else b""
+
+    def write(self, data: bytes) -> int:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self.fd, view) :]
+        return len(data)
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def open_port(path: str, baud: int = DEFAULT_BAUD, timeout: float = 0.01):
+    """Anything with read(n) / write(data) / close() works as a StreamPlayer port."""
+    if serial is not None:
+        return serial.Serial(path, baud, timeout=timeout)
+    return TtyPort(path, baud, timeout)
+
+
+@dataclass
+class StreamReport:
+    name: str
+    stream_bytes: int
+    song_s: float  # playing time at the requested speed
+    steps: int = 0  # played, from DONE
+    underruns: int = 0
+    max_late_us: int = 0
+    elapsed_s: float = 0.0  # START to DONE
+    wire_bytes: int = 0  # everything written: framing and resends included
+    resends: int = 0
+    crc_errors: int = 0  # board -> host frames dropped by FrameReader
+    capacity: int = 0
+    fill: List[int] = field(default_factory=list)  # ring bytes unplayed, per STATUS while playing
+
+    @property
+    def stream_rate(self) -> float:
+        """Stream bytes per second of music: what the line must sustain."""
+        return self.stream_bytes / self.song_s if self.song_s > 0 else 0.0
+
+    def summary(self) -> str:
+        fill = self.fill or [0]
+        cap = self.capacity or 1
+        return (
+            f"{self.name[:32]:32s} steps={self.steps} {self.stream_bytes}B "
+            f"needs {self.stream_rate:.0f} B/s, sent {self.wire_bytes / max(self.elapsed_s, 1e-9):.0f} B/s "
+            f"on the wire; ring fill min {min(fill) / cap:.0%} mean {sum(fill) / len(fill) / cap:.0%} "
+            f"max {max(fill) / cap:.0%}; underruns={self.underruns} "
+            f"max late {self.max_late_us / 1000:.2f} ms; resends={self.resends} crc_errors={self.crc_errors}"
+        )
+
+
+class StreamPlayer:
+    """
+    Plays songs on the board through `port` (see open_port), one at a time:
+        player = StreamPlayer(open_port("/dev/ttyACM0"))
+        report = player.play("Song", first_step_us, stream_bytes)
+    """
+
+    def __init__(self, port, *, timeout_s: float = 0.25, connect_s: float = 5.0):
+        self.port = port
+        self.timeout_s = timeout_s
+        self.connect_s = connect_s
+        self.reader = FrameReader()
+        self.wire_bytes = 0
+
+    def _send(self, frame_type: int, payload: bytes = b"") -> None:
+        frame = encode_frame(frame_type, payload)
+        self.port.write(frame)
+        self.wire_bytes += len(frame)
+
+    def _frames(self) -> List[Tuple[int, bytes]]:
+        return self.reader.feed(self.port.read(256))
+
+    def stop(self) -> None:
+        self._send(STOP)
+
+    def play(self, name: str, first_step_us: int, stream: bytes, song_s: float = 0.0) -> StreamReport:
+        """Stream one song and wait until the board has played it out."""
+        report = StreamReport(name=name, stream_bytes=len(stream), song_s=song_s)
+        wire_before = self.wire_bytes
+        errors_before = self.reader.errors
+        t0 = time.perf_counter()
+
+        # START until the board answers (it may still be booting after the port opened)
+        start = struct.pack("<I", first_step_us) + name.encode("ascii", "replace")[:NAME_BYTES]
+        status: Optional[Tuple[int, ...]] = None
+        while status is None:
+            if time.perf_counter() - t0 > self.connect_s:
+                raise TimeoutError("no STATUS from the board; is it in Song mode?")
+            self._send(START, start)
+            deadline = time.perf_counter() + self.timeout_s
+            while status is None and time.perf_counter() < deadline:
+                for frame_type, payload in self._frames():
+                    # The reply to START shows an empty ring; skip leftovers of an earlier stream.
+                    if frame_type == STATUS and len(payload) >= 13:
+                        fields = struct.unpack_from("<HHHHIB", payload)
+                        if fields[0] == fields[1] == fields[4] == 0:
+                            status = fields
+        received = consumed = sent = 0
+        report.capacity = status[2]
+        end_sent = False
+        last_advance = last_heard = time.perf_counter()
+
+        while True:
+            limit = min(len(stream), consumed + report.capacity)
+            if limit - sent < MIN_TOP_UP and limit < len(stream) and sent - consumed >= report.capacity // 2:
+                limit = sent  # plenty queued: wait and send fewer, fuller frames
+            if sent == received < limit:
+                last_advance = time.perf_counter()  # the resend timeout runs while data is outstanding
+            while sent < limit:
+                n = min(DATA_CHUNK, limit - sent)
+                self._send(DATA, struct.pack("<H", sent & 0xFFFF) + stream[sent : sent + n])
+                sent += n
+            if received >= len(stream) and not end_sent:
+                self._send(END)
+                end_sent = True
+
+            now = time.perf_counter()
+            for frame_type, payload in self._frames():
+                last_heard = now
+                if frame_type == STATUS and len(payload) >= 13:
+                    rx, cons, _cap, underruns, _steps, flags = struct.unpack_from("<HHHHIB", payload)
+                    # 16-bit positions: advance by the difference mod 65536
+                    new_received = received + ((rx - received) & 0xFFFF)
+                    if new_received != received:
+                        last_advance = now
+                    received = new_received
+                    consumed += (cons - consumed) & 0xFFFF
+                    report.underruns = underruns
+                    if flags & STATUS_PLAYING:
+                        report.fill.append(received - consumed)
+                    if end_sent and not flags & STATUS_ENDED and now - last_advance > self.timeout_s:
+                        self._send(END)  # END was lost
+                        last_advance = now
+                elif frame_type == DONE and len(payload) >= 10:
+                    report.steps, report.underruns, report.max_late_us = struct.unpack_from("<IHI", payload)
+                    report.elapsed_s = time.perf_counter() - t0
+                    report.wire_bytes = self.wire_bytes - wire_before
+                    report.crc_errors = self.reader.errors - errors_before
+                    return report
+            if sent > received and now - last_advance > self.timeout_s:
+                sent = received  # a DATA frame was lost: resend from where the board is
+                report.resends += 1
+                last_advance = now
+            if now - last_heard > self.connect_s:
+                raise TimeoutError("board stopped answering")
+
+
+def stream_seconds(steps: int, segments: List[StepSegment], speed: float = 1.0) -> float:
+    """Playing time of `steps` steps laid out by segments."""
+    total = 0.0
+    for k, (start, seg_step_s) in enumerate(segments):
+        end = min(segments[k + 1][0] if k + 1 < len(segments) else steps, steps)
+        if end > start:
+            total += (end - start) * step_us(seg_step_s, speed) / 1e6
+    return total
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("midi", nargs="+", help="Path(s) to .mid/.midi file(s), played in order")
+    ap.add_argument("--port", required=True, help="Serial port of the board, e.g. /dev/ttyACM0")
+    ap.add_argument("--baud", type=int, default=DEFAULT_BAUD, help="kSongStreamBaud in Config.h")
+    ap.add_argument("--speed", type=float, default=1.0, help="Playback speed factor")
+    ap.add_argument("--timeout", type=float, default=0.25, help="Seconds without progress before resending")
+    ap.add_argument("--steps-per-beat", type=int, default=4, help="4=16th notes, 2=8th, 1=quarter")
+    ap.add_argument("--mode", choices=["onset", "sustain"], default="onset")
+    ap.add_argument("--instrument-index", type=int, default=None, help="Which track to use (default: auto best)")
+    ap.add_argument("--follow-tempo", action="store_true", help="Quantize in MIDI ticks so steps follow every tempo change")
+    ap.add_argument(
+        "--tempo-source",
+        choices=TEMPO_SOURCES,
+        default="pretty_midi",
+        help="Fixed grid tempo, as in midi2array2.py",
+    )
+    add_cache_arguments(ap)
+    args = ap.parse_args()
+    if args.speed <= 0:
+        ap.error("--speed must be positive")
+
+    options: Dict[str, Any] = dict(
+        steps_per_beat=args.steps_per_beat,
+        instrument_index=args.instrument_index,
+        mode=args.mode,
+        symbol_silence=" ",
+        chord_join="+",
+        follow_tempo=args.follow_tempo,
+        tempo_source=args.tempo_source,
+    )
+    results = convert_files(args.midi, options, cache=cache_from_args(args))
+    port = open_port(args.port, args.baud)
+    player = StreamPlayer(port, timeout_s=args.timeout)
+    try:
+        for path, (symbols, step_s, segments, _elapsed, error, _tempo, _auto_grid) in zip(args.midi, results):
+            if error is not None:
+                print(f"# error {path}: {error}", file=sys.stderr)
+                continue
+            name = os.path.splitext(os.path.basename(path))[0]
+            first_us, stream = encode_stream(symbols, segments, speed=args.speed)
+            song_s = stream_seconds(len(symbols), segments, args.speed)
+            print(f"# streaming {name}: {len(symbols)} steps, {len(stream)}B, {song_s:.1f}s", file=sys.stderr)
+            print(player.play(name, first_us, stream, song_s).summary())
+    except KeyboardInterrupt:
+        player.stop()
+    finally:
+        port.close()
+
+
+if __name__ == "__main__":
+    main()
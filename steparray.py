@@ -0,0 +1,241 @@
+"""
+steparray.py
+
+Binary step arrays, written by both converters (midi2array --save-format
+steps, midi2array2 --out-steps) for downstream jobs: one interned token
+index per step at a fixed width, so a reader can memory-map the steps and
+slice them by time without parsing or loading the whole file.
+
+Layout (little-endian):
+    0   magic b"PSTEPS\\x00\\x01"
+    8   u8 index width in bytes (1 or 2), 7 bytes reserved
+    16  u64 steps
+    24  f64 step_s (duration of the first step)
+    32  u64 metadata offset, 40 u64 metadata length, 48..64 reserved
+    64  steps x uint8/uint16 token indices
+    then the metadata, UTF-8 JSON: {"tokens": [...], "step_segments":
+    [[start_step, step_s], ...], plus what the converter adds (grid, policy, ...)}
+The metadata follows the indices so they can be written as the converter
+produces them; the token table is only complete at the end.
+
+Usage:
+    with StepArrayWriter("song.steps", step_s=0.125, index_bytes=1, grid="16th") as w:
+        w.write_run("C4", 3)
+        w.write_tokens(["SIL", "E4"])
+    with read_step_array("song.steps") as steps:
+        steps.indices[1000:2000]           # np.memmap (a memoryview without numpy)
+        steps.tokens_between(12.0, 15.0)   # tokens of the steps from 12 s to 15 s
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from notearray.backends import lazy_import
+
+np = lazy_import("numpy", optional=True)  # without numpy, readers get a memoryview over the mapped file
+
+MAGIC = b"PSTEPS\x00\x01"
+HEADER = struct.Struct("<8sB7xQdQQ16x")
+HEADER_BYTES = HEADER.size  # 64
+INDEX_FORMATS = {1: "B", 2: "H"}
+FLUSH_BYTES = 1 << 20
+
+StepSegment = Tuple[int, float]
+
+
+class StepArrayWriter:
+    """
+    Writes a step array as the tokens come (write_run / write_tokens); the
+    header and token table are written on close(). index_bytes=1 allows 256
+    distinct tokens, 2 allows 65536. Leaving the `with` block on an
+    exception removes the partial file.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        step_s: float,
+        step_segments: Optional[Sequence[StepSegment]] = None,
+        index_bytes: int = 2,
+        **meta: Any,
+    ):
+        if index_bytes not in INDEX_FORMATS:
+            raise ValueError("index_bytes must be 1 or 2")
+        self.path = path
+        self.step_s = step_s
+        self.step_segments = [tuple(seg) for seg in step_segments] if step_segments else [(0, step_s)]
+        self.index_bytes = index_bytes
+        self.meta = meta
+        self.steps = 0
+        self._ids: Dict[str, bytes] = {}  # token -> its packed index
+        self._tokens: List[str] = []
+        self._pack = struct.Struct("<" + INDEX_FORMATS[index_bytes]).pack
+        self._buf = bytearray()
+        self._f = open(path, "wb")
+        self._f.write(bytes(HEADER_BYTES))
+
+    def _index(self, token: str) -> bytes:
+        packed = self._ids.get(token)
+        if packed is None:
+            if len(self._tokens) >= 1 << (8 * self.index_bytes):
+                raise ValueError(f"more than {1 << (8 * self.index_bytes)} distinct tokens; use index_bytes=2")
+            packed = self._ids[token] = self._pack(len(self._tokens))
+            self._tokens.append(token)
+        return packed
+
+    def write_run(self, token: str, length: int) -> None:
+        self._buf += self._index(token) * length
+        self.steps += length
+        if len(self._buf) >= FLUSH_BYTES:
+            self._f.write(self._buf)
+            self._buf.clear()
+
+    def write_tokens(self, tokens: Sequence[str]) -> None:
+        for token in dict.fromkeys(tokens):  # new tokens in order of first use
+            self._index(token)
+        buf = self._buf
+        buf += b"".join(map(self._ids.__getitem__, tokens))
+        self.steps += len(tokens)
+        if len(buf) >= FLUSH_BYTES:
+            self._f.write(buf)
+            buf.clear()
+
+    def close(self) -> None:
+        if self._f.closed:
+            return
+        f = self._f
+        f.write(self._buf)
+        self._buf.clear()
+        meta = dict(self.meta, tokens=self._tokens, step_segments=[list(seg) for seg in self.step_segments])
+        blob = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+        meta_offset = f.tell()
+        f.write(blob)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, self.index_bytes, self.steps, self.step_s, meta_offset, len(blob)))
+        f.close()
+
+    def __enter__(self) -> "StepArrayWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+            return
+        self._f.close()
+        os.unlink(self.path)
+
+
+def write_step_array(path: str, tokens: Sequence[str], **kwargs: Any) -> int:
+    """One-shot StepArrayWriter; returns the number of steps written."""
+    with StepArrayWriter(path, **kwargs) as w:
+        w.write_tokens(tokens)
+    return w.steps
+
+
+@dataclass
+class StepArray:
+    """
+    A mapped step array. indices is an np.memmap of uint8/uint16 (or a
+    memoryview without numpy); slicing it only touches those pages.
+    """
+
+    path: str
+    steps: int
+    step_s: float
+    step_segments: List[StepSegment]
+    tokens: List[str]
+    meta: Dict[str, Any]
+    indices: Any
+    _mmap: Optional[mmap.mmap] = field(default=None, repr=False)
+    _views: List[memoryview] = field(default_factory=list, repr=False)
+    _segment_starts: List[float] = field(default_factory=list, repr=False)
+
+    def __post_init__(self) -> None:
+        t = 0.0
+        self._segment_starts = []
+        for k, (start, step_s) in enumerate(self.step_segments):
+            if k:
+                prev_start, prev_step_s = self.step_segments[k - 1]
+                t += (start - prev_start) * prev_step_s
+            self._segment_starts.append(t)
+
+    def __len__(self) -> int:
+        return self.steps
+
+    def step_start(self, i: int) -> float:
+        """Start time (s) of step i."""
+        k = bisect.bisect_right(self.step_segments, (i, math.inf)) - 1
+        start, step_s = self.step_segments[max(k, 0)]
+        return self._segment_starts[max(k, 0)] + (i - start) * step_s
+
+    def step_at(self, t: float) -> int:
+        """Index of the step sounding at t seconds, clamped to 0..steps."""
+        k = max(bisect.bisect_right(self._segment_starts, t) - 1, 0)
+        start, step_s = self.step_segments[k]
+        i = start + math.floor((t - self._segment_starts[k]) / step_s)
+        return min(max(i, 0), self.steps)
+
+    def slice_seconds(self, t0: float, t1: float) -> Any:
+        """Indices of the steps overlapping [t0, t1)."""
+        if t1 <= t0:
+            return self.indices[0:0]
+        i1 = self.step_at(t1)
+        if i1 < self.steps and self.step_start(i1) < t1:
+            i1 += 1
+        return self.indices[self.step_at(t0) : i1]
+
+    def tokens_between(self, t0: float, t1: float) -> List[str]:
+        tokens = self.tokens
+        return [tokens[k] for k in self.slice_seconds(t0, t1).tolist()]
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            for view in reversed(self._views):
+                view.release()
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self) -> "StepArray":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def read_step_array(path: str) -> StepArray:
+    """Read the header and token table; the indices stay on disk, mapped."""
+    with open(path, "rb") as f:
+        header = f.read(HEADER_BYTES)
+        if len(header) < HEADER_BYTES or header[:8] != MAGIC:
+            raise ValueError(f"{path}: not a step array file")
+        _magic, width, steps, step_s, meta_offset, meta_len = HEADER.unpack(header)
+        if width not in INDEX_FORMATS or meta_offset != HEADER_BYTES + steps * width:
+            raise ValueError(f"{path}: corrupt step array header")
+        f.seek(meta_offset)
+        meta = json.loads(f.read(meta_len).decode("utf-8"))
+        tokens = meta.pop("tokens")
+        segments = [(int(start), float(seg_step_s)) for start, seg_step_s in meta.pop("step_segments")]
+        if np is not None:
+            dtype = "<u%d" % width
+            if steps == 0:  # an empty memmap cannot be created
+                indices = np.zeros(0, dtype)
+            else:
+                indices = np.memmap(f, dtype=dtype, mode="r", offset=HEADER_BYTES, shape=(steps,))
+            return StepArray(path, steps, step_s, segments, tokens, meta, indices)
+        if width > 1 and sys.byteorder != "little":
+            raise ValueError("reading 2-byte step arrays without numpy needs a little-endian host")
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    views = [memoryview(mm)]
+    views.append(views[0][HEADER_BYTES:meta_offset])
+    views.append(views[1].cast(INDEX_FORMATS[width]))
+    return StepArray(path, steps, step_s, segments, tokens, meta, views[-1], _mmap=mm, _views=views)
@@ -0,0 +1,180 @@
+"""
+Shared by the tests and bench.py: synthetic and scaled-up MIDI inputs, the
+reference implementations the optimized code is checked against, and the
+hostsim/ build of the firmware.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import random
+import shutil
+import subprocess
+from typing import List, Tuple
+
+import mido
+
+import midi2array
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_synthetic_midi(
+    n_notes: int = 2000,
+    n_tempo_changes: int = 0,
+    ticks_per_beat: int = 480,
+    note_ticks: int = 120,
+    chord_size: int = 1,
+    seed: int = 0,
+) -> mido.MidiFile:
+    """
+    Build an in-memory MIDI file: one tempo track with n_tempo_changes
+    set_tempo events spread over the piece, one note track with n_notes
+    notes (grouped in chords of chord_size) on a steady grid.
+    """
+    rng = random.Random(seed)
+    mid = mido.MidiFile(ticks_per_beat=ticks_per_beat)
+
+    n_steps = max(1, (n_notes + chord_size - 1) // chord_size)
+    total_ticks = n_steps * note_ticks
+
+    tempo_track = mido.MidiTrack()
+    tempo_track.append(mido.MetaMessage("set_tempo", tempo=500000, time=0))
+    if n_tempo_changes > 0:
+        spacing = max(1, total_ticks // n_tempo_changes)
+        for _ in range(n_tempo_changes):
+            tempo = rng.randint(300000, 900000)  # ~66..200 bpm, rubato-like
+            tempo_track.append(mido.MetaMessage("set_tempo", tempo=tempo, time=spacing))
+    mid.tracks.append(tempo_track)
+
+    note_track = mido.MidiTrack()
+    remaining = n_notes
+    for _ in range(n_steps):
+        size = min(chord_size, remaining)
+        remaining -= size
+        pitches = rng.sample(range(36, 96), size)
+        for p in pitches:
+            note_track.append(mido.Message("note_on", note=p, velocity=rng.randint(40, 120), time=0))
+        for k, p in enumerate(pitches):
+            note_track.append(mido.Message("note_off", note=p, velocity=0, time=note_ticks if k == 0 else 0))
+    mid.tracks.append(note_track)
+    return mid
+
+
+EXTRA_VOICE_INTERVALS = [12, 7, 4, 19, 16, 24]
+
+
+def scale_midi(mid: mido.MidiFile, times: int, extra_voices: int = 0) -> mido.MidiFile:
+    """
+    Scaled-up copy of a real piece: every track repeated `times` times back to
+    back (tempo changes included), every note doubled by extra_voices voices
+    (+12, +7, +4, ... semitones, dropped outside 0..127) for denser chords.
+    """
+    intervals = EXTRA_VOICE_INTERVALS[:extra_voices]
+
+    def body(track: mido.MidiTrack) -> List[mido.Message]:
+        return [msg for msg in track if not (msg.is_meta and msg.type == "end_of_track")]
+
+    period = max((sum(msg.time for msg in track) for track in mid.tracks), default=0)
+    out = mido.MidiFile(type=mid.type, ticks_per_beat=mid.ticks_per_beat)
+    for track in mid.tracks:
+        msgs = body(track)
+        gap = period - sum(msg.time for msg in msgs)
+        new_track = mido.MidiTrack()
+        for copy in range(times):
+            for k, msg in enumerate(msgs):
+                delta = msg.time + (gap if copy > 0 and k == 0 else 0)
+                new_track.append(msg.copy(time=delta))
+                if msg.type in ("note_on", "note_off"):
+                    for interval in intervals:
+                        if 0 <= msg.note + interval <= 127:
+                            new_track.append(msg.copy(note=msg.note + interval, time=0))
+            if not msgs:
+                break
+        new_track.append(mido.MetaMessage("end_of_track", time=gap if msgs else period))
+        out.tracks.append(new_track)
+    return out
+
+
+def reference_sweep(events: List[midi2array.NoteEvent], step_s: float, policy: str) -> List[str]:
+    """Reference: the original per-bin sweep (active list rebuilt and re-chosen every bin)."""
+    names = [midi2array.midi_note_to_name(p) for p in range(128)]
+    events_sorted = sorted(events, key=lambda e: e.start_s)
+    n = int(math.ceil(max(e.end_s for e in events) / step_s))
+    active: List[midi2array.NoteEvent] = []
+    out: List[str] = []
+    j = 0
+    for i in range(n):
+        t0 = i * step_s
+        t1 = t0 + step_s
+        while j < len(events_sorted) and events_sorted[j].start_s < t1:
+            active.append(events_sorted[j])
+            j += 1
+        active = [e for e in active if e.end_s > t0]
+        note = midi2array.choose_note(active, policy=policy)
+        out.append("SIL" if note is None else names[note])
+    return out
+
+
+def firmware_mic_block(block: List[float], fft_size: int, sample_rate: float, top_bins: int) -> List[Tuple[int, int]]:
+    """
+    One DemoMic.ino block, line by line: mean removal, arduinoFFT's Hamming
+    loop, magnitudes, findTopBins insertion, freqToMidi. (bin, midi) pairs,
+    strongest first. Only the FFT itself is numpy's.
+    """
+    import numpy as np
+
+    mean = sum(block) / fft_size
+    v = [x - mean for x in block]
+    for i in range(fft_size // 2):
+        w = 0.54 - 0.46 * math.cos(2.0 * math.pi * i / (fft_size - 1))
+        v[i] *= w
+        v[fft_size - 1 - i] *= w
+    mag = np.abs(np.fft.rfft(v)).tolist()
+    bins = [-1] * top_bins
+    for i in range(2, fft_size // 2):
+        for j in range(top_bins):
+            if bins[j] < 0 or mag[i] > mag[bins[j]]:
+                bins[j + 1 :] = bins[j:-1]
+                bins[j] = i
+                break
+    out = []
+    for b in bins:
+        freq = b * sample_rate / fft_size
+        midi = int(math.floor(69 + 12 * math.log2(freq / 440.0) + 0.5)) if freq > 0 else -1
+        out.append((b, midi if midi <= 127 else -1))
+    return out
+
+
+FIRMWARE_FORMATS = ("text", "packed", "phrases", "frames")
+FIRMWARE_SOURCES = ("Config.h", "DemoSong.ino", "LedStrip.ino")
+
+
+def render_songs_header(fmt: str, songs: List[Tuple[str, List[str], float]]) -> str:
+    import midi2array2
+
+    if fmt == "packed":
+        return midi2array2.render_packed_header(songs)[0]
+    if fmt == "phrases":
+        return midi2array2.render_phrase_header(songs)[0]
+    if fmt == "frames":
+        return midi2array2.render_frame_header(songs)[0]
+    return midi2array2.render_header(songs)
+
+
+def build_hostsim(cxx: str, build: str, fmt: str, songs: List[Tuple[str, List[str], float]]) -> str:
+    """Compile hostsim/ with PianoStrip's sources and a `fmt` Songs.h of songs into build/."""
+    root = ROOT
+    os.makedirs(build)
+    for name in FIRMWARE_SOURCES:
+        shutil.copy(os.path.join(root, "PianoStrip", name), build)
+    with open(os.path.join(build, "Songs.h"), "w", encoding="utf-8") as f:
+        f.write(render_songs_header(fmt, songs))
+    exe = os.path.join(build, "hostsim")
+    subprocess.run(
+        [cxx, "-O2", "-std=c++11", "-I", os.path.join(root, "hostsim"), "-I", build,
+         "-o", exe, os.path.join(root, "hostsim", "hostsim.cpp")],
+        check=True,
+    )
+    return exe
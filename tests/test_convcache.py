@@ -0,0 +1,57 @@
+import os
+import shutil
+
+from convcache import ConversionCache, tool_version
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+SONG = os.path.join(ROOT, "Satie-Gymnopedie1.mid")
+
+
+def copy_sources(tmp_path, names):
+    paths = []
+    for name in names:
+        paths.append(str(tmp_path / os.path.basename(name)))
+        shutil.copy(os.path.join(ROOT, name), paths[-1])
+    return paths
+
+
+def test_tool_version_is_order_independent(tmp_path):
+    paths = copy_sources(tmp_path, ["notearray/notes.py", "smfreader.py", "noteindex.py"])
+    assert tool_version(paths) == tool_version(list(reversed(paths)))
+    assert tool_version(paths[0]) == tool_version([paths[0]])
+
+
+def test_editing_a_dependency_misses_the_cache(tmp_path):
+    sources = copy_sources(tmp_path, ["notearray/notes.py", "smfreader.py", "noteindex.py"])
+    cache = ConversionCache(str(tmp_path / "cache"))
+    options = {"grid": "16th", "policy": "highest"}
+    key = cache.key(SONG, "midi2array", tool_version(sources), options)
+    cache.put(key, ["C4", "SIL"], 0.125)
+    assert cache.get(key) == (["C4", "SIL"], 0.125, {})
+
+    for dependency in sources[1:]:
+        with open(dependency, "a") as f:
+            f.write("\n# edited\n")
+        key = cache.key(SONG, "midi2array", tool_version(sources), options)
+        assert cache.get(key) is None
+
+
+def test_source_version_covers_the_conversion_path():
+    import notearray
+
+    names = {os.path.relpath(path, ROOT) for path in notearray.source_files()}
+    for name in (
+        "notearray/__init__.py",
+        "notearray/backends.py",
+        "notearray/chords.py",
+        "notearray/cli.py",
+        "notearray/names.py",
+        "notearray/notes.py",
+        "autogrid.py",
+        "convcache.py",
+        "noteindex.py",
+        "smfreader.py",
+    ):
+        assert name in names
+    assert notearray.source_version() == tool_version(notearray.source_files())
@@ -0,0 +1,39 @@
+import io
+import os
+
+import mido
+import pytest
+
+from notearray.chords import convert_files
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SONG = os.path.join(os.path.dirname(HERE), "Satie-Gymnopedie1.mid")
+
+
+def write_bad_key_signature(path):
+    """A one-note file whose key_signature claims 20 sharps: mido cannot decode it."""
+    mid = mido.MidiFile()
+    track = mido.MidiTrack()
+    mid.tracks.append(track)
+    track.append(mido.MetaMessage("key_signature", key="C"))
+    track.append(mido.Message("note_on", note=60, velocity=80))
+    track.append(mido.Message("note_off", note=60, time=480))
+    buf = io.BytesIO()
+    mid.save(file=buf)
+    data = bytearray(buf.getvalue())
+    data[data.index(b"\xff\x59\x02") + 3] = 20
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_undecodable_file_does_not_abort_the_batch(tmp_path, jobs):
+    bad = write_bad_key_signature(tmp_path / "keysig.mid")
+    (bad_result, good_result) = convert_files([bad, SONG], {"steps_per_beat": 4}, jobs=jobs)
+
+    assert bad_result[4].startswith("KeySignatureError")
+    assert bad_result[0] == []
+    symbols, step_s, _segments, _elapsed, error, _tempo, _auto_grid = good_result
+    assert error is None
+    assert symbols and step_s > 0
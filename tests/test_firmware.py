@@ -0,0 +1,53 @@
+import glob
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import midi2array2
+from helpers import FIRMWARE_FORMATS, build_hostsim
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SONGS = sorted(glob.glob(os.path.join(ROOT, "*.mid")))
+# The text player copies each step's symbol into a 32-byte buffer.
+TEXT_SYMBOL_MAX = 31
+
+CXX = shutil.which("g++")
+pytestmark = pytest.mark.skipif(CXX is None, reason="hostsim/ needs a host C++ compiler")
+
+
+@pytest.fixture(scope="module")
+def songs():
+    out = []
+    for path in SONGS:
+        symbols, step_s = midi2array2.midi_to_symbol_array(path, steps_per_beat=4)
+        out.append((midi2array2.sanitize_name(os.path.splitext(os.path.basename(path))[0]), symbols, step_s))
+    return out
+
+
+@pytest.fixture(scope="module")
+def dumps(songs, tmp_path_factory):
+    """Per format: {(song, step): "<lit LEDs> <buzzer Hz>"} from hostsim --dump."""
+    work = tmp_path_factory.mktemp("hostsim")
+    result = {}
+    for fmt in FIRMWARE_FORMATS:
+        exe = build_hostsim(CXX, str(work / fmt), fmt, songs)
+        out = subprocess.run([exe, "--dump", "--repeat", "1"], check=True, capture_output=True, text=True).stdout
+        steps = {}
+        for line in out.splitlines():
+            if line.startswith("step "):
+                _step, song, step, shown = line.split(" ", 3)
+                steps[int(song), int(step)] = shown
+        result[fmt] = steps
+    return result
+
+
+@pytest.mark.parametrize("fmt", [f for f in FIRMWARE_FORMATS if f != "packed"])
+def test_format_displays_like_packed(fmt, songs, dumps):
+    assert len(dumps["packed"]) == sum(len(symbols) for _name, symbols, _step_s in songs)
+    differing = [key for key, shown in dumps["packed"].items() if dumps[fmt].get(key) != shown]
+    if fmt == "text":
+        # Chords longer than the text player's buffer are cut short there.
+        differing = [(s, i) for s, i in differing if len(songs[s][1][i]) <= TEXT_SYMBOL_MAX]
+    assert differing == []
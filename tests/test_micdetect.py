@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+import pytest
+
+import micdetect
+from helpers import firmware_mic_block
+from notearray.notes import NoteEventTable, parse_events
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_freq_to_midi():
+    assert micdetect.freq_to_midi(np.array([440.0, 261.63, 0.0, -5.0])).tolist() == [69, 60, -1, -1]
+    # lroundf: halfway rounds up
+    assert micdetect.freq_to_midi(np.array([440.0 * 2 ** (0.5 / 12)])).tolist() == [70]
+
+
+def test_pure_tone_is_detected():
+    fs, n = micdetect.FFT_SAMPLE_RATE, 1024
+    t = np.arange(int(fs)) / fs
+    samples = micdetect.to_adc(np.sin(2 * np.pi * 440.0 * t), noise=0.0)
+    det = micdetect.detect(samples, n, fs)
+    assert len(det) == int(fs) // n
+    assert set(det.main.tolist()) == {69}
+
+
+@pytest.mark.parametrize("fft_size", [128, 256, 512])
+def test_batched_matches_firmware_port(fft_size):
+    events, _tempo_map = parse_events(os.path.join(ROOT, "Satie-Gymnopedie1.mid"), parser="raw")
+    fs = micdetect.FFT_SAMPLE_RATE
+    samples = micdetect.to_adc(micdetect.synthesize(events, fs))
+    det = micdetect.detect(samples, fft_size, fs, compute_s=0.005)
+    starts = np.rint(det.block_start_s * fs).astype(int)
+    for k, s in enumerate(starts[:300].tolist()):
+        port = firmware_mic_block(samples[s : s + fft_size].tolist(), fft_size, fs, micdetect.TOP_BINS)
+        assert [b for b, _m in port] == det.bins[k].tolist()
+        assert [m for _b, m in port] == det.midi[k].tolist()
+
+
+def test_score_counts_a_perfect_detector():
+    # One held A4 for 1 s: every block's main note sounds, the note is found in the first block.
+    events = NoteEventTable([0.0], [1.0], [69], [100], [0], [0])
+    fs, n = micdetect.FFT_SAMPLE_RATE, 1024
+    det = micdetect.detect(micdetect.to_adc(micdetect.synthesize(events, fs), noise=0.0), n, fs)
+    score = micdetect.score(det, events)
+    assert score.scored_blocks > 0
+    assert score.main_exact == score.scored_blocks
+    assert score.latencies_s.tolist() == [pytest.approx(n / fs)]
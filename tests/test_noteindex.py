@@ -0,0 +1,41 @@
+import glob
+import os
+import random
+
+import mido
+import pytest
+
+import midi2array
+from helpers import make_synthetic_midi, reference_sweep
+from noteindex import NoteIndex
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SONGS = sorted(glob.glob(os.path.join(ROOT, "*.mid")))
+
+
+def song_events():
+    for path in SONGS:
+        yield os.path.basename(path), midi2array.extract_note_events(mido.MidiFile(path))
+    yield "synthetic", midi2array.extract_note_events(make_synthetic_midi(n_notes=2000, chord_size=3))
+
+
+@pytest.mark.parametrize("policy", midi2array.POLICIES)
+@pytest.mark.parametrize("grid_ms", [10.0, 125.0])
+def test_sweep_matches_reference(policy, grid_ms):
+    step_s = grid_ms / 1000.0
+    for name, events in song_events():
+        assert midi2array.events_to_array(events, step_s, policy=policy) == reference_sweep(events, step_s, policy), name
+
+
+def test_point_and_range_queries_match_linear_scan():
+    rng = random.Random(2)
+    for name, events in song_events():
+        index = NoteIndex([e.start_s for e in events], [e.end_s for e in events], events)
+        t_end = max(e.end_s for e in events)
+        for _ in range(200):
+            t = rng.uniform(0.0, t_end)
+            assert index.notes_at(t) == [e for e in events if e.start_s <= t < e.end_s], name
+            t1 = t + 0.25
+            assert sorted(map(id, index.notes_in(t, t1))) == sorted(
+                id(e) for e in events if e.start_s < t1 and e.end_s > t
+            ), name
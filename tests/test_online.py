@@ -0,0 +1,58 @@
+import glob
+import os
+
+import mido
+import pytest
+
+import midi2array
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SONGS = sorted(glob.glob(os.path.join(ROOT, "*.mid")))
+GRIDS = ["16th", "10ms"]
+
+
+def load(path):
+    mid = mido.MidiFile(path)
+    tempo_map = midi2array.TempoMap.from_midi(mid)
+    return mid, tempo_map, midi2array.extract_note_table(mid, tempo_map=tempo_map)
+
+
+def grid_step(tempo_map, grid):
+    grid_ms = float(grid[:-2]) if grid.endswith("ms") else None
+    return midi2array.resolve_grid(tempo_map, grid=None if grid_ms else grid, grid_ms=grid_ms)[0]
+
+
+@pytest.mark.parametrize("grid", GRIDS)
+@pytest.mark.parametrize("path", SONGS, ids=os.path.basename)
+def test_extracted_events_match_file_converter(path, grid):
+    # Replaying the extracted notes (note-offs first on ties) must give the
+    # file converter's bins; "first" may differ where a held note is struck again.
+    _mid, tempo_map, events = load(path)
+    step_s = grid_step(tempo_map, grid)
+    clean = []
+    for e in events:
+        clean.append((e.start_s, 1, e.track, mido.Message("note_on", channel=e.channel, note=e.note, velocity=e.velocity)))
+        clean.append((e.end_s, 0, e.track, mido.Message("note_off", channel=e.channel, note=e.note)))
+    clean.sort(key=lambda x: (x[0], x[1]))
+    for policy in ("highest", "lowest", "loudest"):
+        q = midi2array.OnlineQuantizer(step_s, policy=policy)
+        out = []
+        for t, _off_first, ti, msg in clean:
+            out.extend(q.feed(msg, t, ti))
+        out.extend(q.flush(clean[-1][0]))
+        assert [token for _i, token in out] == midi2array.events_to_array(events, step_s, policy=policy)
+
+
+@pytest.mark.parametrize("path", SONGS, ids=os.path.basename)
+def test_bins_after_the_last_note_are_silent(path):
+    mid, tempo_map, events = load(path)
+    step_s = grid_step(tempo_map, "16th")
+    ref = midi2array.events_to_array(events, step_s, policy="highest")
+    t_end = tempo_map.ticks_to_seconds(max(sum(msg.time for msg in track) for track in mid.tracks))
+    q = midi2array.OnlineQuantizer(step_s, policy="highest")
+    out = []
+    for t, ti, msg in midi2array.iter_timed_messages(mid, tempo_map):
+        if not msg.is_meta:
+            out.extend(q.feed(msg, t, ti))
+    out.extend(q.flush(t_end))
+    assert set(token for _i, token in out[len(ref) :]) <= {"SIL"}
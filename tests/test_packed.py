@@ -0,0 +1,53 @@
+import glob
+import os
+
+import pytest
+
+from notearray.chords import PACKED_MAX_CHORD, pack_symbols, text_header_size, unpack_symbols
+from notearray.names import PITCH_NAMES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEQUENCES = [
+    [],
+    [" "],
+    ["C4"],
+    ["C4", "C4", " ", "E4+G4", "C-1+G9"],
+    ["C3+E3+G3", " ", " ", " ", "A#2+D#3", "F#4"],
+    # Silent runs longer than one record holds (0x80 steps), and exactly one record.
+    [" "] * 128 + ["A4"] + [" "] * 300,
+    ["B0"] + [" "] * 129,
+]
+
+
+@pytest.mark.parametrize("symbols", SEQUENCES)
+def test_round_trip(symbols):
+    assert unpack_symbols(pack_symbols(symbols)) == symbols
+
+
+def test_round_trip_custom_silence_and_join():
+    symbols = ["SIL", "C4/E4", "SIL", "SIL", "G4"]
+    blob = pack_symbols(symbols, symbol_silence="SIL", chord_join="/")
+    assert unpack_symbols(blob, symbol_silence="SIL", chord_join="/") == symbols
+
+
+def test_record_layout():
+    # Two silent steps, then a two-note chord: count byte, pitches ascending.
+    assert pack_symbols([" ", " ", "C4+E4"]) == bytes([0x81, 2, 60, 64])
+
+
+def test_largest_chord_and_too_large():
+    chord = "+".join(PITCH_NAMES[:PACKED_MAX_CHORD])
+    assert unpack_symbols(pack_symbols([chord])) == [chord]
+    with pytest.raises(ValueError):
+        pack_symbols(["+".join(PITCH_NAMES[: PACKED_MAX_CHORD + 1])])
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(ROOT, "*.mid"))), ids=os.path.basename)
+def test_bundled_songs_round_trip(path):
+    from notearray.chords import midi_to_symbol_array
+
+    symbols, _step_s = midi_to_symbol_array(path, steps_per_beat=4)
+    blob = pack_symbols(symbols)
+    assert unpack_symbols(blob) == symbols
+    assert len(blob) < text_header_size(symbols)
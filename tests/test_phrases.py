@@ -0,0 +1,31 @@
+import glob
+import os
+
+import pytest
+
+from notearray.chords import decode_phrases, encode_phrases, midi_to_symbol_array
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SONGS = sorted(glob.glob(os.path.join(ROOT, "*.mid")))
+
+
+@pytest.mark.parametrize(
+    "symbols",
+    [
+        [],
+        [" "] * 5,
+        ["C4", "E4", "G4"] * 8,
+        ["C4+E4", " ", "G4"] * 20 + [" "] * 300 + ["C4+E4", " ", "G4"] * 20,
+    ],
+)
+def test_round_trip(symbols):
+    decoded, _read_bytes = decode_phrases(encode_phrases(symbols))
+    assert decoded == symbols
+
+
+@pytest.mark.parametrize("mode", ["onset", "sustain"])
+@pytest.mark.parametrize("path", SONGS, ids=os.path.basename)
+def test_bundled_songs_round_trip(path, mode):
+    symbols, _step_s = midi_to_symbol_array(path, steps_per_beat=4, mode=mode)
+    decoded, _read_bytes = decode_phrases(encode_phrases(symbols))
+    assert decoded == symbols
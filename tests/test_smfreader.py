@@ -0,0 +1,32 @@
+import glob
+import os
+
+import mido
+import pytest
+
+import midi2array
+import smfreader
+from helpers import scale_midi
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SONGS = sorted(glob.glob(os.path.join(ROOT, "*.mid")))
+
+
+@pytest.mark.parametrize("path", SONGS, ids=os.path.basename)
+def test_raw_events_match_mido(path):
+    events = midi2array.extract_note_events(mido.MidiFile(path))
+    assert midi2array.extract_note_events_raw(smfreader.read_smf(path)) == events
+
+
+def test_raw_events_match_mido_on_scaled_multitrack(tmp_path):
+    path = str(tmp_path / "scaled.mid")
+    scale_midi(mido.MidiFile(SONGS[0]), 3, extra_voices=2).save(path)
+    events = midi2array.extract_note_events(mido.MidiFile(path))
+    assert midi2array.extract_note_events_raw(smfreader.read_smf(path)) == events
+
+
+def test_not_a_midi_file(tmp_path):
+    path = tmp_path / "junk.mid"
+    path.write_bytes(b"junk")
+    with pytest.raises(ValueError):
+        smfreader.read_smf(str(path))
@@ -0,0 +1,53 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import songstream
+from helpers import build_hostsim
+from notearray.chords import convert_files, sanitize_name
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SONG = os.path.join(ROOT, "Satie-Gymnopedie1.mid")
+STEPS = 80
+SPEED = 8.0
+BAUD = 115200
+
+CXX = shutil.which("g++")
+pytestmark = [
+    pytest.mark.skipif(CXX is None, reason="hostsim/ needs a host C++ compiler"),
+    pytest.mark.skipif(songstream.termios is None, reason="needs a POSIX pty"),
+]
+
+
+# Every Nth byte the board receives gets a bit flipped: 53 hits some frames
+# (resent) but lets most through.
+@pytest.mark.parametrize("corrupt", [0, 53])
+def test_every_step_is_played(tmp_path, corrupt):
+    (symbols, _step_s, segments, _elapsed, error, _tempo, _auto_grid), = convert_files([SONG], {"steps_per_beat": 4})
+    assert error is None
+    symbols = symbols[:STEPS]
+    name = sanitize_name(os.path.splitext(os.path.basename(SONG))[0])
+    exe = build_hostsim(CXX, str(tmp_path / "stream"), "packed", [(name, symbols[:16], segments[0][1])])
+
+    master, slave = os.openpty()
+    proc = subprocess.Popen(
+        [exe, "--stream", str(master), "--baud", str(BAUD), "--corrupt", str(corrupt)],
+        pass_fds=(master,),
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    os.close(master)
+    port = songstream.TtyPort(os.ttyname(slave), BAUD)
+    os.close(slave)
+    try:
+        player = songstream.StreamPlayer(port, timeout_s=0.25)
+        first_us, stream = songstream.encode_stream(symbols, segments, speed=SPEED)
+        report = player.play(name, first_us, stream, songstream.stream_seconds(len(symbols), segments, SPEED))
+    finally:
+        port.close()
+        out, _ = proc.communicate(timeout=10)
+    assert report.steps == len(symbols)
+    if corrupt:
+        assert "corrupted=0" not in out and report.resends > 0
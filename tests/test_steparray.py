@@ -0,0 +1,50 @@
+import glob
+import os
+
+import pytest
+
+import midi2array
+import midi2array2
+import steparray
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SONGS = sorted(glob.glob(os.path.join(ROOT, "*.mid")))
+
+
+def save(path, save_format, runs, step_s, segments, **meta):
+    sink = midi2array.TokenSink(path, save_format, step_s, segments, **meta)
+    for _start, length, token in runs:
+        sink.write_run(token, length)
+    sink.close()
+
+
+@pytest.mark.parametrize("grid_ms", [10.0, 1.0])
+@pytest.mark.parametrize("path", SONGS, ids=os.path.basename)
+def test_midi2array_read_back(tmp_path, path, grid_ms):
+    runs_iter, step_s, segments = midi2array.iter_convert_midi_file(path, grid_ms=grid_ms)
+    runs = list(runs_iter)
+    tokens = [token for _start, length, token in runs for _ in range(length)]
+    txt, bin_path = str(tmp_path / "out.txt"), str(tmp_path / "out.steps")
+    save(txt, "text", runs, step_s, segments)
+    save(bin_path, "steps", runs, step_s, segments, grid_ms=grid_ms)
+
+    with open(txt, encoding="utf-8") as f:
+        text_tokens = f.read().splitlines()
+    assert text_tokens == tokens
+    with steparray.read_step_array(bin_path) as arr:
+        assert [arr.tokens[k] for k in arr.indices.tolist()] == tokens
+        # A 10 s window from the middle: same steps as slicing the text.
+        t_mid = len(tokens) * step_s / 2
+        i0 = arr.step_at(t_mid)
+        window = arr.tokens_between(t_mid, t_mid + 10.0)
+        assert window == text_tokens[i0 : i0 + len(arr.slice_seconds(t_mid, t_mid + 10.0))]
+        assert window
+
+
+@pytest.mark.parametrize("path", SONGS, ids=os.path.basename)
+def test_midi2array2_step_array(tmp_path, path):
+    symbols, step_s = midi2array2.midi_to_symbol_array(path, steps_per_beat=4)
+    bin_path = str(tmp_path / "out.steps")
+    steparray.write_step_array(bin_path, symbols, step_s=step_s, index_bytes=midi2array2.STEP_INDEX_BYTES)
+    with steparray.read_step_array(bin_path) as arr:
+        assert [arr.tokens[k] for k in arr.indices.tolist()] == symbols
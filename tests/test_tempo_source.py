@@ -0,0 +1,46 @@
+import mido
+import pytest
+
+from notearray.chords import declared_bpm, detect_tempo, load_pretty_midi
+
+
+def write_song(path, bpm=None, ioi_ticks=288, notes=32, ticks_per_beat=480):
+    """One piano track of evenly spaced notes; a set_tempo of bpm first if given."""
+    mid = mido.MidiFile(ticks_per_beat=ticks_per_beat)
+    track = mido.MidiTrack()
+    mid.tracks.append(track)
+    if bpm is not None:
+        track.append(mido.MetaMessage("set_tempo", tempo=mido.bpm2tempo(bpm), time=0))
+    for i in range(notes):
+        track.append(mido.Message("note_on", note=60 + i % 12, velocity=80, time=0 if i == 0 else ioi_ticks // 2))
+        track.append(mido.Message("note_off", note=60 + i % 12, velocity=0, time=ioi_ticks // 2))
+    mid.save(str(path))
+    return str(path)
+
+
+def test_declared_120_bpm_is_declared(tmp_path):
+    # Notes every 0.3 s would estimate 200 bpm; the file says 120.
+    pm, declares_tempo = load_pretty_midi(write_song(tmp_path / "declared.mid", bpm=120), "auto")
+    assert declares_tempo is True
+    assert declared_bpm(pm, declares_tempo) == pytest.approx(120.0)
+    assert detect_tempo(pm, "auto", declares_tempo) == (pytest.approx(120.0), "declared")
+
+
+def test_no_set_tempo_is_estimated(tmp_path):
+    pm, declares_tempo = load_pretty_midi(write_song(tmp_path / "bare.mid"), "auto")
+    assert declares_tempo is False
+    assert declared_bpm(pm, declares_tempo) is None
+    bpm, source = detect_tempo(pm, "auto", declares_tempo)
+    assert source == "estimated"
+    assert bpm == pytest.approx(200.0, rel=0.02)
+    assert detect_tempo(pm, "declared", declares_tempo) == (pytest.approx(120.0), "declared")
+
+
+def test_other_declared_tempo(tmp_path):
+    pm, declares_tempo = load_pretty_midi(write_song(tmp_path / "slow.mid", bpm=72), "auto")
+    assert detect_tempo(pm, "auto", declares_tempo) == (pytest.approx(72.0), "declared")
+
+
+def test_pretty_midi_source_skips_the_set_tempo_scan(tmp_path):
+    _pm, declares_tempo = load_pretty_midi(write_song(tmp_path / "declared.mid", bpm=120))
+    assert declares_tempo is None
@@ -0,0 +1,28 @@
+import glob
+import os
+
+import pytest
+
+import midi2array
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SONGS = sorted(glob.glob(os.path.join(ROOT, "*.mid")))
+SPECS = ["16th", "8th:loudest", "10ms:lowest:REST", "25ms:first"]
+
+
+@pytest.mark.parametrize("parser", ["mido", "raw"])
+@pytest.mark.parametrize("path", SONGS, ids=os.path.basename)
+def test_single_pass_matches_separate_runs(path, parser):
+    variants = [midi2array.Variant.parse(spec) for spec in SPECS]
+    separate = [
+        midi2array.convert_midi_file(
+            path,
+            grid=v.grid,
+            grid_ms=v.grid_ms,
+            policy=v.policy,
+            silence_token=v.silence_token,
+            parser=parser,
+        )
+        for v in variants
+    ]
+    assert midi2array.convert_midi_file_variants(path, variants, parser=parser) == separate